@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import WebSocket, status
+
+from .config import settings
+from .connection_manager import ConnectionManager
+from .metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+ACCEPT_LATENCY = Histogram(
+    "sockets_accept_latency_seconds",
+    "Time from handshake arrival until the connection is registered, including queueing",
+)
+ADMISSION_REJECTIONS = Counter(
+    "sockets_admission_rejections_total",
+    "Handshakes turned away by admission control",
+    labelnames=("reason",),
+)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after_ms: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after_ms = retry_after_ms
+
+
+class AdmissionController:
+    """
+    Bounds the work done for handshakes so a reconnect storm queues instead
+    of running every jwt.decode/accept/greeting at once.
+
+    At most `max_concurrent` handshakes run at a time, at most `max_pending`
+    wait for a slot and none waits longer than `queue_timeout`. Once the
+    worker holds `max_connections` sockets new handshakes are rejected
+    outright. Rejected clients get a jittered retry-after hint.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_pending: int,
+        queue_timeout: float,
+        max_connections: int,
+        retry_after_ms: int,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.max_connections = max_connections
+        self.retry_after_ms = retry_after_ms
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._pending = 0
+        self._in_progress = 0
+        # set while the server drains before a restart
+        self.draining = False
+
+    def stop_admitting(self) -> None:
+        self.draining = True
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        ADMISSION_REJECTIONS.labels(reason).inc()
+        # spread retries over [retry_after, 2 * retry_after]; 0 means retry at once
+        retry_after_ms = self.retry_after_ms + random.randint(0, self.retry_after_ms)
+        return AdmissionRejected(reason, retry_after_ms)
+
+    @asynccontextmanager
+    async def admit(self):
+        arrived_at = time.monotonic()
+        if self.draining:
+            raise self._reject("draining")
+        active = len(ConnectionManager().ws_connections)
+        if active + self._in_progress >= self.max_connections:
+            raise self._reject("connection_cap")
+        if self._pending >= self.max_pending:
+            raise self._reject("queue_full")
+
+        self._pending += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject("queue_timeout")
+        finally:
+            self._pending -= 1
+
+        self._in_progress += 1
+        try:
+            yield
+            ACCEPT_LATENCY.observe(time.monotonic() - arrived_at)
+        finally:
+            self._in_progress -= 1
+            self._semaphore.release()
+
+    async def reject(self, websocket: WebSocket, rejection: AdmissionRejected) -> None:
+        """close with 1013 (try again later) and the retry hint as the reason"""
+        logger.warning(
+            f"Rejected WebSocket handshake ({rejection.reason}), retry after {rejection.retry_after_ms}ms"
+        )
+        try:
+            # Browsers only see a close reason once the socket was accepted
+            await websocket.accept()
+            await websocket.close(
+                code=status.WS_1013_TRY_AGAIN_LATER,
+                reason=f"retry_after_ms={rejection.retry_after_ms}",
+            )
+        except Exception as e:
+            logger.debug(f"Could not send rejection, websocket may be closed: {str(e)}")
+
+
+admission_controller = AdmissionController(
+    max_concurrent=settings.max_concurrent_handshakes,
+    max_pending=settings.max_pending_handshakes,
+    queue_timeout=settings.handshake_queue_timeout,
+    max_connections=settings.max_connections,
+    retry_after_ms=settings.admission_retry_after_ms,
+)
@@ -1,9 +1,19 @@
 from jose import jwt, JWTError
-from fastapi import WebSocket, status
+from fastapi import Header, HTTPException, WebSocket, status
 from pydantic import ValidationError, BaseModel
 from datetime import datetime, timezone
+from collections import OrderedDict
 from typing import Optional, List, Union
+import hashlib
+import time
 from .config import settings
+from .metrics import Counter
+
+TOKEN_CACHE_LOOKUPS = Counter(
+    "sockets_token_cache_lookups_total",
+    "Verified-token cache lookups by result",
+    labelnames=("result",),
+)
 
 
 class TokenPayload(BaseModel):
@@ -11,11 +21,121 @@ class TokenPayload(BaseModel):
     username: str
     groups: List[str] = []
     exp: datetime
+    iat: Optional[datetime] = None
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of claims for tokens that already passed verification, keyed
+    by the token's SHA-256 digest so raw tokens are never held in memory.
+    Entries are dropped once the token expires.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # digest -> (expires at, issued at or None, claims)
+        self._entries: OrderedDict[bytes, tuple[float, Optional[float], dict]] = OrderedDict()
+        self._digests_by_user: dict[int, set[bytes]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._hit_counter = TOKEN_CACHE_LOOKUPS.labels("hit")
+        self._miss_counter = TOKEN_CACHE_LOOKUPS.labels("miss")
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, digest: bytes) -> Optional[tuple[dict, Optional[float]]]:
+        """the claims and issue time of a verified token"""
+        entry = self._entries.get(digest)
+        if entry is not None:
+            expires_at, issued_at, user = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                self._hit_counter.inc()
+                return user, issued_at
+            self._remove(digest)
+        self.misses += 1
+        self._miss_counter.inc()
+        return None
+
+    def put(self, digest: bytes, user: dict, expires_at: float, issued_at: Optional[float] = None) -> None:
+        if self.max_entries <= 0:
+            return
+        if digest in self._entries:
+            self._entries.move_to_end(digest)
+        self._entries[digest] = (expires_at, issued_at, user)
+        self._digests_by_user.setdefault(user["user_id"], set()).add(digest)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int) -> int:
+        """drop every cached token for a user, returns how many were dropped"""
+        digests = self._digests_by_user.pop(user_id, ())
+        for digest in digests:
+            self._entries.pop(digest, None)
+        return len(digests)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._digests_by_user.clear()
+
+    def _remove(self, digest: bytes) -> None:
+        _, _, user = self._entries.pop(digest)
+        digests = self._digests_by_user.get(user["user_id"])
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._digests_by_user[user["user_id"]]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TokenRevocations:
+    """
+    Per user, the time (unix seconds) at or before which its tokens were
+    issued and are refused. A token without `iat` can't be told apart from
+    one issued before, so it is refused too.
+    """
+
+    def __init__(self):
+        self.revoked_before: dict[int, float] = {}
+
+    def revoke(self, user_id: int, at: float) -> float:
+        """refuse the user's tokens issued at or before `at`; a later revocation wins"""
+        at = max(at, self.revoked_before.get(user_id, at))
+        self.revoked_before[user_id] = at
+        return at
+
+    def restore(self, user_id: int) -> bool:
+        return self.revoked_before.pop(user_id, None) is not None
+
+    def allows(self, user_id: int, issued_at: Optional[float]) -> bool:
+        before = self.revoked_before.get(user_id)
+        if before is None:
+            return True
+        return issued_at is not None and issued_at > before
 
 
 class Auth:
+    token_cache = VerifiedTokenCache(settings.token_cache_size)
+    revocations = TokenRevocations()
+
     @staticmethod
     async def validate_token(token: str) -> Optional[dict]:
+        cache = Auth.token_cache
+        revocations = Auth.revocations
+        digest = cache.digest(token)
+        cached = cache.get(digest)
+        if cached is not None:
+            user, issued_at = cached
+            if not revocations.allows(user["user_id"], issued_at):
+                return None
+            # callers may annotate the user dict, keep the cached one pristine
+            return dict(user, groups=list(user["groups"]))
+
         try:
             payload = jwt.decode(
                 token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm]
@@ -24,16 +144,37 @@ class Auth:
 
             if token_data.exp < datetime.now(timezone.utc):
                 return None
+            issued_at = token_data.iat.timestamp() if token_data.iat is not None else None
+            if not revocations.allows(token_data.user_id, issued_at):
+                return None
 
-            return {
+            user = {
                 "user_id": token_data.user_id,
                 "username": token_data.username,
                 "groups": token_data.groups,
             }
+            cache.put(digest, user, token_data.exp.timestamp(), issued_at)
+            return dict(user, groups=list(user["groups"]))
         except (JWTError, ValidationError) as e:
             print("Token validation failed", e)
             return None
 
+    @staticmethod
+    def revoke_user(user_id: int, at: Optional[float] = None) -> float:
+        """
+        Refuse the user's tokens issued up to `at` (now by default) in this
+        worker; app.cluster.Cluster.revoke also tells the other workers and
+        closes open sessions. Returns the revocation time in effect.
+        """
+        at = Auth.revocations.revoke(user_id, time.time() if at is None else at)
+        Auth.token_cache.invalidate_user(user_id)
+        return at
+
+    @staticmethod
+    def restore_user(user_id: int) -> bool:
+        """accept the user's tokens again; False if none were revoked"""
+        return Auth.revocations.restore(user_id)
+
     @staticmethod
     async def authenticate_ws(
         websocket: WebSocket,
@@ -53,4 +194,15 @@ class Auth:
                 await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
                 return None
 
-        return user
\ No newline at end of file
+        return user
+
+    @staticmethod
+    async def require_admin(authorization: Optional[str] = Header(None)) -> dict:
+        """FastAPI dependency for admin HTTP endpoints, expects a Bearer token"""
+        scheme, _, token = (authorization or "").partition(" ")
+        user = await Auth.validate_token(token) if scheme.lower() == "bearer" else None
+        if not user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+        if not any(group in user["groups"] for group in ["is_admin", "is_api_key"]):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+        return user
@@ -0,0 +1,241 @@
+"""
+Shared state for running several workers (or nodes) side by side.
+
+Every worker consumes the same MQ queues, so RabbitMQ hands each message to
+one of them, while a user's sessions may be spread over several workers.
+Each worker adds itself to the Redis set `sockets:owner:<kind>:<user_id>`
+while it holds one of the user's sessions and subscribes to its own channel,
+`sockets:worker:<worker_id>`. A consumer delivers to its local sessions and
+forwards the serialized frame to every other owner's channel.
+
+Token revocations are kept in the Redis hash `sockets:revoked` (user id ->
+unix seconds) and announced on `sockets:revocations`, which every worker
+subscribes to. A worker loads the hash when it starts.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from typing import Optional
+
+from fastapi import WebSocket
+
+from .auth import Auth
+from .config import settings
+from .connection_manager import ConnectionManager
+from .handlers import HandlerKind
+from .handlers.base_handler import OUTBOUND_BYTES, OUTBOUND_FRAMES, SEND_FAILURES, SEND_LATENCY
+from .metrics import Counter
+from .outbound import send
+
+logger = logging.getLogger(__name__)
+
+FORWARDED_FRAMES = Counter(
+    "sockets_cluster_forwarded_total",
+    "Frames forwarded between workers, by outcome",
+    labelnames=("kind", "result"),
+)
+
+
+class Cluster:
+    owner_prefix = "sockets:owner:"
+    channel_prefix = "sockets:worker:"
+    revocations_key = "sockets:revoked"
+    revocations_channel = "sockets:revocations"
+
+    def __init__(self, host: str, port: int, worker_id: str):
+        self.host = host
+        self.port = port
+        self.worker_id = worker_id
+        self._client = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._client is not None
+
+    @property
+    def channel(self) -> str:
+        return self.channel_prefix + self.worker_id
+
+    def _owner_key(self, kind: HandlerKind, user_id: int) -> str:
+        return f"{self.owner_prefix}{kind.value}:{user_id}"
+
+    async def start(self) -> None:
+        try:
+            # optional dependency, only needed with CLUSTER_ENABLED=true
+            import redis.asyncio as redis
+
+            client = redis.Redis(host=self.host, port=self.port, decode_responses=True)
+            pubsub = client.pubsub()
+            await pubsub.subscribe(self.channel, self.revocations_channel)
+            revoked = await client.hgetall(self.revocations_key)
+        except Exception as e:
+            # a worker without shared state still serves its own sockets
+            logger.error(f"Cluster mode unavailable, delivering locally only: {e}")
+            return
+
+        self._client = client
+        self._pubsub = pubsub
+        for user_id, at in revoked.items():
+            Auth.revoke_user(int(user_id), float(at))
+        self._listener = asyncio.create_task(self._listen())
+        logger.info(f"Cluster mode enabled as worker {self.worker_id}")
+
+    async def stop(self) -> None:
+        if not self.enabled:
+            return
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        try:
+            await self._pubsub.unsubscribe(self.channel, self.revocations_channel)
+            await self._pubsub.aclose()
+            await self._client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing cluster connection: {e}")
+        self._client = None
+        self._pubsub = None
+
+    async def claim(self, kind: HandlerKind, user_id: int) -> None:
+        if not self.enabled:
+            return
+        try:
+            await self._client.sadd(self._owner_key(kind, user_id), self.worker_id)
+        except Exception as e:
+            logger.warning(f"Could not claim {kind.value} user {user_id}: {e}")
+
+    async def release(self, kind: HandlerKind, user_id: int) -> None:
+        """call once this worker holds none of the user's sessions"""
+        if not self.enabled:
+            return
+        try:
+            await self._client.srem(self._owner_key(kind, user_id), self.worker_id)
+        except Exception as e:
+            logger.warning(f"Could not release {kind.value} user {user_id}: {e}")
+
+    async def forward(self, kind: HandlerKind, user_id: int, text: str) -> int:
+        """
+        Send `text` to every other worker holding a session of the user.
+        Returns how many workers it reached.
+        """
+        if not self.enabled:
+            return 0
+
+        key = self._owner_key(kind, user_id)
+        reached = 0
+        try:
+            owners = await self._client.smembers(key)
+            payload = json.dumps({"kind": kind.value, "user_id": user_id, "text": text})
+            for owner in owners:
+                if owner == self.worker_id:
+                    continue
+                receivers = await self._client.publish(self.channel_prefix + owner, payload)
+                if receivers == 0:
+                    # the owner exited without releasing its users
+                    await self._client.srem(key, owner)
+                    FORWARDED_FRAMES.labels(kind.value, "stale_owner").inc()
+                else:
+                    reached += 1
+                    FORWARDED_FRAMES.labels(kind.value, "sent").inc()
+        except Exception as e:
+            logger.warning(f"Could not forward to {kind.value} user {user_id}: {e}")
+            FORWARDED_FRAMES.labels(kind.value, "error").inc()
+        return reached
+
+    async def revoke(self, user_id: int, at: Optional[float] = None) -> dict:
+        """
+        Refuse the user's tokens issued up to `at` (now by default), or accept
+        them again with `restore()`, here and on every other worker, and close
+        the user's open sessions.
+        """
+        at = Auth.revoke_user(user_id, at)
+        closed = await ConnectionManager().close_user(user_id, "revoked")
+        await self._announce_revocation(user_id, at)
+        return {"user_id": user_id, "revoked_before": at, "closed": closed}
+
+    async def restore(self, user_id: int) -> dict:
+        restored = Auth.restore_user(user_id)
+        await self._announce_revocation(user_id, None)
+        return {"user_id": user_id, "restored": restored}
+
+    async def _announce_revocation(self, user_id: int, at: Optional[float]) -> None:
+        if not self.enabled:
+            return
+        try:
+            if at is None:
+                await self._client.hdel(self.revocations_key, user_id)
+            else:
+                await self._client.hset(self.revocations_key, user_id, at)
+            await self._client.publish(
+                self.revocations_channel,
+                json.dumps({"user_id": user_id, "at": at, "worker": self.worker_id}),
+            )
+        except Exception as e:
+            logger.error(f"Could not share the revocation of user {user_id}: {e}")
+
+    async def _on_revocation(self, payload: dict) -> None:
+        if payload.get("worker") == self.worker_id:
+            return
+        user_id = payload["user_id"]
+        if payload["at"] is None:
+            Auth.restore_user(user_id)
+        else:
+            Auth.revoke_user(user_id, payload["at"])
+            await ConnectionManager().close_user(user_id, "revoked")
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    if message["channel"] == self.revocations_channel:
+                        await self._on_revocation(payload)
+                        continue
+                    await self._deliver(
+                        HandlerKind(payload["kind"]), payload["user_id"], payload["text"]
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cluster listener failed, resubscribing: {e}")
+                await asyncio.sleep(1)
+
+    async def _deliver(self, kind: HandlerKind, user_id: int, text: str) -> None:
+        websockets = ConnectionManager().get_websocket_connections(kind, user_id)
+        if not websockets:
+            FORWARDED_FRAMES.labels(kind.value, "undeliverable").inc()
+            return
+        FORWARDED_FRAMES.labels(kind.value, "received").inc()
+        await asyncio.gather(*(send_frame(kind, websocket, text) for websocket in websockets))
+
+
+async def send_frame(kind: HandlerKind, websocket: WebSocket, text: str, channel: Optional[str] = None) -> bool:
+    """
+    send an already serialized frame, counted like BaseHandler.safe_send;
+    `channel` names the bulk channel, see app.outbound
+    """
+    try:
+        started = time.perf_counter()
+        await send(websocket, text, channel)
+        SEND_LATENCY.labels(kind.value).observe(time.perf_counter() - started)
+        OUTBOUND_FRAMES.labels(kind.value).inc()
+        OUTBOUND_BYTES.labels(kind.value).inc(len(text))
+        return True
+    except Exception as e:
+        SEND_FAILURES.labels(kind.value).inc()
+        logger.error(f"Failed to send message to WebSocket: {e}")
+        return False
+
+
+cluster = Cluster(
+    settings.redis_host,
+    settings.redis_port,
+    worker_id=f"{socket.gethostname()}:{os.getpid()}",
+)
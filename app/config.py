@@ -1,10 +1,41 @@
 import os
-from pydantic import BaseModel
+import json
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class RateLimitConfig(BaseModel):
+    # steady-state messages per second and burst size for a single connection
+    rate: float
+    burst: int
+    # shared across all of a user's connections for the same handler kind
+    user_rate: float
+    user_burst: int
+    # throttle, drop or close, see app.rate_limit.RateLimitPolicy
+    policy: str = "throttle"
+
+
+DEFAULT_RATE_LIMITS = {
+    "echo": {
+        "default": {"rate": 10, "burst": 20, "user_rate": 20, "user_burst": 40, "policy": "drop"},
+        "is_api_key": {"rate": 100, "burst": 200, "user_rate": 200, "user_burst": 400, "policy": "throttle"},
+    },
+    "logs": {
+        "default": {"rate": 5, "burst": 10, "user_rate": 10, "user_burst": 20, "policy": "throttle"},
+        "is_api_key": {"rate": 50, "burst": 100, "user_rate": 100, "user_burst": 200, "policy": "throttle"},
+    },
+    "resume": {
+        "default": {"rate": 1, "burst": 5, "user_rate": 2, "user_burst": 10, "policy": "close"},
+    },
+}
 
 
 class Settings(BaseModel):
+    model_config = ConfigDict(validate_default=True)
+
     jwt_secret_key: str = os.getenv("JWT_SECRET", "dev_secret_key_change_in_production")
     jwt_algorithm: str = "HS256"
+    # verified tokens kept in memory to skip jwt.decode on reconnect, 0 disables
+    token_cache_size: int = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
 
     db_host: str = os.getenv("DB_HOST", "swecc-db-instance")
     db_port: int = int(os.getenv("DB_PORT", 5432))
@@ -18,6 +49,136 @@ class Settings(BaseModel):
     redis_host: str = os.getenv("REDIS_HOST", "swecc-redis-instance")
     redis_port: int = int(os.getenv("REDIS_PORT", 6379))
 
+    # handler kinds loaded at startup; the others load on their first connection
+    preload_handlers: list[str] = [
+        kind.strip() for kind in os.getenv("PRELOAD_HANDLERS", "").split(",") if kind.strip()
+    ]
+
+    # bounded per-connection queue between the socket reader and handler workers
+    inbound_queue_size: int = int(os.getenv("INBOUND_QUEUE_SIZE", 64))
+    # handler workers per connection; 1 keeps strict per-connection ordering
+    handler_concurrency: dict[str, int] = {
+        "echo": int(os.getenv("ECHO_HANDLER_CONCURRENCY", 1)),
+        "logs": int(os.getenv("LOGS_HANDLER_CONCURRENCY", 1)),
+        "resume": int(os.getenv("RESUME_HANDLER_CONCURRENCY", 1)),
+    }
+
+    # Largest inbound frame accepted per handler kind, in bytes. Frames over the
+    # limit close the connection with 1009. ws_max_size is the hard bound the
+    # server enforces while the frame is still being read and should be at
+    # least the largest per-kind limit.
+    max_frame_bytes: dict[str, int] = {
+        "echo": int(os.getenv("ECHO_MAX_FRAME_BYTES", 16 * 1024)),
+        "logs": int(os.getenv("LOGS_MAX_FRAME_BYTES", 4 * 1024)),
+        "resume": int(os.getenv("RESUME_MAX_FRAME_BYTES", 1024)),
+    }
+    ws_max_size: int = int(os.getenv("WS_MAX_SIZE", 64 * 1024))
+    json_max_chars: int = int(os.getenv("JSON_MAX_CHARS", 64 * 1024))
+    json_max_depth: int = int(os.getenv("JSON_MAX_DEPTH", 16))
+
+    # per handler kind, then per user group; "default" applies to everyone else
+    rate_limits: dict[str, dict[str, RateLimitConfig]] = json.loads(
+        os.getenv("RATE_LIMITS", "null")
+    ) or DEFAULT_RATE_LIMITS
+    # "local" keeps buckets in this process, "redis" shares per-user buckets
+    # between workers
+    rate_limit_backend: str = os.getenv("RATE_LIMIT_BACKEND", "local")
+
+    # handshake admission control, see app.admission
+    max_concurrent_handshakes: int = int(os.getenv("MAX_CONCURRENT_HANDSHAKES", 64))
+    max_pending_handshakes: int = int(os.getenv("MAX_PENDING_HANDSHAKES", 1024))
+    handshake_queue_timeout: float = float(os.getenv("HANDSHAKE_QUEUE_TIMEOUT", 5.0))
+    max_connections: int = int(os.getenv("MAX_CONNECTIONS", 10000))
+    # open sockets per user and handler kind; past this the oldest is closed
+    # with 1008 "session_limit". 0 means no cap
+    max_sessions_per_user: int = int(os.getenv("MAX_SESSIONS_PER_USER", 5))
+    admission_retry_after_ms: int = Field(int(os.getenv("ADMISSION_RETRY_AFTER_MS", 2000)), ge=0)
+
+    # merged log streams: containers one start_logs may follow, lines buffered
+    # per container before its Docker read pauses, and how long (seconds) the
+    # oldest line waits for containers with nothing buffered
+    logs_max_containers: int = int(os.getenv("LOGS_MAX_CONTAINERS", 16))
+    logs_merge_buffer: int = int(os.getenv("LOGS_MERGE_BUFFER", 256))
+    logs_merge_window: float = float(os.getenv("LOGS_MERGE_WINDOW", 0.1))
+
+    # log stream flow control, see app.log_credits: credits a stream starts
+    # with when the viewer doesn't say (0 leaves flow control off), and the
+    # most credits a viewer may hold
+    logs_default_credits: int = int(os.getenv("LOGS_DEFAULT_CREDITS", 0))
+    logs_max_credits: int = int(os.getenv("LOGS_MAX_CREDITS", 10000))
+
+    # lines per query_logs page, by default and at most
+    logs_query_page_size: int = int(os.getenv("LOGS_QUERY_PAGE_SIZE", 200))
+    logs_query_max_page_size: int = int(os.getenv("LOGS_QUERY_MAX_PAGE_SIZE", 1000))
+
+    # share of a socket's bandwidth per bulk channel while frames queue, see
+    # app.outbound; control frames always go first
+    outbound_channel_weights: dict[str, int] = json.loads(
+        os.getenv("OUTBOUND_CHANNEL_WEIGHTS", '{"events": 4, "stats": 2, "query": 2, "logs": 1}')
+    )
+
+    # RPC over the socket, see app.rpc: requests one connection may have
+    # running at once, and seconds a request may run
+    rpc_max_in_flight: int = int(os.getenv("RPC_MAX_IN_FLIGHT", 32))
+    rpc_timeout: float = float(os.getenv("RPC_TIMEOUT", 30.0))
+
+    # client-to-MQ ingress, see app.mq.core.ingress: a publish batch per
+    # exchange and routing key goes out at this many messages, or once its
+    # first message has waited this long (seconds)
+    mq_ingress_batch_size: int = int(os.getenv("MQ_INGRESS_BATCH_SIZE", 50))
+    mq_ingress_batch_delay: float = float(os.getenv("MQ_INGRESS_BATCH_DELAY", 0.005))
+    # per-command publish quota overrides, {"<command>": {"rate": r, "burst": b}}
+    mq_ingress_quotas: dict[str, dict[str, float]] = json.loads(
+        os.getenv("MQ_INGRESS_QUOTAS", "{}")
+    )
+
+    # optional on-disk log spool, see app.log_spool; off unless both the
+    # directory and the (comma-separated) container names are set. Sizes are
+    # bytes, retention is per container.
+    log_spool_dir: str = os.getenv("LOG_SPOOL_DIR", "")
+    log_spool_containers: list[str] = [
+        name.strip() for name in os.getenv("LOG_SPOOL_CONTAINERS", "").split(",") if name.strip()
+    ]
+    log_spool_segment_bytes: int = int(os.getenv("LOG_SPOOL_SEGMENT_BYTES", 16 * 1024 * 1024))
+    log_spool_index_bytes: int = int(os.getenv("LOG_SPOOL_INDEX_BYTES", 4096))
+    log_spool_retention_bytes: int = int(os.getenv("LOG_SPOOL_RETENTION_BYTES", 512 * 1024 * 1024))
+    log_spool_retention_seconds: int = int(os.getenv("LOG_SPOOL_RETENTION_SECONDS", 7 * 24 * 3600))
+
+    # container stats streaming, see app.docker_stats: samples kept per
+    # container for backfill (about one per second) and the shortest interval
+    # a subscriber may ask for
+    stats_history_seconds: int = int(os.getenv("STATS_HISTORY_SECONDS", 300))
+    stats_min_interval: float = float(os.getenv("STATS_MIN_INTERVAL", 1.0))
+
+    # graceful drain on shutdown, see app.drain: seconds allowed for finishing
+    # MQ messages and closing sockets, and the spread of client reconnect delays
+    drain_timeout: float = float(os.getenv("DRAIN_TIMEOUT", 8.0))
+    drain_reconnect_spread_ms: int = int(os.getenv("DRAIN_RECONNECT_SPREAD_MS", 10000))
+
+    # event loop lag sampling and slow-callback reports, also toggleable at
+    # runtime through /admin/loop-monitor; both intervals must be positive,
+    # as on that endpoint
+    loop_monitor_enabled: bool = os.getenv("LOOP_MONITOR_ENABLED", "false").lower() == "true"
+    loop_lag_interval: float = Field(float(os.getenv("LOOP_LAG_INTERVAL", 0.5)), gt=0)
+    slow_callback_threshold: float = Field(float(os.getenv("SLOW_CALLBACK_THRESHOLD", 0.1)), gt=0)
+
+    # Worker processes started by `python -m app.workers`, all on one port.
+    # cluster_enabled shares socket ownership through Redis so MQ messages
+    # reach the worker holding the user; the launcher turns it on for N > 1.
+    workers: int = int(os.getenv("WORKERS", 1))
+    cluster_enabled: bool = os.getenv("CLUSTER_ENABLED", "false").lower() == "true"
+
+    # Consistent-hash sharding across nodes, see app.sharding. SHARD_NODES is
+    # a JSON object of node id -> base websocket URL (e.g. "wss://ws-a.swecc.org");
+    # sharding is on when SHARD_NODE_ID names one of them.
+    shard_nodes: dict[str, str] = json.loads(os.getenv("SHARD_NODES", "{}"))
+    shard_node_id: str = os.getenv("SHARD_NODE_ID", "")
+    shard_virtual_nodes: int = int(os.getenv("SHARD_VIRTUAL_NODES", 128))
+
+    # add trace ids and per-stage timings to MQ-delivered messages (data.trace);
+    # publishers can also ask per message with the x-trace-echo header
+    trace_echo: bool = os.getenv("TRACE_ECHO", "false").lower() == "true"
+
     cors_origins: list[str] = [
         "http://localhost:8000",
         "http://localhost:80",
@@ -1,10 +1,55 @@
-from fastapi import WebSocket
+from fastapi import WebSocket, status
 from typing import Dict, Set
 import logging
+import time
+from .config import settings
 from .handlers import HandlerKind
+from .metrics import Counter, Gauge
+from .structured_logging import get_hot_logger
 from typing import Optional
 
 logger = logging.getLogger(__name__)
+hot_logger = get_hot_logger(__name__)
+
+ACTIVE_CONNECTIONS = Gauge(
+    "sockets_active_connections",
+    "Open websocket connections",
+    labelnames=("kind",),
+)
+SESSION_EVICTIONS = Counter(
+    "sockets_session_evictions_total",
+    "Oldest sessions closed because a user went over the per-user session cap",
+    labelnames=("kind",),
+)
+
+
+class ConnectionRecord:
+    """everything the server tracks about one open websocket"""
+
+    __slots__ = (
+        "kind",
+        "user_id",
+        "websocket",
+        "connected_at",
+        "last_activity",
+        "messages_in",
+        "messages_out",
+        "closing",
+        "outbound",
+    )
+
+    def __init__(self, kind: HandlerKind, user_id: int, websocket: WebSocket):
+        now = time.monotonic()
+        self.kind = kind
+        self.user_id = user_id
+        self.websocket = websocket
+        self.connected_at = now
+        self.last_activity = now
+        self.messages_in = 0
+        self.messages_out = 0
+        self.closing = False
+        # app.outbound.OutboundQueue, created on the first send
+        self.outbound = None
 
 
 class ConnectionManager:
@@ -13,74 +58,146 @@ class ConnectionManager:
 
     def __init__(self):
         if not self.initialized:
-            self.closing_connections = set()
-            self.user_connections: dict[(HandlerKind, int), WebSocket] = {}
-            self.ws_connections: dict[int, WebSocket] = {}
+            # Both indexes point at the same record, so a connection costs one
+            # ConnectionRecord plus one entry per index. A user's sessions are
+            # keyed by id(websocket) in connection order, so adding, removing
+            # and finding the oldest session are all O(1).
+            self.user_connections: Dict[
+                tuple[HandlerKind, int], Dict[int, ConnectionRecord]
+            ] = {}
+            self.ws_connections: Dict[int, ConnectionRecord] = {}
+            self.max_sessions_per_user = settings.max_sessions_per_user
             self.initialized = True
 
     def is_connection_closing(self, websocket: WebSocket) -> bool:
-        return id(websocket) in self.closing_connections
+        record = self.ws_connections.get(id(websocket))
+        return record is not None and record.closing
 
     def get_active_user_ids(self) -> Set[int]:
-        return set(map(lambda x: x[1], self.user_connections.keys()))
+        return {user_id for _, user_id in self.user_connections}
+
+    def get_record(self, websocket: WebSocket) -> Optional[ConnectionRecord]:
+        return self.ws_connections.get(id(websocket))
+
+    def has_sessions(self, kind: HandlerKind, user_id: int) -> bool:
+        return (kind, user_id) in self.user_connections
 
     async def register_connection(
         self, kind: HandlerKind, user_id: int, websocket: WebSocket
     ) -> WebSocket:
-        if (kind, user_id) in self.user_connections:
-            logger.warning(f"User {user_id} already connected for handler {kind}.")
-            return self.user_connections[(kind, user_id)]
-
         await websocket.accept()
 
-        connection_id = id(websocket)
-        self.user_connections[(kind, user_id)] = websocket
-        self.ws_connections[connection_id] = websocket
-
-        logger.info(
-            f"User {user_id} connected for handler {kind}. Total connections: {len(self.ws_connections)}"
+        record = ConnectionRecord(kind, user_id, websocket)
+        sessions = self.user_connections.setdefault((kind, user_id), {})
+        sessions[id(websocket)] = record
+        self.ws_connections[id(websocket)] = record
+        ACTIVE_CONNECTIONS.labels(kind.value).inc()
+
+        hot_logger.sampled(
+            logging.INFO,
+            "connect",
+            "User %s connected for handler %s",
+            user_id,
+            kind.value,
+            sessions=len(sessions),
+            total=len(self.ws_connections),
         )
+
+        if self.max_sessions_per_user and len(sessions) > self.max_sessions_per_user:
+            await self._evict(next(iter(sessions.values())))
         return websocket
 
+    async def _evict(self, record: ConnectionRecord) -> None:
+        """close the user's oldest session to make room for a new one"""
+        SESSION_EVICTIONS.labels(record.kind.value).inc()
+        self.disconnect(record.kind, record.user_id, record.websocket)
+        try:
+            await record.websocket.close(
+                code=status.WS_1008_POLICY_VIOLATION, reason="session_limit"
+            )
+        except Exception as e:
+            logger.debug(f"Could not close evicted session: {str(e)}")
+
+    async def close_user(self, user_id: int, reason: str) -> int:
+        """close every session of the user with 1008 and `reason`; returns how many"""
+        records = [
+            record
+            for (_, session_user), sessions in self.user_connections.items()
+            if session_user == user_id
+            for record in sessions.values()
+        ]
+        for record in records:
+            self.disconnect(record.kind, record.user_id, record.websocket)
+            try:
+                await record.websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=reason)
+            except Exception as e:
+                logger.debug(f"Could not close session: {str(e)}")
+        return len(records)
+
+    def get_websocket_connections(
+        self, kind: HandlerKind, user_id: int
+    ) -> list[WebSocket]:
+        """every open session of the user, oldest first"""
+        sessions = self.user_connections.get((kind, user_id))
+        if not sessions:
+            return []
+        return [record.websocket for record in sessions.values() if not record.closing]
+
     def get_websocket_connection(
         self, kind: HandlerKind, user_id: int
     ) -> Optional[WebSocket]:
-        websocket = self.user_connections.get((kind, user_id))
+        """the user's newest open session"""
+        websockets = self.get_websocket_connections(kind, user_id)
 
-        if not websocket:
+        if not websockets:
             logger.warning(
                 f"No active connection found for user {user_id} and handler {kind}."
             )
             return None
 
-        if self.is_connection_closing(websocket):
-            logger.warning(f"Connection for user {user_id} is closing.")
-            return None
+        return websockets[-1]
 
-        return websocket
+    def all_records(self) -> list[ConnectionRecord]:
+        return list(self.ws_connections.values())
 
-    def disconnect(self, kind: HandlerKind, user_id: int) -> None:
-        websocket = self.user_connections.get((kind, user_id))
+    def disconnect(
+        self, kind: HandlerKind, user_id: int, websocket: Optional[WebSocket] = None
+    ) -> None:
+        """forget one session, or every session of the user without `websocket`"""
+        sessions = self.user_connections.get((kind, user_id))
 
-        if not websocket:
+        if not sessions:
             logger.warning(
                 f"No active connection found for user {user_id} and handler {kind}."
             )
             return
 
-        connection_id = id(websocket)
-
-        self.closing_connections.add(connection_id)
-
-        # Remove from current connection pool
-        if connection_id in self.ws_connections:
-            del self.ws_connections[connection_id]
-
-        if (kind, user_id) in self.user_connections:
+        if websocket is None:
+            records = list(sessions.values())
+        else:
+            record = sessions.get(id(websocket))
+            if record is None:
+                # already evicted
+                return
+            records = [record]
+
+        for record in records:
+            # Anyone still holding the record sees the connection as closing
+            record.closing = True
+            del sessions[id(record.websocket)]
+            self.ws_connections.pop(id(record.websocket), None)
+            ACTIVE_CONNECTIONS.labels(kind.value).dec()
+
+        if not sessions:
             del self.user_connections[(kind, user_id)]
 
-        logger.info(
-            f"WebSocket disconnected. Total connections: {len(self.ws_connections)}"
+        hot_logger.sampled(
+            logging.INFO,
+            "disconnect",
+            "User %s disconnected for handler %s",
+            user_id,
+            kind.value,
+            total=len(self.ws_connections),
         )
 
     def __new__(cls):
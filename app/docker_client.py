@@ -0,0 +1,26 @@
+"""
+One Docker client per process, created on first use.
+
+`docker.from_env()` reads the environment, opens an HTTP session and asks the
+daemon for its API version. The logs handler, the container watcher, the
+stats samplers and the log spool share this one client instead of each making
+their own. `docker` is only imported here, so workers that never serve logs
+never load it.
+"""
+
+import threading
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_docker_client():
+    """the shared client; blocks on first use, so call it off the event loop"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import docker
+
+                _client = docker.from_env()
+    return _client
@@ -0,0 +1,294 @@
+"""
+Live container resource stats, sampled once per container however many
+admins are watching.
+
+A StatsSampler follows `docker stats` for one container on a background
+thread and turns each raw sample into CPU %, memory and network/block I/O
+rates server-side. It keeps a short history for backfill and sends each
+subscriber an aggregate per requested interval. Windows are aligned to
+multiples of the interval, so subscribers with the same interval share one
+aggregate, serialized once. The sampler stops when its last subscriber
+leaves. If Docker ends the stream first (the container stopped, the daemon
+went away) the hub drops the sampler and tells its subscribers with
+`stats_stopped`, so the next `start_stats` starts a fresh one.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from fastapi import WebSocket
+
+from .cluster import send_frame
+from .config import settings
+from .handlers import HandlerKind
+from .message import Message, MessageType
+from .metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATS_SAMPLERS = Gauge(
+    "sockets_docker_stats_samplers", "Containers with a running stats sampler"
+)
+
+
+def compute_sample(raw: dict, previous: Optional[dict]) -> Optional[dict]:
+    """one `docker stats` sample as percentages and per-second rates"""
+    cpu = raw.get("cpu_stats") or {}
+    precpu = raw.get("precpu_stats") or {}
+    if not cpu.get("system_cpu_usage"):
+        # stopped containers report zeroed samples
+        return None
+
+    cpu_delta = cpu["cpu_usage"]["total_usage"] - (precpu.get("cpu_usage") or {}).get("total_usage", 0)
+    system_delta = cpu["system_cpu_usage"] - precpu.get("system_cpu_usage", 0)
+    online_cpus = cpu.get("online_cpus") or len(cpu["cpu_usage"].get("percpu_usage") or [1])
+    cpu_percent = cpu_delta / system_delta * online_cpus * 100 if system_delta > 0 else 0.0
+
+    memory = raw.get("memory_stats") or {}
+    memory_detail = memory.get("stats") or {}
+    # page cache is reclaimable, so `docker stats` leaves it out as well
+    cache = memory_detail.get("inactive_file", memory_detail.get("total_inactive_file", 0))
+    memory_used = max(0, memory.get("usage", 0) - cache)
+    memory_limit = memory.get("limit", 0)
+
+    rx = tx = 0
+    for interface in (raw.get("networks") or {}).values():
+        rx += interface.get("rx_bytes", 0)
+        tx += interface.get("tx_bytes", 0)
+    block_read = block_write = 0
+    for entry in (raw.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []:
+        if entry.get("op", "").lower() == "read":
+            block_read += entry.get("value", 0)
+        elif entry.get("op", "").lower() == "write":
+            block_write += entry.get("value", 0)
+
+    sample = {
+        "ts": time.time(),
+        "cpu_percent": round(cpu_percent, 2),
+        "memory_bytes": memory_used,
+        "memory_limit_bytes": memory_limit,
+        "memory_percent": round(memory_used / memory_limit * 100, 2) if memory_limit else 0.0,
+        "rx_bytes": rx,
+        "tx_bytes": tx,
+        "block_read_bytes": block_read,
+        "block_write_bytes": block_write,
+        "rx_bytes_per_second": 0.0,
+        "tx_bytes_per_second": 0.0,
+        "block_read_bytes_per_second": 0.0,
+        "block_write_bytes_per_second": 0.0,
+    }
+    if previous is not None:
+        elapsed = sample["ts"] - previous["ts"]
+        if elapsed > 0:
+            for counter in ("rx_bytes", "tx_bytes", "block_read_bytes", "block_write_bytes"):
+                # counters reset when the container restarts
+                delta = max(0, sample[counter] - previous[counter])
+                sample[f"{counter}_per_second"] = round(delta / elapsed, 1)
+    return sample
+
+
+def aggregate(samples: list[dict]) -> dict:
+    """mean CPU and rates over the window, memory and totals from the newest sample"""
+    latest = dict(samples[-1])
+    for field in (
+        "cpu_percent",
+        "rx_bytes_per_second",
+        "tx_bytes_per_second",
+        "block_read_bytes_per_second",
+        "block_write_bytes_per_second",
+    ):
+        latest[field] = round(sum(sample[field] for sample in samples) / len(samples), 2)
+    latest["samples"] = len(samples)
+    return latest
+
+
+class StatsSampler:
+    def __init__(
+        self,
+        client,
+        container_id: str,
+        container_name: str,
+        history_seconds: int,
+        on_end: Optional[Callable[["StatsSampler", str], None]] = None,
+    ):
+        self.client = client
+        self.container_id = container_id
+        self.container_name = container_name
+        # Docker produces about one sample per second
+        self.history: deque[dict] = deque(maxlen=history_seconds)
+        # interval -> {id(websocket): websocket}
+        self.subscribers: dict[float, dict[int, WebSocket]] = {}
+        self._window_ends: dict[float, float] = {}
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sends: set[asyncio.Task] = set()
+        # called on the loop when the stream ends without stop()
+        self.on_end = on_end
+
+    @property
+    def empty(self) -> bool:
+        return not any(self.subscribers.values())
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._thread = threading.Thread(
+            target=self._follow, args=(loop,), name=f"docker-stats-{self.container_name}", daemon=True
+        )
+        self._thread.start()
+        ACTIVE_STATS_SAMPLERS.inc()
+
+    def stop(self) -> None:
+        if self._stopping.is_set():
+            return
+        # the reader thread exits at its next sample
+        self._stopping.set()
+        ACTIVE_STATS_SAMPLERS.dec()
+
+    def add(self, websocket: WebSocket, interval: float) -> None:
+        self.subscribers.setdefault(interval, {})[id(websocket)] = websocket
+        self._window_ends.setdefault(interval, self._window_end(time.time(), interval))
+
+    def remove(self, websocket: WebSocket) -> None:
+        for interval, group in list(self.subscribers.items()):
+            group.pop(id(websocket), None)
+            if not group:
+                del self.subscribers[interval]
+                self._window_ends.pop(interval, None)
+
+    def backfill(self, interval: float) -> list[dict]:
+        """history downsampled to `interval`, oldest first"""
+        windows: dict[float, list[dict]] = {}
+        for sample in self.history:
+            windows.setdefault(self._window_end(sample["ts"], interval), []).append(sample)
+        return [aggregate(samples) for samples in windows.values()]
+
+    @staticmethod
+    def _window_end(ts: float, interval: float) -> float:
+        return (math.floor(ts / interval) + 1) * interval
+
+    def _follow(self, loop: asyncio.AbstractEventLoop) -> None:
+        reason = "Stats stream ended"
+        try:
+            for raw in self.client.api.stats(self.container_id, stream=True, decode=True):
+                if self._stopping.is_set():
+                    return
+                loop.call_soon_threadsafe(self._on_raw, raw)
+        except Exception as e:
+            if not self._stopping.is_set():
+                logger.warning(f"Stats stream for {self.container_name} ended: {e}")
+            reason = f"Stats stream failed: {e}"
+        if self._stopping.is_set() or self.on_end is None:
+            return
+        try:
+            # queued after the last samples, so subscribers get those first
+            loop.call_soon_threadsafe(self.on_end, self, reason)
+        except RuntimeError:
+            # the loop closed during shutdown
+            pass
+
+    def _on_raw(self, raw: dict) -> None:
+        sample = compute_sample(raw, self.history[-1] if self.history else None)
+        if sample is None:
+            return
+        self.history.append(sample)
+
+        for interval, group in self.subscribers.items():
+            window_end = self._window_ends[interval]
+            if sample["ts"] < window_end:
+                continue
+            self._window_ends[interval] = self._window_end(sample["ts"], interval)
+            # the window that just closed; `sample` opens the next one
+            window = [s for s in self.history if window_end - interval <= s["ts"] < window_end]
+            message = Message(
+                type=MessageType.CONTAINER_STATS,
+                data={
+                    "container": self.container_name,
+                    "interval": interval,
+                    "stats": aggregate(window or [sample]),
+                },
+            )
+            text = json.dumps(message.model_dump())
+            task = asyncio.create_task(self._fan_out(list(group.values()), text))
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+
+    @staticmethod
+    async def _fan_out(websockets: list[WebSocket], text: str) -> None:
+        await asyncio.gather(*(send_frame(HandlerKind.Logs, websocket, text, "stats") for websocket in websockets))
+
+
+class StatsHub:
+    """one sampler per container, shared by every subscribed socket"""
+
+    def __init__(self, history_seconds: int, min_interval: float):
+        self.history_seconds = history_seconds
+        self.min_interval = min_interval
+        self.samplers: dict[str, StatsSampler] = {}
+        self._sends: set[asyncio.Task] = set()
+
+    async def subscribe(self, client, container_id: str, container_name: str, websocket: WebSocket, interval: float) -> StatsSampler:
+        interval = max(self.min_interval, interval)
+        sampler = self.samplers.get(container_id)
+        if sampler is None:
+            sampler = self.samplers[container_id] = StatsSampler(
+                client, container_id, container_name, self.history_seconds, self._sampler_ended
+            )
+            sampler.start()
+        sampler.add(websocket, interval)
+
+        message = Message(
+            type=MessageType.CONTAINER_STATS,
+            data={
+                "container": container_name,
+                "interval": interval,
+                "history": sampler.backfill(interval),
+            },
+        )
+        await send_frame(HandlerKind.Logs, websocket, json.dumps(message.model_dump()), "stats")
+        return sampler
+
+    def unsubscribe(self, websocket: WebSocket, container_id: Optional[str] = None) -> None:
+        """from one container, or every container without `container_id`"""
+        for sampler_id, sampler in list(self.samplers.items()):
+            if container_id is not None and sampler_id != container_id:
+                continue
+            sampler.remove(websocket)
+            if sampler.empty:
+                sampler.stop()
+                del self.samplers[sampler_id]
+
+    def _sampler_ended(self, sampler: StatsSampler, reason: str) -> None:
+        """drop a sampler whose stream ended on its own and tell its subscribers"""
+        if self.samplers.get(sampler.container_id) is sampler:
+            del self.samplers[sampler.container_id]
+        sampler.stop()
+        websockets = {
+            id(websocket): websocket
+            for group in sampler.subscribers.values()
+            for websocket in group.values()
+        }
+        sampler.subscribers.clear()
+        if not websockets:
+            return
+        message = Message(
+            type=MessageType.STATS_STOPPED,
+            message=reason,
+            data={"container": sampler.container_name},
+        )
+        text = json.dumps(message.model_dump())
+        # on the stats channel, behind the sampler's last frames
+        task = asyncio.create_task(StatsSampler._fan_out(list(websockets.values()), text))
+        self._sends.add(task)
+        task.add_done_callback(self._sends.discard)
+
+
+stats_hub = StatsHub(
+    history_seconds=settings.stats_history_seconds,
+    min_interval=settings.stats_min_interval,
+)
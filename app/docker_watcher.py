@@ -0,0 +1,258 @@
+"""
+One shared watcher on the Docker events stream.
+
+The watcher lists containers once, then follows `docker events` for
+containers on a background thread. It keeps an in-memory index by name and
+id, so log lookups don't call the Docker API on every request. Listeners
+(the logs handler, which fans out to admin sockets) are told about every
+change. If the stream breaks, the watcher reconnects and lists containers
+again, so the index catches up with anything it missed.
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Optional
+
+from .metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+CONTAINER_EVENTS = Counter(
+    "sockets_docker_events_total",
+    "Container events read from the Docker events stream",
+    labelnames=("action",),
+)
+INDEXED_CONTAINERS = Gauge(
+    "sockets_docker_indexed_containers",
+    "Containers in the watcher's index",
+)
+
+# events forwarded to listeners; the rest only update the index
+NOTIFY_ACTIONS = {"create", "start", "stop", "die", "restart", "pause", "unpause", "destroy", "health_status"}
+STATUS_BY_ACTION = {
+    "create": "created",
+    "start": "running",
+    "restart": "running",
+    "unpause": "running",
+    "pause": "paused",
+    "stop": "exited",
+    "die": "exited",
+}
+RECONNECT_DELAY = 5.0
+
+
+class ContainerInfo:
+    __slots__ = ("id", "name", "status", "health", "image", "labels")
+
+    def __init__(self, id: str, name: str, status: str, health: Optional[str], image: str, labels: dict):
+        self.id = id
+        self.name = name
+        self.status = status
+        self.health = health
+        self.image = image
+        self.labels = labels
+
+    @classmethod
+    def from_attrs(cls, attrs: dict) -> "ContainerInfo":
+        """from `docker inspect` attributes"""
+        state = attrs.get("State") or {}
+        config = attrs.get("Config") or {}
+        return cls(
+            id=attrs["Id"],
+            name=attrs.get("Name", "").lstrip("/"),
+            status=state.get("Status", "unknown"),
+            health=(state.get("Health") or {}).get("Status"),
+            image=config.get("Image", ""),
+            labels=config.get("Labels") or {},
+        )
+
+    @classmethod
+    def from_summary(cls, summary: dict) -> "ContainerInfo":
+        """from a `docker ps --all` entry, which has no separate health field"""
+        status_text = summary.get("Status", "")
+        health = None
+        for marker, value in (("(healthy)", "healthy"), ("(unhealthy)", "unhealthy"), ("(health: starting)", "starting")):
+            if marker in status_text:
+                health = value
+        names = summary.get("Names") or [""]
+        return cls(
+            id=summary["Id"],
+            name=names[0].lstrip("/"),
+            status=summary.get("State", "unknown"),
+            health=health,
+            image=summary.get("Image", ""),
+            labels=summary.get("Labels") or {},
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "health": self.health,
+            "image": self.image,
+            "labels": self.labels,
+        }
+
+
+Listener = Callable[[str, ContainerInfo], Awaitable[None]]
+
+
+class DockerWatcher:
+    def __init__(self):
+        self.client = None
+        self.by_id: dict[str, ContainerInfo] = {}
+        self.by_name: dict[str, ContainerInfo] = {}
+        # set once the first listing finished; until then misses fall back to the API
+        self.synced = False
+        self._listeners: list[Listener] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stream = None
+        self._stopping = threading.Event()
+        INDEXED_CONTAINERS.set_function(lambda: len(self.by_id))
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def ensure_started(self, client) -> None:
+        """start following events with `client`; no-op once started"""
+        if self.running:
+            return
+        self.client = client
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._stopping.clear()
+        self._dispatcher = loop.create_task(self._dispatch())
+        self._thread = threading.Thread(
+            target=self._follow, args=(loop,), name="docker-events", daemon=True
+        )
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        self._stopping.set()
+        if self._stream is not None:
+            # unblocks the reader thread
+            self._stream.close()
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        self._thread = None
+        self._dispatcher = None
+        self.synced = False
+
+    def add_listener(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Listener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def get(self, name_or_id: str) -> Optional[ContainerInfo]:
+        info = self.by_name.get(name_or_id) or self.by_id.get(name_or_id)
+        if info is None and len(name_or_id) >= 12:
+            # short ids, as `docker ps` prints them
+            info = next(
+                (c for c in self.by_id.values() if c.id.startswith(name_or_id)), None
+            )
+        return info
+
+    def containers(self) -> list[ContainerInfo]:
+        return sorted(self.by_id.values(), key=lambda info: info.name)
+
+    # reader thread
+
+    def _follow(self, loop: asyncio.AbstractEventLoop) -> None:
+        while not self._stopping.is_set():
+            try:
+                # subscribe before listing so nothing between the two is lost
+                self._stream = self.client.events(decode=True, filters={"type": "container"})
+                listing = self.client.api.containers(all=True)
+                loop.call_soon_threadsafe(self._queue.put_nowait, ("snapshot", listing))
+                for event in self._stream:
+                    loop.call_soon_threadsafe(self._queue.put_nowait, ("event", event))
+            except Exception as e:
+                if self._stopping.is_set():
+                    break
+                logger.warning(f"Docker events stream failed, reconnecting: {e}")
+            self._stopping.wait(RECONNECT_DELAY)
+
+    def _inspect(self, container_id: str) -> Optional[dict]:
+        try:
+            return self.client.api.inspect_container(container_id)
+        except Exception:
+            return None
+
+    # event loop
+
+    async def _dispatch(self) -> None:
+        while True:
+            kind, payload = await self._queue.get()
+            try:
+                if kind == "snapshot":
+                    self._load(payload)
+                else:
+                    await self._apply(payload)
+            except Exception as e:
+                logger.error(f"Error applying Docker event: {e}", exc_info=True)
+
+    def _load(self, listing: list[dict]) -> None:
+        self.by_id.clear()
+        self.by_name.clear()
+        for summary in listing:
+            self._index(ContainerInfo.from_summary(summary))
+        self.synced = True
+        logger.info(f"Indexed {len(self.by_id)} containers")
+
+    def _index(self, info: ContainerInfo) -> None:
+        previous = self.by_id.get(info.id)
+        if previous is not None and previous.name != info.name:
+            self.by_name.pop(previous.name, None)
+        self.by_id[info.id] = info
+        self.by_name[info.name] = info
+
+    async def _apply(self, event: dict) -> None:
+        action = event.get("Action") or event.get("status") or ""
+        # "health_status: healthy", "exec_start: sh -c ..."
+        action, _, detail = action.partition(": ")
+        CONTAINER_EVENTS.labels(action).inc()
+
+        actor = event.get("Actor") or {}
+        container_id = actor.get("ID") or event.get("id")
+        attributes = actor.get("Attributes") or {}
+        if not container_id:
+            return
+
+        info = self.by_id.get(container_id)
+        if action == "destroy":
+            if info is not None:
+                del self.by_id[container_id]
+                self.by_name.pop(info.name, None)
+        elif info is None or action in ("create", "rename"):
+            # new to us, or renamed: one inspect fills in labels and state
+            attrs = await asyncio.get_running_loop().run_in_executor(
+                None, self._inspect, container_id
+            )
+            if attrs is None:
+                return
+            info = ContainerInfo.from_attrs(attrs)
+            self._index(info)
+        elif action == "health_status":
+            info.health = detail
+        elif action in STATUS_BY_ACTION:
+            info.status = STATUS_BY_ACTION[action]
+
+        if info is None or action not in NOTIFY_ACTIONS:
+            return
+        for listener in list(self._listeners):
+            try:
+                await listener(action, info)
+            except Exception as e:
+                logger.error(f"Container event listener failed: {e}", exc_info=True)
+
+
+container_watcher = DockerWatcher()
@@ -0,0 +1,109 @@
+"""
+Graceful drain before a restart.
+
+Draining stops admitting handshakes, stops MQ consumption, and waits for
+messages already received. It then tells every client when to reconnect
+and closes all sockets at once with 1012 (service restart). Each client
+gets its own random delay, so a deploy does not reconnect everyone at the
+same moment. Everything happens within `timeout`. Draining runs once;
+later calls wait for the first one.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Optional
+
+from fastapi import status
+
+from .admission import admission_controller
+from .cluster import send_frame
+from .config import settings
+from .connection_manager import ConnectionManager, ConnectionRecord
+from .message import Message, MessageType
+from .metrics import Gauge
+from .mq import drain_rabbitmq
+
+logger = logging.getLogger(__name__)
+
+DRAINING = Gauge("sockets_draining", "1 while the worker is draining for a restart")
+
+# time kept back for closing sockets when MQ messages are slow to finish
+MIN_CLOSE_TIME = 1.0
+
+
+class DrainController:
+    def __init__(self, timeout: float, reconnect_spread_ms: int):
+        self.timeout = timeout
+        self.reconnect_spread_ms = reconnect_spread_ms
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def draining(self) -> bool:
+        return self._task is not None
+
+    async def drain(self) -> dict:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._drain())
+        return await asyncio.shield(self._task)
+
+    async def _drain(self) -> dict:
+        started = time.monotonic()
+        deadline = started + self.timeout
+        DRAINING.set(1)
+        admission_controller.stop_admitting()
+        logger.info(f"Draining, deadline {self.timeout}s")
+
+        unfinished = await drain_rabbitmq(
+            max(0.0, deadline - time.monotonic() - MIN_CLOSE_TIME)
+        )
+
+        records = ConnectionManager().all_records()
+        closed = 0
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(
+                    *(self._close(record) for record in records), return_exceptions=True
+                ),
+                timeout=max(0.1, deadline - time.monotonic()),
+            )
+            closed = sum(1 for result in results if result is True)
+        except asyncio.TimeoutError:
+            logger.warning("Drain deadline reached before every socket closed")
+
+        summary = {
+            "seconds": round(time.monotonic() - started, 3),
+            "unfinished_messages": unfinished,
+            "sockets": len(records),
+            "closed": closed,
+        }
+        logger.info(f"Drain finished: {summary}")
+        return summary
+
+    async def _close(self, record: ConnectionRecord) -> bool:
+        # no more MQ deliveries or handler sends to this socket
+        record.closing = True
+        delay_ms = random.randrange(self.reconnect_spread_ms) if self.reconnect_spread_ms else 0
+        message = Message(
+            type=MessageType.RECONNECT,
+            message="Server restarting",
+            data={"reconnect_after_ms": delay_ms},
+        )
+        await send_frame(record.kind, record.websocket, json.dumps(message.model_dump()))
+        try:
+            await record.websocket.close(
+                code=status.WS_1012_SERVICE_RESTART,
+                reason=f"reconnect_after_ms={delay_ms}",
+            )
+        except Exception as e:
+            logger.debug(f"Could not close websocket, it may be closed already: {str(e)}")
+            return False
+        return True
+
+
+drain_controller = DrainController(
+    timeout=settings.drain_timeout,
+    reconnect_spread_ms=settings.drain_reconnect_spread_ms,
+)
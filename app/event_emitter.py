@@ -1,10 +1,18 @@
 from typing import Dict, List, Callable
 import logging
 import asyncio
+import time
 from .events import Event, EventType
+from .metrics import Histogram
 
 logger = logging.getLogger(__name__)
 
+DISPATCH_LATENCY = Histogram(
+    "sockets_emitter_dispatch_seconds",
+    "Time a listener took to handle an emitted event",
+    labelnames=("handler", "event"),
+)
+
 class EventEmitter:
     def __init__(self):
         self.listeners = {}
@@ -31,6 +39,7 @@ class EventEmitter:
             await asyncio.gather(*tasks, return_exceptions=True)
     
     async def _safe_execute(self, listener: Callable, event: Event) -> None:
+        started = time.perf_counter()
         try:
             await listener(event)
         except asyncio.CancelledError:
@@ -41,4 +50,8 @@ class EventEmitter:
             logger.error(
                 f"Error in listener {listener_name} for event {event.type}: {str(e)}",
                 exc_info=True
-            )
\ No newline at end of file
+            )
+        finally:
+            DISPATCH_LATENCY.labels(
+                getattr(listener, "__qualname__", "unknown"), event.type.value
+            ).observe(time.perf_counter() - started)
\ No newline at end of file
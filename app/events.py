@@ -1,5 +1,6 @@
+import json
 from enum import Enum
-from typing import Dict, Any, Optional
+from typing import Any, Callable, Dict, Optional
 
 
 class EventType(str, Enum):
@@ -9,6 +10,10 @@ class EventType(str, Enum):
 
 
 class Event:
+    # Allocated for every inbound frame, so keep it slotted. A MESSAGE event
+    # carries the raw frame and only decodes `data` when it is first read.
+    __slots__ = ("type", "user_id", "username", "websocket", "_data", "_raw", "_decode")
+
     def __init__(
         self,
         type: EventType,
@@ -16,9 +21,34 @@ class Event:
         username: str,
         data: Optional[Dict[str, Any]] = None,
         websocket=None,
+        raw: Optional[str] = None,
+        decode: Optional[Callable[[str], Dict[str, Any]]] = None,
     ):
         self.type = type
         self.user_id = user_id
         self.username = username
-        self.data = data or {}
-        self.websocket = websocket
\ No newline at end of file
+        self.websocket = websocket
+        self._data = data
+        self._raw = raw
+        self._decode = decode
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        """event payload, decoded from `raw` on first access; raises json.JSONDecodeError"""
+        if self._data is None:
+            if self._raw is None:
+                self._data = {}
+            else:
+                self._data = (self._decode or json.loads)(self._raw)
+                self._raw = self._decode = None
+        return self._data
+
+    @data.setter
+    def data(self, value: Optional[Dict[str, Any]]) -> None:
+        self._data = value
+        self._raw = self._decode = None
+
+    @property
+    def raw(self) -> Optional[str]:
+        """the frame not decoded yet, if any"""
+        return self._raw
@@ -1,8 +1,41 @@
+from ..connection_manager import ConnectionManager
+from . import HandlerKind
 from ..event_emitter import EventEmitter
 from ..events import Event, EventType
+from ..json_guard import guarded_loads
 from ..message import Message, MessageType
+from ..metrics import Counter, Histogram
+from ..mq import ingress_bridge
+from ..outbound import BULK_CHANNELS, send
+from ..rpc import REJECTED, Method, RpcError, RpcServer, collect_methods, is_request
+from ..structured_logging import get_hot_logger
+import functools
 import logging
 import json
+import time
+from typing import Optional
+
+OUTBOUND_FRAMES = Counter(
+    "sockets_outbound_frames_total",
+    "Frames sent to clients",
+    labelnames=("kind",),
+)
+# Counted as text length, which equals bytes for ASCII payloads
+OUTBOUND_BYTES = Counter(
+    "sockets_outbound_bytes_total",
+    "Payload size of frames sent to clients",
+    labelnames=("kind",),
+)
+SEND_LATENCY = Histogram(
+    "sockets_send_seconds",
+    "Time to send a frame, including any wait behind other frames on the socket",
+    labelnames=("kind",),
+)
+SEND_FAILURES = Counter(
+    "sockets_send_failures_total",
+    "Sends that raised, usually because the client went away",
+    labelnames=("kind",),
+)
 
 class BaseHandler:
     def __init__(self, event_emitter: EventEmitter, service_name: str):
@@ -10,12 +43,51 @@ class BaseHandler:
         self.service_name = service_name
 
         self.event_emitter.on(EventType.CONNECTION, self.handle_connect)
-        self.event_emitter.on(EventType.MESSAGE, self.handle_message)
+        self.event_emitter.on(EventType.MESSAGE, self._answer_invalid_json(self.handle_message))
         self.event_emitter.on(EventType.DISCONNECT, self.handle_disconnect)
 
         self.logger = logging.getLogger(f"{self.service_name}Handler")
+        # per-message and per-connection logging goes through the hot logger
+        self.hot_logger = get_hot_logger(f"{self.service_name}Handler")
+
+        kind = self.service_name.lower()
+        self.kind = HandlerKind(kind)
+        self._outbound_frames = OUTBOUND_FRAMES.labels(kind)
+        self._outbound_bytes = OUTBOUND_BYTES.labels(kind)
+        self._send_latency = SEND_LATENCY.labels(kind)
+        self._send_failures = SEND_FAILURES.labels(kind)
+
+        self.rpc_methods = collect_methods(self)
+        self.rpc = RpcServer(kind, self._resolve_rpc, self.safe_send)
 
     
+    def _answer_invalid_json(self, handle_message):
+        """
+        `event.data` is decoded on first read, inside handle_message; a frame
+        that isn't valid JSON gets an error reply. Wrapped rather than
+        replaced so emitter metrics keep the handler's own name.
+        """
+
+        @functools.wraps(handle_message)
+        async def handle(event: Event) -> None:
+            try:
+                await handle_message(event)
+            except json.JSONDecodeError:
+                if not ConnectionManager().is_connection_closing(event.websocket):
+                    await self.safe_send(
+                        event.websocket,
+                        {"type": "error", "message": "Invalid JSON message format"},
+                    )
+
+        return handle
+
+    async def start(self) -> None:
+        """expensive setup, run once before the handler's first connection"""
+
+    def decode(self, data: str, user: dict) -> dict:
+        """the event data for an inbound frame; raises json.JSONDecodeError"""
+        return guarded_loads(data)
+
     async def handle_connect(self, event: Event) -> None:
         try:
             message = Message(
@@ -23,22 +95,82 @@ class BaseHandler:
                 message=f"{self.service_name} service: Connected as {event.username}",
             )
             await self.safe_send(event.websocket, message.dict())
-            self.logger.info(
-                f"{self.service_name} service: User {event.username} (ID: {event.user_id}) connected"
+            self.hot_logger.sampled(
+                logging.INFO,
+                "connect",
+                "%s service: User %s (ID: %s) connected",
+                self.service_name,
+                event.username,
+                event.user_id,
             )
         except Exception as e:
             self.logger.error(f"Error in handle_connect for {self.service_name} service: {str(e)}", exc_info=True)
 
     async def handle_message(self, event: Event) -> None:
-        self.logger.info(
-            f"{self.service_name} service: Message from {event.username} (ID: {event.user_id}): {event.data}"
+        self.hot_logger.debug(
+            "%s service: Message from %s (ID: %s): %s",
+            self.service_name,
+            event.username,
+            event.user_id,
+            event.data,
         )
 
+    async def route_rpc(self, event: Event) -> bool:
+        """start the message as an RPC request, if it is one; the reply follows later"""
+        if not is_request(event.data):
+            return False
+        await self.rpc.handle(event)
+        return True
+
+    def _resolve_rpc(self, name: str) -> Optional[Method]:
+        method = self.rpc_methods.get(name)
+        if method is not None:
+            return method
+        # @ingress commands can be called as methods too
+        route = ingress_bridge.route_for(self.kind, name)
+        if route is None:
+            return None
+
+        async def publish(params: dict, event: Event) -> dict:
+            request = Event(
+                type=event.type,
+                user_id=event.user_id,
+                username=event.username,
+                data={**params, "request_id": event.data["id"]},
+                websocket=event.websocket,
+            )
+            outcome = await ingress_bridge.submit(route, request)
+            if outcome is not None:
+                data = {"reason": outcome.reason}
+                if outcome.retry_after_ms is not None:
+                    data["retry_after_ms"] = outcome.retry_after_ms
+                raise RpcError(REJECTED, outcome.message, data)
+            return {"published": True}
+
+        return publish, None
+
+    def route_ingress(self, event: Event) -> bool:
+        """
+        hand the message to its @ingress route, if it has one; the ack or
+        nack follows later
+        """
+        route = ingress_bridge.route_for(self.kind, event.data.get("type"))
+        if route is None:
+            return False
+        ingress_bridge.dispatch(route, event, self.safe_send)
+        return True
+
     async def handle_disconnect(self, event: Event) -> None:
         try:
+            self.rpc.close(event.websocket)
             user_id = event.user_id
-            self.logger.info(
-                f"{self.service_name} service: User {event.username} (ID: {user_id}) disconnected"
+            self.hot_logger.sampled(
+                logging.INFO,
+                "disconnect",
+                "%s service: User %s (ID: %s) disconnected",
+                self.service_name,
+                event.username,
+                user_id,
             )
         except Exception as e:
             self.logger.error(f"Error in handle_disconnect for {self.service_name} service: {str(e)}", exc_info=True)
@@ -46,7 +178,19 @@ class BaseHandler:
     async def safe_send(self, websocket, data):
         """Safely send a message, handling potential disconnection gracefully"""
         try:
-            await websocket.send_text(json.dumps(data))
+            text = json.dumps(data)
+            started = time.perf_counter()
+            # log lines and other bulk frames yield to control frames
+            await send(websocket, text, BULK_CHANNELS.get(data.get("type")))
+            self._send_latency.observe(time.perf_counter() - started)
+            self._outbound_frames.inc()
+            self._outbound_bytes.inc(len(text))
+            record = ConnectionManager().get_record(websocket)
+            if record is not None:
+                record.messages_out += 1
         except Exception as e:
+            self._send_failures.inc()
             # Just log the error
-            self.logger.debug(f"Could not send message, websocket may be closed: {str(e)}")
+            self.hot_logger.debug(
+                "Could not send message, websocket may be closed: %s", e
+            )
@@ -1,5 +1,8 @@
+import json
+
 from ..events import Event
 from ..message import Message, MessageType
+from ..rpc import rpc_method
 from .base_handler import BaseHandler
 
 
@@ -9,9 +12,14 @@ class EchoHandler(BaseHandler):
 
     async def handle_message(self, event: Event) -> None:
         try:
+            if await self.route_rpc(event) or self.route_ingress(event):
+                return
             content = event.data.get("content", "")
-            self.logger.info(
-                f"Echo service: Message from {event.username} (ID: {event.user_id}): {content}"
+            self.hot_logger.debug(
+                "Echo service: Message from %s (ID: %s): %s",
+                event.username,
+                event.user_id,
+                content,
             )
 
             response = Message(
@@ -22,5 +30,12 @@ class EchoHandler(BaseHandler):
             )
 
             await self.safe_send(event.websocket, response.dict())
+        except json.JSONDecodeError:
+            # answered by BaseHandler
+            raise
         except Exception as e:
             self.logger.error(f"Error in handle_message: {str(e)}", exc_info=True)
+
+    @rpc_method()
+    async def echo(self, params: dict, event: Event) -> dict:
+        return {"content": params.get("content", "")}
@@ -1,17 +1,55 @@
 import asyncio
+import functools
+import json
+import time
 import docker
+from ..docker_client import get_docker_client
+from ..docker_stats import stats_hub
+from ..docker_watcher import ContainerInfo, container_watcher
+from ..config import settings
 from ..events import Event
+from ..log_credits import CreditWindow
+from ..log_merge import LogMerge, split_timestamp
+from ..log_query import LogQuery, parse_time
+from ..log_spool import log_spool, timestamp_ns
 from ..message import Message, MessageType
+from ..metrics import Counter, Gauge
+from ..rpc import rpc_method
 from .base_handler import BaseHandler
 
+ACTIVE_LOG_STREAMS = Gauge(
+    "sockets_active_log_streams", "Docker log streams being followed"
+)
+LOG_QUERIES = Counter(
+    "sockets_log_queries_total",
+    "Historical log query pages, by outcome",
+    labelnames=("result",),
+)
 
 
 class ContainerLogsHandler(BaseHandler):
     def __init__(self, event_emitter):
         super().__init__(event_emitter, "Logs")
+        # keyed by id(websocket), so each of a user's sessions has its own stream
         self.running_streams = {}
-        # Initialize Docker client
-        self.docker_client = docker.from_env()
+        # admin sockets subscribed to container events, keyed by id(websocket)
+        self.container_subscribers = {}
+        # the historical query each socket is running, keyed by id(websocket)
+        self.running_queries = {}
+        # shared with the spool and stats samplers, see start()
+        self.docker_client = None
+        self.watcher = container_watcher
+        self.watcher.add_listener(self._on_container_event)
+
+    async def start(self) -> None:
+        self.docker_client = await asyncio.get_running_loop().run_in_executor(
+            None, get_docker_client
+        )
+
+    def decode(self, data: str, user: dict) -> dict:
+        message_data = super().decode(data, user)
+        message_data["groups"] = user.get("groups", [])
+        return message_data
 
     async def handle_message(self, event: Event) -> None:
         try:
@@ -26,20 +64,49 @@ class ContainerLogsHandler(BaseHandler):
                 await self.safe_send(event.websocket, error_msg.dict())
                 return
 
+            if await self.route_rpc(event) or self.route_ingress(event):
+                return
+
+            # one watcher for every logs connection, started on first use
+            self.watcher.ensure_started(self.docker_client)
+
             message_type = event.data.get("type")
             container_name = event.data.get("container_name")
 
-            if message_type == "start_logs" and container_name:
-                await self._start_logs(event.user_id, container_name, event.websocket)
+            if message_type == "start_logs" and any(
+                event.data.get(key) for key in ("container_name", "container_names", "labels", "project")
+            ):
+                await self._start_logs(event.user_id, event.data, event.websocket)
             elif message_type == "stop_logs":
-                await self._stop_logs(event.user_id)
+                await self._stop_logs(event.websocket)
+                message = Message(type=MessageType.LOGS_STOPPED, message="Stopped streaming logs")
+                await self.safe_send(event.websocket, message.dict())
+            elif message_type == "credit":
+                await self._grant_credits(event.data.get("credits"), event.websocket)
+            elif message_type == "watch_containers":
+                await self._watch_containers(event.websocket)
+            elif message_type == "unwatch_containers":
+                self.container_subscribers.pop(id(event.websocket), None)
+            elif message_type == "query_logs":
+                await self._query_logs(event.data, event.websocket)
+            elif message_type == "cancel_query":
+                await self._cancel_query(event.websocket)
+            elif message_type == "start_stats" and container_name:
+                await self._start_stats(
+                    container_name, event.data.get("interval", 1.0), event.websocket
+                )
+            elif message_type == "stop_stats":
+                await self._stop_stats(container_name, event.websocket)
             else:
                 error_msg = Message(
                     type=MessageType.ERROR,
-                    message="Unknown logs command. Available commands: start_logs, stop_logs",
+                    message="Unknown logs command. Available commands: start_logs, stop_logs, credit, query_logs, cancel_query, watch_containers, unwatch_containers, start_stats, stop_stats",
                 )
                 await self.safe_send(event.websocket, error_msg.dict())
 
+        except json.JSONDecodeError:
+            # answered by BaseHandler
+            raise
         except Exception as e:
             self.logger.error(f"Error processing logs message: {str(e)}", exc_info=True)
             error_msg = Message(
@@ -48,46 +115,221 @@ class ContainerLogsHandler(BaseHandler):
             )
             await self.safe_send(event.websocket, error_msg.dict())
 
-    async def _start_logs(self, user_id: int, container_name: str, websocket) -> None:
-        # First stop any existing log streams
-        await self._stop_logs(user_id)
+    async def handle_disconnect(self, event: Event) -> None:
+        self.container_subscribers.pop(id(event.websocket), None)
+        stats_hub.unsubscribe(event.websocket)
+        await self._cancel_query(event.websocket)
+        await self._stop_logs(event.websocket)
+        await super().handle_disconnect(event)
+
+    async def _start_stats(self, container_name: str, interval, websocket) -> None:
+        """join the container's shared sampler; the reply carries the recent history"""
+        try:
+            interval = float(interval)
+        except (TypeError, ValueError):
+            interval = 1.0
+        try:
+            container = await self._get_container(container_name)
+        except docker.errors.NotFound:
+            error_msg = Message(
+                type=MessageType.ERROR,
+                message=f"Container '{container_name}' not found",
+            )
+            await self.safe_send(websocket, error_msg.dict())
+            return
+        await stats_hub.subscribe(
+            self.docker_client, container.id, container_name, websocket, interval
+        )
+
+    async def _stop_stats(self, container_name, websocket) -> None:
+        container_id = None
+        if container_name:
+            info = self.watcher.get(container_name)
+            container_id = info.id if info is not None else None
+            if container_id is None:
+                return
+        stats_hub.unsubscribe(websocket, container_id)
+
+    async def _watch_containers(self, websocket) -> None:
+        """send the current index, then every container event as it happens"""
+        self.container_subscribers[id(websocket)] = websocket
+        message = Message(
+            type=MessageType.CONTAINERS,
+            data={
+                "synced": self.watcher.synced,
+                "containers": [info.to_dict() for info in self.watcher.containers()],
+            },
+        )
+        await self.safe_send(websocket, message.dict())
+
+    @rpc_method()
+    async def list_containers(self, params: dict, event: Event) -> dict:
+        self.watcher.ensure_started(self.docker_client)
+        return {
+            "synced": self.watcher.synced,
+            "containers": [info.to_dict() for info in self.watcher.containers()],
+        }
+
+    @rpc_method(name="stop_logs")
+    async def stop_logs_rpc(self, params: dict, event: Event) -> dict:
+        stopped = id(event.websocket) in self.running_streams
+        await self._stop_logs(event.websocket)
+        return {"stopped": stopped}
+
+    async def _on_container_event(self, action: str, info: ContainerInfo) -> None:
+        if not self.container_subscribers:
+            return
+        message = Message(
+            type=MessageType.CONTAINER_EVENT,
+            message=f"{info.name}: {action}",
+            data={"action": action, "container": info.to_dict()},
+        ).dict()
+        await asyncio.gather(
+            *(self.safe_send(websocket, message) for websocket in list(self.container_subscribers.values()))
+        )
+
+    async def _get_container(self, container_name: str):
+        """
+        Resolve from the watcher's index without an API call. Before the index
+        is ready, or for names it doesn't know yet, ask Docker off the loop.
+        """
+        info = self.watcher.get(container_name)
+        if info is not None:
+            return self.docker_client.containers.prepare_model({"Id": info.id, "Name": "/" + info.name})
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.docker_client.containers.get, container_name
+        )
+
+    async def _select_containers(self, selector: dict) -> list[str]:
+        """
+        Container names from `container_name`, `container_names`, `labels`
+        (`{"key": "value"}`, or `"key=value"` / `"key"` strings) and `project`
+        (a compose project). A label selector matches running containers.
+        """
+        names = list(selector.get("container_names") or [])
+        if selector.get("container_name"):
+            names.insert(0, selector["container_name"])
+
+        labels = selector.get("labels") or []
+        if isinstance(labels, dict):
+            labels = [f"{key}={value}" if value else key for key, value in labels.items()]
+        if selector.get("project"):
+            labels = [*labels, f"com.docker.compose.project={selector['project']}"]
+        if labels:
+            names.extend(await self._match_labels(labels))
+
+        # keep the order asked for, without duplicates
+        return list(dict.fromkeys(names))
+
+    async def _match_labels(self, labels: list[str]) -> list[str]:
+        if self.watcher.synced:
+            wanted = [label.partition("=") for label in labels]
+            return [
+                info.name
+                for info in self.watcher.containers()
+                if info.status == "running"
+                and all(
+                    key in info.labels and (not sep or info.labels[key] == value)
+                    for key, sep, value in wanted
+                )
+            ]
+        summaries = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self.docker_client.api.containers(filters={"label": labels})
+        )
+        return sorted(ContainerInfo.from_summary(summary).name for summary in summaries)
+
+    async def _start_logs(self, user_id: int, selector: dict, websocket) -> None:
+        # a new selection replaces this socket's stream; several containers go in one call
+        await self._stop_logs(websocket)
 
         try:
             try:
-                container = self.docker_client.containers.get(container_name)
-            except docker.errors.NotFound:
+                since = parse_time(selector.get("since"))
+                if selector.get("replay_seconds"):
+                    since = time.time() - float(selector["replay_seconds"])
+            except (TypeError, ValueError) as e:
+                error_msg = Message(type=MessageType.ERROR, message=f"Invalid replay time: {e}")
+                await self.safe_send(websocket, error_msg.dict())
+                return
+
+            # flow control is on when the viewer asks for it or by default
+            window = None
+            credits = selector.get("credits", settings.logs_default_credits or None)
+            if credits is not None:
+                try:
+                    window = CreditWindow(
+                        int(credits),
+                        selector.get("on_exhausted", "pause"),
+                        settings.logs_max_credits,
+                    )
+                except (TypeError, ValueError) as e:
+                    error_msg = Message(type=MessageType.ERROR, message=f"Invalid flow control: {e}")
+                    await self.safe_send(websocket, error_msg.dict())
+                    return
+
+            container_names = await self._select_containers(selector)
+            if not container_names:
                 error_msg = Message(
-                    type=MessageType.ERROR,
-                    message=f"Container '{container_name}' not found",
+                    type=MessageType.ERROR, message="No running containers match the selector"
                 )
                 await self.safe_send(websocket, error_msg.dict())
                 return
-            except docker.errors.APIError as e:
+            if len(container_names) > settings.logs_max_containers:
                 error_msg = Message(
-                    type=MessageType.ERROR, message=f"Docker API error: {str(e)}"
+                    type=MessageType.ERROR,
+                    message=f"{len(container_names)} containers match, at most {settings.logs_max_containers} can be followed at once",
                 )
                 await self.safe_send(websocket, error_msg.dict())
                 return
 
+            containers = {}
+            for container_name in container_names:
+                try:
+                    containers[container_name] = await self._get_container(container_name)
+                except docker.errors.NotFound:
+                    error_msg = Message(
+                        type=MessageType.ERROR,
+                        message=f"Container '{container_name}' not found",
+                    )
+                    await self.safe_send(websocket, error_msg.dict())
+                    return
+                except docker.errors.APIError as e:
+                    error_msg = Message(
+                        type=MessageType.ERROR, message=f"Docker API error: {str(e)}"
+                    )
+                    await self.safe_send(websocket, error_msg.dict())
+                    return
+
             # Create a new task for streaming
             stream_task = asyncio.create_task(
-                self._stream_logs(user_id, container, websocket)
+                self._stream_logs(user_id, containers, since, window, websocket)
             )
 
-            self.running_streams[user_id] = {
+            self.running_streams[id(websocket)] = {
                 "task": stream_task,
-                "container_name": container_name,
+                "container_names": container_names,
+                "credits": window,
             }
+            ACTIVE_LOG_STREAMS.inc()
 
             # Send confirmation message
+            if len(container_names) == 1:
+                text = f"Started streaming logs for container: {container_names[0]}"
+            else:
+                text = f"Started streaming logs for containers: {', '.join(container_names)}"
+            data = {"containers": container_names}
+            if window is not None:
+                data["credits"] = window.credits
+                data["on_exhausted"] = window.mode
             message = Message(
                 type=MessageType.LOGS_STARTED,
-                message=f"Started streaming logs for container: {container_name}",
+                message=text,
+                data=data,
             )
             await self.safe_send(websocket, message.dict())
 
             self.logger.info(
-                f"Started log streaming for container {container_name} for user {user_id}"
+                f"Started log streaming for containers {', '.join(container_names)} for user {user_id}"
             )
 
         except Exception as e:
@@ -97,42 +339,182 @@ class ContainerLogsHandler(BaseHandler):
             )
             await self.safe_send(websocket, error_msg.dict())
 
-    async def _stop_logs(self, user_id: int) -> None:
-        if user_id in self.running_streams:
-            stream_info = self.running_streams[user_id]
+    async def _query_logs(self, data: dict, websocket) -> None:
+        """
+        One page of past logs. A socket runs one query at a time; a new one
+        replaces it.
+        """
+        await self._cancel_query(websocket)
+
+        try:
+            query = LogQuery.from_request(
+                data, settings.logs_query_page_size, settings.logs_query_max_page_size
+            )
+            container_names = await self._select_containers(data)
+        except ValueError as e:
+            error_msg = Message(type=MessageType.ERROR, message=str(e))
+            await self.safe_send(websocket, error_msg.dict())
+            return
+        if not container_names:
+            error_msg = Message(
+                type=MessageType.ERROR, message="query_logs needs containers to search"
+            )
+            await self.safe_send(websocket, error_msg.dict())
+            return
+        if len(container_names) > settings.logs_max_containers:
+            error_msg = Message(
+                type=MessageType.ERROR,
+                message=f"{len(container_names)} containers match, at most {settings.logs_max_containers} can be searched at once",
+            )
+            await self.safe_send(websocket, error_msg.dict())
+            return
+
+        containers = {}
+        for container_name in container_names:
+            try:
+                containers[container_name] = await self._get_container(container_name)
+            except docker.errors.NotFound:
+                error_msg = Message(
+                    type=MessageType.ERROR,
+                    message=f"Container '{container_name}' not found",
+                )
+                await self.safe_send(websocket, error_msg.dict())
+                return
 
-            # Cancel the streaming task
-            if "task" in stream_info and not stream_info["task"].done():
-                stream_info["task"].cancel()
+        self.running_queries[id(websocket)] = asyncio.create_task(
+            self._run_query(query, containers, data.get("query_id"), websocket)
+        )
 
-                try:
-                    await stream_info["task"]
-                except asyncio.CancelledError:
-                    pass
+    async def _cancel_query(self, websocket) -> None:
+        task = self.running_queries.pop(id(websocket), None)
+        if task is None or task.done():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run_query(self, query: LogQuery, containers: dict, query_id, websocket) -> None:
+        merge = None
+        try:
+            # the streams end, so the merge can wait for exact order
+            merge = LogMerge(
+                {
+                    container_name: self._log_lines(
+                        container_name, container, follow=False, since=query.read_since, until=query.until
+                    )
+                    for container_name, container in containers.items()
+                },
+                buffer=settings.logs_merge_buffer,
+                window=None,
+            )
+            page = await query.page(merge)
+            LOG_QUERIES.labels("done" if page["done"] else "page").inc()
+            message = Message(
+                type=MessageType.LOG_PAGE,
+                data={"query_id": query_id, "containers": list(containers), **page},
+            )
+            await self.safe_send(websocket, message.dict())
+
+        except asyncio.CancelledError:
+            LOG_QUERIES.labels("cancelled").inc()
+            raise
+        except Exception as e:
+            LOG_QUERIES.labels("error").inc()
+            self.logger.error(f"Error in log query: {str(e)}", exc_info=True)
+            error_msg = Message(
+                type=MessageType.ERROR, message=f"Error in log query: {str(e)}"
+            )
+            await self.safe_send(websocket, error_msg.dict())
+        finally:
+            if merge is not None:
+                merge.close()
+            if self.running_queries.get(id(websocket)) is asyncio.current_task():
+                del self.running_queries[id(websocket)]
+
+    async def _stop_logs(self, websocket) -> None:
+        stream_info = self.running_streams.pop(id(websocket), None)
+        if stream_info is None:
+            return
+        ACTIVE_LOG_STREAMS.dec()
 
-            # Remove from tracking
-            del self.running_streams[user_id]
-            self.logger.info(f"Stopped log streaming for user {user_id}")
+        # Cancel the streaming task
+        if not stream_info["task"].done():
+            stream_info["task"].cancel()
+
+            try:
+                await stream_info["task"]
+            except asyncio.CancelledError:
+                pass
+
+        self.logger.info(f"Stopped log streaming for {', '.join(stream_info['container_names'])}")
+
+    async def _grant_credits(self, credits, websocket) -> None:
+        stream_info = self.running_streams.get(id(websocket))
+        window = stream_info["credits"] if stream_info is not None else None
+        if window is None:
+            return
+        try:
+            window.grant(int(credits))
+        except (TypeError, ValueError):
+            error_msg = Message(type=MessageType.ERROR, message="credits must be a number")
+            await self.safe_send(websocket, error_msg.dict())
+            return
+        # before any line sent with the new credits
+        await self._send_skipped(window, websocket)
+
+    async def _send_skipped(self, window: CreditWindow, websocket) -> None:
+        summary = window.take_summary()
+        if summary is not None:
+            message = Message(
+                type=MessageType.LOGS_SKIPPED,
+                message=f"{summary['skipped']} lines skipped",
+                data=summary,
+            )
+            await self.safe_send(websocket, message.dict())
 
-    async def _stream_logs(self, user_id: int, container, websocket) -> None:
+    async def _stream_logs(self, user_id: int, containers: dict, since, window, websocket) -> None:
+        merge = None
         try:
-            logs_generator = container.logs(
-                stream=True, follow=True, timestamps=True, tail=100
+            merge = LogMerge(
+                {
+                    container_name: self._log_lines(container_name, container, follow=True, since=since)
+                    for container_name, container in containers.items()
+                },
+                buffer=settings.logs_merge_buffer,
+                window=settings.logs_merge_window,
             )
 
-            async for log_chunk in self._async_log_generator(logs_generator):
+            # safe_send awaits the socket, so a slow client slows the merge
+            # and, through its bounded queues, the reads from Docker
+            async for container_name, timestamp, text in merge:
                 if asyncio.current_task().cancelled():
                     break
 
+                if window is not None and not window.take():
+                    if window.mode == "skip":
+                        window.skip(container_name, timestamp)
+                        continue
+                    # not pulling from the merge pauses the Docker reads too
+                    await window.wait()
+                    window.take()
+
                 try:
                     log_message = Message(
-                        type=MessageType.LOG_LINE, message=log_chunk.strip()
+                        type=MessageType.LOG_LINE,
+                        message=f"{timestamp} {text}" if timestamp else text,
+                        data={"container": container_name, "timestamp": timestamp},
                     )
                     await self.safe_send(websocket, log_message.dict())
                 except Exception as e:
                     self.logger.error(f"Error sending log line: {str(e)}")
                     break
 
+            # the containers stopped while the viewer was out of credits
+            if window is not None:
+                await self._send_skipped(window, websocket)
+
         except asyncio.CancelledError:
             raise
         except Exception as e:
@@ -145,9 +527,63 @@ class ContainerLogsHandler(BaseHandler):
             except:
                 pass
         finally:
-            # Ensure we clean up
-            if user_id in self.running_streams:
-                await self._stop_logs(user_id)
+            if merge is not None:
+                merge.close()
+            # Ensure we clean up when the stream ends on its own
+            stream_info = self.running_streams.get(id(websocket))
+            if stream_info is not None and stream_info["task"] is asyncio.current_task():
+                del self.running_streams[id(websocket)]
+                ACTIVE_LOG_STREAMS.dec()
+
+    async def _log_lines(self, container_name: str, container, follow: bool, since=None, until=None):
+        """
+        A container's log lines from `since` (unix seconds). Without it, a
+        followed stream starts at the last 100 lines and a one-off read (a
+        query) at the start of the log. The spool serves them when it covers
+        `since`, and Docker after that, also without `follow`: the spool's
+        writer may have stopped, or may live in another process that has
+        stopped.
+        """
+        after_ns = None
+        if since is not None and await asyncio.get_running_loop().run_in_executor(
+            None, log_spool.covers, container_name, since
+        ):
+            last_line = None
+            async for line in log_spool.lines(container_name, since, until):
+                last_line = line
+                yield line
+            if last_line is not None:
+                after_ns = timestamp_ns(last_line.partition(" ")[0])
+                if until is not None and after_ns >= until * 1e9:
+                    return
+                since = after_ns / 1e9
+
+        options = {"stream": True, "follow": follow, "timestamps": True}
+        if since is not None:
+            options["since"] = since
+        elif follow:
+            options["tail"] = 100
+        if until is not None:
+            options["until"] = until
+        # opening the stream is an HTTP request, so keep it off the loop
+        logs_generator = await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(container.logs, **options)
+        )
+        try:
+            async for line in self._async_log_generator(logs_generator):
+                if after_ns is not None:
+                    # since is inclusive, so skip what the spool already sent
+                    timestamp, _ = split_timestamp(line)
+                    if timestamp is not None and timestamp_ns(timestamp) <= after_ns:
+                        continue
+                    after_ns = None
+                yield line
+        finally:
+            # unblocks an executor thread waiting for the next chunk
+            try:
+                logs_generator.close()
+            except Exception:
+                pass
 
     async def _async_log_generator(self, logs_generator):
         loop = asyncio.get_event_loop()
@@ -0,0 +1,88 @@
+"""
+Handler kinds and the modules that implement them.
+
+Nothing here imports a handler module. The first connection of a kind imports
+it in a thread, builds the handler and awaits its `start()`. Connections that
+arrive meanwhile wait for the same load, and the event loop keeps serving
+the other kinds. A worker that only serves echo sockets never imports docker.
+"""
+
+import asyncio
+import importlib
+import logging
+import time
+from typing import Optional
+
+from ..event_emitter import EventEmitter
+from ..metrics import Gauge
+from . import HandlerKind
+
+logger = logging.getLogger(__name__)
+
+HANDLER_LOAD_SECONDS = Gauge(
+    "sockets_handler_load_seconds",
+    "Time taken to import and start each loaded handler",
+    labelnames=("kind",),
+)
+
+HANDLER_MODULES: dict[HandlerKind, str] = {
+    HandlerKind.Echo: "app.handlers.echo_handler:EchoHandler",
+    HandlerKind.Logs: "app.handlers.logs_handler:ContainerLogsHandler",
+    HandlerKind.Resume: "app.handlers.resume_handler:ResumeHandler",
+}
+
+
+class HandlerRegistry:
+    def __init__(self, modules: dict[HandlerKind, str]):
+        self.modules = modules
+        # created up front so MQ consumers and cleanup can emit to any kind
+        self.emitters = {kind: EventEmitter() for kind in modules}
+        # One handler per kind: every handler subscribes to its kind's shared
+        # emitter, so a handler per connection would answer every other
+        # connection's events too
+        self.handlers = {}
+        self._built = {}
+        self._loading: dict[HandlerKind, asyncio.Future] = {}
+
+    def kind(self, name: str) -> Optional[HandlerKind]:
+        """the registered kind called `name`, if any"""
+        try:
+            kind = HandlerKind(name)
+        except ValueError:
+            return None
+        return kind if kind in self.modules else None
+
+    async def get(self, kind: HandlerKind):
+        """the kind's handler, loading it on first use"""
+        handler = self.handlers.get(kind)
+        if handler is not None:
+            return handler
+        loading = self._loading.get(kind)
+        if loading is None:
+            loading = self._loading[kind] = asyncio.ensure_future(self._load(kind))
+        # one waiting connection going away must not cancel the load for all
+        return await asyncio.shield(loading)
+
+    async def _load(self, kind: HandlerKind):
+        started = time.perf_counter()
+        try:
+            handler = self._built.get(kind)
+            if handler is None:
+                module_name, class_name = self.modules[kind].split(":")
+                module = await asyncio.get_running_loop().run_in_executor(
+                    None, importlib.import_module, module_name
+                )
+                # kept if start() fails, so a retry doesn't subscribe twice
+                handler = self._built[kind] = getattr(module, class_name)(self.emitters[kind])
+            await handler.start()
+            self.handlers[kind] = handler
+        finally:
+            # after a failure the next connection tries again
+            self._loading.pop(kind, None)
+        elapsed = time.perf_counter() - started
+        HANDLER_LOAD_SECONDS.labels(kind.value).set(elapsed)
+        logger.info(f"Loaded {kind.value} handler in {elapsed * 1000:.0f} ms")
+        return handler
+
+
+handler_registry = HandlerRegistry(HANDLER_MODULES)
@@ -1,6 +1,23 @@
 from ..event_emitter import EventEmitter
+import json
+from ..events import Event
 from .base_handler import BaseHandler
 
 class ResumeHandler(BaseHandler):
     def __init__(self, event_emitter: EventEmitter):
         super().__init__(event_emitter, "Resume")
+
+    def decode(self, data: str, user: dict) -> dict:
+        try:
+            message_data = super().decode(data, user)
+        except json.JSONDecodeError:
+            # plain-text keepalives
+            message_data = None
+        if not isinstance(message_data, dict):
+            message_data = {"data": data}
+        return message_data
+
+    async def handle_message(self, event: Event) -> None:
+        # Anything that isn't an RPC request or ingress command, e.g. keepalives, is ignored
+        if not (await self.route_rpc(event) or self.route_ingress(event)):
+            await super().handle_message(event)
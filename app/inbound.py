@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+from fastapi import WebSocket, status
+
+from .config import settings
+from .connection_manager import ConnectionManager
+from .handlers import HandlerKind
+from .metrics import Counter, Histogram
+from .rate_limit import ConnectionRateLimiter, Verdict
+
+logger = logging.getLogger(__name__)
+
+INBOUND_QUEUE_WAIT = Histogram(
+    "sockets_inbound_queue_wait_seconds",
+    "Time an inbound frame waited in the per-connection queue before dispatch",
+    labelnames=("kind",),
+)
+
+OVERSIZED_FRAMES = Counter(
+    "sockets_oversized_frames_total",
+    "Inbound frames over the handler kind's size limit",
+    labelnames=("kind",),
+)
+
+INBOUND_FRAMES = Counter(
+    "sockets_inbound_frames_total",
+    "Frames read from clients",
+    labelnames=("kind",),
+)
+# Counted as text length, which equals bytes for ASCII payloads, to avoid
+# encoding every frame
+INBOUND_BYTES = Counter(
+    "sockets_inbound_bytes_total",
+    "Payload size of frames read from clients",
+    labelnames=("kind",),
+)
+
+
+def utf8_length_exceeds(data: str, limit: int) -> bool:
+    # A character is at most 4 bytes, so short frames skip the encode
+    if len(data) * 4 <= limit:
+        return False
+    return len(data) > limit or len(data.encode("utf-8")) > limit
+
+
+class InboundPipeline:
+    """
+    Reads frames off a websocket into a bounded queue that is drained by
+    handler workers, so a slow handler never blocks the socket reader.
+
+    With a single worker (the default) frames are dispatched strictly in
+    arrival order. Handlers whose commands are independent can opt into more
+    workers through `settings.handler_concurrency`; dispatch then still starts
+    in arrival order but may complete out of order.
+    """
+
+    def __init__(
+        self,
+        kind: HandlerKind,
+        websocket: WebSocket,
+        dispatch: Callable[[str], Awaitable[None]],
+        user: dict,
+        max_queue: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ):
+        self.kind = kind
+        self.websocket = websocket
+        self.dispatch = dispatch
+        self.queue: asyncio.Queue = asyncio.Queue(
+            maxsize=max_queue or settings.inbound_queue_size
+        )
+        self.concurrency = max(
+            1, concurrency or settings.handler_concurrency.get(kind.value, 1)
+        )
+        self._queue_wait = INBOUND_QUEUE_WAIT.labels(kind.value)
+        self._record = ConnectionManager().get_record(websocket)
+        self._rate_limiter = ConnectionRateLimiter(kind, user)
+        self.max_frame_bytes = settings.max_frame_bytes.get(
+            kind.value, settings.ws_max_size
+        )
+
+    async def run(self) -> None:
+        """read until the socket disconnects, then stop the workers"""
+        workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+        try:
+            await self._read()
+        finally:
+            self._rate_limiter.close()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _read(self) -> None:
+        receive_text = self.websocket.receive_text
+        put = self.queue.put
+        record = self._record
+        check_rate = self._rate_limiter.check
+        max_frame_bytes = self.max_frame_bytes
+        inbound_frames = INBOUND_FRAMES.labels(self.kind.value)
+        inbound_bytes = INBOUND_BYTES.labels(self.kind.value)
+        while True:
+            data = await receive_text()
+            inbound_frames.inc()
+            inbound_bytes.inc(len(data))
+            if utf8_length_exceeds(data, max_frame_bytes):
+                OVERSIZED_FRAMES.labels(self.kind.value).inc()
+                await self.websocket.close(
+                    code=status.WS_1009_MESSAGE_TOO_BIG,
+                    reason=f"frame exceeds {max_frame_bytes} bytes",
+                )
+                return
+            # limits apply before any parsing so a flood stays cheap
+            verdict = await check_rate()
+            if verdict is Verdict.DROP:
+                continue
+            if verdict is Verdict.CLOSE:
+                await self.websocket.close(
+                    code=status.WS_1008_POLICY_VIOLATION, reason="rate limit exceeded"
+                )
+                return
+            now = time.monotonic()
+            if record is not None:
+                record.messages_in += 1
+                record.last_activity = now
+            # blocks when the queue is full, pushing back on the client
+            await put((now, data))
+
+    async def _worker(self) -> None:
+        get = self.queue.get
+        while True:
+            enqueued_at, data = await get()
+            self._queue_wait.observe(time.monotonic() - enqueued_at)
+            try:
+                await self.dispatch(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(
+                    f"Error dispatching {self.kind.value} message: {str(e)}",
+                    exc_info=True,
+                )
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,45 @@
+import json
+import re
+from typing import Any
+
+from .config import settings
+
+# Strings are matched whole so brackets inside them are not counted
+_STRUCTURE = re.compile(r'"(?:[^"\\]|\\.)*"|[\[\]{}]')
+
+
+class JSONGuardError(json.JSONDecodeError):
+    """raised instead of parsing a document that is too large or too deep"""
+
+
+def nesting_depth(document: str) -> int:
+    depth = deepest = 0
+    for match in _STRUCTURE.finditer(document):
+        token = match.group()
+        if token in "[{":
+            depth += 1
+            if depth > deepest:
+                deepest = depth
+        elif token in "]}":
+            depth -= 1
+    return deepest
+
+
+def guarded_loads(
+    document: str,
+    max_chars: int = None,
+    max_depth: int = None,
+) -> Any:
+    """json.loads that refuses oversized or deeply nested documents up front"""
+    max_chars = max_chars or settings.json_max_chars
+    max_depth = max_depth or settings.json_max_depth
+
+    if len(document) > max_chars:
+        raise JSONGuardError(f"Document exceeds {max_chars} characters", document, 0)
+
+    # Cheap pre-check: a document cannot nest deeper than its open brackets
+    if document.count("{") + document.count("[") > max_depth:
+        if nesting_depth(document) > max_depth:
+            raise JSONGuardError(f"Document nests deeper than {max_depth}", document, 0)
+
+    return json.loads(document)
@@ -0,0 +1,91 @@
+"""
+Credit-based flow control for log streams.
+
+A viewer opens a stream with a number of credits and grants more as it
+renders lines. Each `log_line` costs one credit. When credits run out, the
+stream does one of two things:
+
+- `pause`: stop taking lines from the merge. Its bounded queues fill and the
+  Docker reads stop until credits arrive. Nothing is lost.
+- `skip`: keep reading, but count the lines instead of sending them. The
+  next grant first sends a `logs_skipped` summary.
+
+Either way the server holds at most the merge buffers per viewer, however
+slow the browser is.
+"""
+
+import asyncio
+from typing import Optional
+
+from .metrics import Counter, Gauge
+
+LOG_LINES_SKIPPED = Counter(
+    "sockets_log_lines_skipped_total",
+    "Log lines not sent because the viewer ran out of credits",
+)
+PAUSED_LOG_STREAMS = Gauge(
+    "sockets_log_streams_paused", "Log streams waiting for credits"
+)
+
+MODES = ("pause", "skip")
+
+
+class CreditWindow:
+    def __init__(self, credits: int, mode: str, max_credits: int):
+        if mode not in MODES:
+            raise ValueError(f"on_exhausted must be one of {', '.join(MODES)}")
+        self.max_credits = max_credits
+        self.credits = min(max(0, credits), max_credits)
+        self.mode = mode
+        self.skipped = 0
+        self.skipped_by_container: dict[str, int] = {}
+        self.first_skipped: Optional[str] = None
+        self.last_skipped: Optional[str] = None
+        self._granted = asyncio.Event()
+
+    def grant(self, credits: int) -> None:
+        """add credits, up to `max_credits` outstanding"""
+        self.credits = min(self.credits + max(0, credits), self.max_credits)
+        if self.credits:
+            self._granted.set()
+
+    def take(self) -> bool:
+        if self.credits <= 0:
+            return False
+        self.credits -= 1
+        return True
+
+    async def wait(self) -> None:
+        """until there is a credit to take"""
+        PAUSED_LOG_STREAMS.inc()
+        try:
+            while self.credits <= 0:
+                self._granted.clear()
+                await self._granted.wait()
+        finally:
+            PAUSED_LOG_STREAMS.dec()
+
+    def skip(self, container_name: str, timestamp: Optional[str]) -> None:
+        self.skipped += 1
+        self.skipped_by_container[container_name] = self.skipped_by_container.get(container_name, 0) + 1
+        if timestamp is not None:
+            if self.first_skipped is None:
+                self.first_skipped = timestamp
+            self.last_skipped = timestamp
+        LOG_LINES_SKIPPED.inc()
+
+    def take_summary(self) -> Optional[dict]:
+        """what was skipped since the last summary, if anything"""
+        if not self.skipped:
+            return None
+        summary = {
+            "skipped": self.skipped,
+            "containers": self.skipped_by_container,
+            "first_timestamp": self.first_skipped,
+            "last_timestamp": self.last_skipped,
+        }
+        self.skipped = 0
+        self.skipped_by_container = {}
+        self.first_skipped = None
+        self.last_skipped = None
+        return summary
@@ -0,0 +1,125 @@
+"""
+Timestamp-ordered merge of several live log streams.
+
+Docker prefixes each line with an RFC 3339 timestamp when asked for
+`timestamps=True`. One reader per stream parses that prefix and fills a
+bounded queue. The merge keeps the head line of every stream in a heap and
+emits the oldest. While some stream has nothing buffered, it holds the
+oldest line for up to `window` seconds in case that stream has something
+older in flight, then emits anyway. Idle containers therefore never stall
+the merge. Without a window (for logs that are not followed, so every
+stream ends) the merge waits and the order is exact.
+
+Backpressure is end to end: the merge only pulls lines as fast as its
+consumer takes them, full queues stop their readers, and a stopped reader
+stops reading from Docker.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from typing import AsyncIterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def split_timestamp(line: str) -> tuple[Optional[str], str]:
+    """`2024-01-01T12:00:00.123456789Z text` -> (timestamp, text)"""
+    timestamp, _, text = line.partition(" ")
+    if len(timestamp) >= 20 and timestamp[4] == "-" and timestamp[10] == "T":
+        return timestamp, text
+    return None, line
+
+
+def timestamp_key(timestamp: str) -> str:
+    """
+    A string that sorts like the time. Fractions are padded to nanoseconds,
+    because RFC 3339 allows trimmed trailing zeros. Docker always logs UTC.
+    """
+    whole, _, fraction = timestamp.rstrip("Z").partition(".")
+    return f"{whole}.{fraction:0<9}"
+
+
+class LogMerge:
+    def __init__(self, sources: dict[str, AsyncIterator[str]], buffer: int, window: Optional[float]):
+        """`sources` maps a container name to its line iterator"""
+        self.sources = sources
+        self.window = window
+        self._queues = {name: asyncio.Queue(maxsize=buffer) for name in sources}
+        self._arrived = asyncio.Event()
+        self._readers: list[asyncio.Task] = []
+
+    async def _read(self, name: str, lines: AsyncIterator[str]) -> None:
+        queue = self._queues[name]
+        # continuation lines without a prefix sort with the line before them
+        key = ""
+        try:
+            async for line in lines:
+                timestamp, text = split_timestamp(line.rstrip())
+                if timestamp is not None:
+                    key = timestamp_key(timestamp)
+                await queue.put((key, timestamp, text, time.monotonic()))
+                self._arrived.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Log stream for {name} failed: {e}")
+        finally:
+            # runs the source's cleanup now rather than when it is collected
+            aclose = getattr(lines, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        # end of stream
+        await queue.put(None)
+        self._arrived.set()
+
+    def close(self) -> None:
+        """stop the readers; the merge may be suspended at a yield"""
+        for reader in self._readers:
+            reader.cancel()
+
+    async def __aiter__(self):
+        """yield (container name, timestamp or None, text), oldest first"""
+        self._readers = [
+            asyncio.create_task(self._read(name, lines)) for name, lines in self.sources.items()
+        ]
+        heap: list[tuple] = []
+        # streams that are still open but have no line in the heap
+        empty = set(self.sources)
+        sequence = 0
+        try:
+            while heap or empty:
+                self._arrived.clear()
+                for name in list(empty):
+                    queue = self._queues[name]
+                    if queue.empty():
+                        continue
+                    item = queue.get_nowait()
+                    empty.discard(name)
+                    if item is not None:
+                        key, timestamp, text, arrived = item
+                        # the sequence number keeps equal timestamps in arrival order
+                        heapq.heappush(heap, (key, sequence, arrived, name, timestamp, text))
+                        sequence += 1
+
+                if heap:
+                    waited = time.monotonic() - heap[0][2]
+                    if not empty or (self.window is not None and waited >= self.window):
+                        _, _, _, name, timestamp, text = heapq.heappop(heap)
+                        empty.add(name)
+                        yield name, timestamp, text
+                        continue
+                    timeout = None if self.window is None else self.window - waited
+                elif empty:
+                    timeout = None
+                else:
+                    # every stream ended
+                    break
+
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.close()
@@ -0,0 +1,149 @@
+"""
+Paged search over past container logs.
+
+A query reads Docker logs between `since` and `until` without following,
+merged by timestamp across its containers. It keeps the lines that match
+its filter and stops after one page. Each page ends with a cursor: the
+timestamp of the last line, plus how many lines each container had at that
+exact timestamp. To get the next page, the client sends the same query with
+the cursor. Docker is then asked for logs from that time on. No state is
+kept between pages, and at most one page is held in memory.
+"""
+
+import base64
+import json
+import math
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+from .log_merge import LogMerge, timestamp_key
+
+
+def parse_time(value) -> Optional[float]:
+    """unix seconds, or an ISO 8601 time (UTC when it has no offset)"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError(f"Invalid time '{value}', use unix seconds or ISO 8601")
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    raise ValueError(f"Invalid time '{value}', use unix seconds or ISO 8601")
+
+
+def key_to_unix(key: str) -> float:
+    """a `timestamp_key` as unix seconds, rounded down to the microsecond"""
+    whole, _, nanoseconds = key.partition(".")
+    seconds = datetime.fromisoformat(whole).replace(tzinfo=timezone.utc).timestamp()
+    return seconds + math.floor(int(nanoseconds or 0) / 1000) / 1e6
+
+
+def encode_cursor(key: str, counts: dict[str, int]) -> str:
+    payload = json.dumps({"k": key, "n": counts}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, dict[str, int]]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(payload["k"]), {str(name): int(n) for name, n in payload["n"].items()}
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+class LogQuery:
+    def __init__(
+        self,
+        since: Optional[float],
+        until: Optional[float],
+        pattern: Optional[str],
+        regex: bool,
+        page_size: int,
+        cursor: Optional[str] = None,
+    ):
+        if since is not None and until is not None and until <= since:
+            raise ValueError("until must be after since")
+        if page_size < 1:
+            raise ValueError("page_size must be positive")
+        self.since = since
+        self.until = until
+        self.page_size = page_size
+        self._match = None
+        if pattern:
+            if regex:
+                try:
+                    self._match = re.compile(pattern).search
+                except re.error as e:
+                    raise ValueError(f"Invalid filter: {e}")
+            else:
+                self._match = lambda text: pattern in text
+        self.cursor_key, self.cursor_counts = decode_cursor(cursor) if cursor else (None, {})
+
+    @classmethod
+    def from_request(cls, data: dict, default_page_size: int, max_page_size: int) -> "LogQuery":
+        """raises ValueError with a message for the client"""
+        try:
+            page_size = int(data.get("page_size") or default_page_size)
+        except (TypeError, ValueError):
+            raise ValueError("page_size must be a number")
+        return cls(
+            since=parse_time(data.get("since")),
+            until=parse_time(data.get("until")),
+            pattern=data.get("filter"),
+            regex=bool(data.get("regex")),
+            page_size=min(page_size, max_page_size),
+            cursor=data.get("cursor"),
+        )
+
+    @property
+    def read_since(self) -> Optional[float]:
+        """where Docker should start reading, just before the cursor if there is one"""
+        if self.cursor_key is not None:
+            return max(self.since or 0.0, key_to_unix(self.cursor_key))
+        return self.since
+
+    async def page(self, merge: LogMerge) -> dict:
+        """read `merge` until one page matched or every stream ended"""
+        lines = []
+        scanned = 0
+        # lines without a timestamp sort with their container's previous line
+        last_keys: dict[str, str] = {}
+        skipped: dict[str, int] = {}
+        current_key = self.cursor_key
+        counts = dict(self.cursor_counts)
+
+        async for name, timestamp, text in merge:
+            key = timestamp_key(timestamp) if timestamp else last_keys.get(name, "")
+            last_keys[name] = key
+            if self.cursor_key is not None and key <= self.cursor_key:
+                if key < self.cursor_key:
+                    continue
+                # returned by the previous page
+                if skipped.get(name, 0) < self.cursor_counts.get(name, 0):
+                    skipped[name] = skipped.get(name, 0) + 1
+                    continue
+
+            scanned += 1
+            if key != current_key:
+                current_key = key
+                counts = {}
+            counts[name] = counts.get(name, 0) + 1
+
+            if self._match is not None and not self._match(text):
+                continue
+            lines.append({"container": name, "timestamp": timestamp, "text": text})
+            if len(lines) >= self.page_size:
+                return {
+                    "lines": lines,
+                    "scanned": scanned,
+                    "cursor": encode_cursor(current_key, counts),
+                    "done": False,
+                }
+
+        return {"lines": lines, "scanned": scanned, "cursor": None, "done": True}
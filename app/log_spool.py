@@ -0,0 +1,456 @@
+"""
+Optional on-disk spool of container logs.
+
+For each container in LOG_SPOOL_CONTAINERS, one follower thread reads the
+Docker log stream and appends it to rotating segment files under
+`<LOG_SPOOL_DIR>/<container>/`:
+
+- `<seq>.log` holds the lines as Docker sends them: `<timestamp> <text>\\n`.
+- `<seq>.idx` is a sparse index of fixed 16-byte records (unix ns, offset).
+  There is one record at the start of each segment, then one roughly every
+  LOG_SPOOL_INDEX_BYTES.
+
+Segments are keyed by container name, so the history outlives recreated
+containers. Reads go through the filesystem and mmap. A replay binary
+searches the index, scans less than one index interval, and then reads the
+mapped pages without copying them into Python buffers.
+
+Only the process holding `<LOG_SPOOL_DIR>/.lock` writes. Other workers read
+the same files. The writer flushes after every Docker chunk, and readers
+stop at the last complete line. Retention removes whole segments, oldest
+first, past LOG_SPOOL_RETENTION_BYTES per container, or once everything in
+them is older than LOG_SPOOL_RETENTION_SECONDS.
+"""
+
+import asyncio
+import bisect
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+from .config import settings
+from .docker_client import get_docker_client
+from .metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+SPOOLED_LINES = Counter(
+    "sockets_log_spool_lines_total",
+    "Log lines appended to the on-disk spool",
+    labelnames=("container",),
+)
+SPOOL_BYTES = Gauge(
+    "sockets_log_spool_bytes",
+    "Bytes of log segments on disk",
+    labelnames=("container",),
+)
+
+INDEX_RECORD = struct.Struct("<qQ")
+RECONNECT_DELAY = 5.0
+# lines replayed between yields to the event loop
+REPLAY_BATCH = 1000
+
+_seconds_cache: dict[str, int] = {}
+
+
+def timestamp_ns(timestamp: str) -> int:
+    """`2024-01-01T12:00:00.123456789Z` as unix nanoseconds"""
+    whole, _, fraction = timestamp.rstrip("Z").partition(".")
+    seconds = _seconds_cache.get(whole)
+    if seconds is None:
+        if len(_seconds_cache) > 4096:
+            _seconds_cache.clear()
+        seconds = _seconds_cache[whole] = int(
+            datetime.fromisoformat(whole).replace(tzinfo=timezone.utc).timestamp()
+        )
+    return seconds * 1_000_000_000 + int(f"{fraction[:9]:0<9}")
+
+
+def _line_ns(line: bytes) -> Optional[int]:
+    space = line.find(b" ", 0, 40)
+    if space < 20:
+        return None
+    try:
+        return timestamp_ns(line[:space].decode())
+    except ValueError:
+        return None
+
+
+class _Index:
+    """the index records' timestamps as a sequence, for bisect"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data) // INDEX_RECORD.size
+
+    def __getitem__(self, i: int) -> int:
+        return INDEX_RECORD.unpack_from(self.data, i * INDEX_RECORD.size)[0]
+
+    def offset(self, i: int) -> int:
+        return INDEX_RECORD.unpack_from(self.data, i * INDEX_RECORD.size)[1]
+
+
+class _SegmentWriter:
+    """appends one container's lines; used only from its follower thread"""
+
+    def __init__(self, directory: str, segment_bytes: int, index_bytes: int, retention_bytes: int, retention_seconds: int):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_bytes = index_bytes
+        self.retention_bytes = retention_bytes
+        self.retention_seconds = retention_seconds
+        self.last_ns = 0
+        os.makedirs(directory, exist_ok=True)
+
+        segments = _segments(directory)
+        self.seq = segments[-1] if segments else 1
+        self._open()
+        # where to resume; the newest segment is empty right after a rotation
+        for seq in reversed(segments):
+            self.last_ns = self._last_line_ns(seq)
+            if self.last_ns:
+                break
+
+    def _path(self, seq: int, suffix: str) -> str:
+        return os.path.join(self.directory, f"{seq:012d}{suffix}")
+
+    def _open(self) -> None:
+        self.log = open(self._path(self.seq, ".log"), "ab")
+        self.idx = open(self._path(self.seq, ".idx"), "ab")
+        self.size = self.log.tell()
+        index_size = self.idx.tell()
+        if index_size >= INDEX_RECORD.size:
+            with open(self._path(self.seq, ".idx"), "rb") as f:
+                f.seek(index_size - INDEX_RECORD.size)
+                self.last_indexed = INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))[1]
+        else:
+            self.last_indexed = -self.index_bytes
+
+    def _last_line_ns(self, seq: int) -> int:
+        with open(self._path(seq, ".log"), "rb") as f:
+            f.seek(max(0, os.fstat(f.fileno()).st_size - 64 * 1024))
+            for line in reversed(f.read().splitlines()):
+                ns = _line_ns(line)
+                if ns is not None:
+                    return ns
+        return 0
+
+    def append(self, line: bytes, ns: int) -> None:
+        if self.size >= self.segment_bytes:
+            self.rotate()
+        if self.size - self.last_indexed >= self.index_bytes:
+            self.idx.write(INDEX_RECORD.pack(ns, self.size))
+            self.last_indexed = self.size
+        self.log.write(line)
+        self.log.write(b"\n")
+        self.size += len(line) + 1
+        self.last_ns = ns
+
+    def flush(self) -> None:
+        # data before index, so an index record never points past the data
+        self.log.flush()
+        self.idx.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self.log.close()
+        self.idx.close()
+
+    def rotate(self) -> None:
+        self.close()
+        self.seq += 1
+        self._open()
+        self.enforce_retention()
+
+    def enforce_retention(self) -> None:
+        segments = _segments(self.directory)
+        sizes = {seq: _size(self._path(seq, ".log")) for seq in segments}
+        total = sum(sizes.values())
+        cutoff_ns = int((time.time() - self.retention_seconds) * 1e9)
+        # the active segment always stays
+        for seq, next_seq in zip(segments, segments[1:]):
+            # every line in `seq` is older than the first line of `next_seq`
+            next_first = _first_ns(self._path(next_seq, ".idx"))
+            expired = next_first is not None and next_first < cutoff_ns
+            if total <= self.retention_bytes and not expired:
+                break
+            for suffix in (".log", ".idx"):
+                try:
+                    os.remove(self._path(seq, suffix))
+                except FileNotFoundError:
+                    pass
+            total -= sizes[seq]
+
+
+def _segments(directory: str) -> list[int]:
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(int(name[:-4]) for name in names if name.endswith(".log") and name[:-4].isdigit())
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def _first_ns(index_path: str) -> Optional[int]:
+    try:
+        with open(index_path, "rb") as f:
+            record = f.read(INDEX_RECORD.size)
+    except FileNotFoundError:
+        return None
+    if len(record) < INDEX_RECORD.size:
+        return None
+    return INDEX_RECORD.unpack(record)[0]
+
+
+class LogSpool:
+    def __init__(
+        self,
+        directory: str,
+        containers: list[str],
+        segment_bytes: int,
+        index_bytes: int,
+        retention_bytes: int,
+        retention_seconds: int,
+    ):
+        self.directory = directory
+        self.containers = set(containers)
+        self.segment_bytes = segment_bytes
+        self.index_bytes = index_bytes
+        self.retention_bytes = retention_bytes
+        self.retention_seconds = retention_seconds
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._streams: dict[str, object] = {}
+        self._lock_file = None
+        SPOOL_BYTES.set_function(self._disk_usage)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory and self.containers)
+
+    @property
+    def writing(self) -> bool:
+        return bool(self._threads)
+
+    def start(self) -> None:
+        """follow the configured containers if no other process already does"""
+        if not self.enabled or self.writing:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(os.path.join(self.directory, ".lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            logger.info("Another process writes the log spool, reading only")
+            return
+        self._lock_file = lock_file
+        self._stopping.clear()
+        for name in sorted(self.containers):
+            thread = threading.Thread(
+                target=self._follow, args=(name,), name=f"log-spool-{name}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Spooling logs of {', '.join(sorted(self.containers))} to {self.directory}")
+
+    def stop(self) -> None:
+        if not self.writing:
+            return
+        self._stopping.set()
+        for stream in list(self._streams.values()):
+            try:
+                # unblocks the follower thread
+                stream.close()
+            except Exception:
+                pass
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+        self._lock_file.close()
+        self._lock_file = None
+
+    def covers(self, container_name: str, since: Optional[float]) -> bool:
+        """whether the spool holds every line of the container from `since` on"""
+        if since is None or container_name not in self.containers:
+            return False
+        directory = os.path.join(self.directory, container_name)
+        segments = _segments(directory)
+        if not segments:
+            return False
+        first = _first_ns(os.path.join(directory, f"{segments[0]:012d}.idx"))
+        return first is not None and first <= since * 1e9
+
+    # follower thread
+
+    def _follow(self, container_name: str) -> None:
+        import docker
+
+        writer = _SegmentWriter(
+            os.path.join(self.directory, container_name),
+            self.segment_bytes,
+            self.index_bytes,
+            self.retention_bytes,
+            self.retention_seconds,
+        )
+        lines_total = SPOOLED_LINES.labels(container_name)
+        try:
+            writer.enforce_retention()
+            client = get_docker_client()
+            while not self._stopping.is_set():
+                try:
+                    container = client.containers.get(container_name)
+                    # since is inclusive; lines at or before last_ns are skipped below
+                    since = writer.last_ns / 1e9 if writer.last_ns else time.time() - self.retention_seconds
+                    stream = container.logs(stream=True, follow=True, timestamps=True, since=since)
+                    self._streams[container_name] = stream
+                    buffer = b""
+                    for chunk in stream:
+                        buffer += chunk
+                        *lines, buffer = buffer.split(b"\n")
+                        for line in lines:
+                            ns = _line_ns(line)
+                            if ns is None:
+                                ns = writer.last_ns
+                            elif ns <= writer.last_ns:
+                                continue
+                            writer.append(line, ns)
+                            lines_total.inc()
+                        writer.flush()
+                except docker.errors.NotFound:
+                    pass
+                except Exception as e:
+                    if self._stopping.is_set():
+                        break
+                    logger.warning(f"Log spool stream for {container_name} failed, reconnecting: {e}")
+                finally:
+                    self._streams.pop(container_name, None)
+                # the container stopped or is being recreated
+                self._stopping.wait(RECONNECT_DELAY)
+        except Exception as e:
+            logger.error(f"Log spool for {container_name} stopped: {e}", exc_info=True)
+        finally:
+            writer.close()
+
+    def _disk_usage(self) -> dict:
+        usage = {}
+        for name in self.containers:
+            directory = os.path.join(self.directory, name)
+            usage[(name,)] = sum(
+                _size(os.path.join(directory, f"{seq:012d}.log")) for seq in _segments(directory)
+            )
+        return usage
+
+    # readers: file lookups run in the default executor, the scan on the loop
+
+    async def lines(self, container_name: str, since: Optional[float], until: Optional[float] = None) -> AsyncIterator[str]:
+        """spooled lines from `since` up to `until` (unix seconds), as Docker sent them"""
+        loop = asyncio.get_running_loop()
+        directory = os.path.join(self.directory, container_name)
+        since_ns = int(since * 1e9) if since is not None else 0
+        until_ns = int(until * 1e9) if until is not None else None
+
+        segments = await loop.run_in_executor(None, self._replay_segments, directory, since_ns)
+
+        count = 0
+        for position, seq in enumerate(segments):
+            path = os.path.join(directory, f"{seq:012d}")
+            opened = await loop.run_in_executor(
+                None, self._open_segment, path, since_ns if position == 0 else 0
+            )
+            if opened is None:
+                continue
+            data, offset = opened
+            view = memoryview(data)
+            try:
+                # only lines up to one index interval in need the since check
+                before_since = position == 0 and since_ns > 0
+                # a line is complete once its newline is flushed
+                end = data.rfind(b"\n") + 1
+                while offset < end:
+                    newline = data.find(b"\n", offset, end)
+                    line = view[offset:newline]
+                    offset = newline + 1
+                    if before_since or until_ns is not None:
+                        ns = _line_ns(line[:40].tobytes())
+                        if ns is not None:
+                            if ns < since_ns:
+                                continue
+                            before_since = False
+                            if until_ns is not None and ns > until_ns:
+                                return
+                    count += 1
+                    if count % REPLAY_BATCH == 0:
+                        await asyncio.sleep(0)
+                    yield str(line, "utf-8", "replace")
+            finally:
+                line = None
+                view.release()
+                data.close()
+
+    @staticmethod
+    def _replay_segments(directory: str, since_ns: int) -> list[int]:
+        """the segments to read for lines from `since_ns` on"""
+        segments = _segments(directory)
+        firsts = [_first_ns(os.path.join(directory, f"{seq:012d}.idx")) or 0 for seq in segments]
+        # the last segment starting at or before `since`
+        start = max(0, bisect.bisect_right(firsts, since_ns) - 1)
+        return segments[start:]
+
+    @classmethod
+    def _open_segment(cls, path: str, since_ns: int) -> Optional[tuple[mmap.mmap, int]]:
+        """the segment's log mapped, and where to start reading; None if empty or gone"""
+        try:
+            log_file = open(path + ".log", "rb")
+        except FileNotFoundError:
+            # removed by retention since the listing
+            return None
+        with log_file:
+            if os.fstat(log_file.fileno()).st_size == 0:
+                return None
+            data = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return data, cls._seek(path + ".idx", len(data), since_ns)
+
+    @staticmethod
+    def _seek(index_path: str, size: int, since_ns: int) -> int:
+        """offset of an indexed line at or before `since_ns`"""
+        if not since_ns:
+            return 0
+        try:
+            index_file = open(index_path, "rb")
+        except FileNotFoundError:
+            return 0
+        with index_file:
+            if os.fstat(index_file.fileno()).st_size < INDEX_RECORD.size:
+                return 0
+            data = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        with data:
+            index = _Index(data)
+            i = bisect.bisect_right(index, since_ns) - 1
+            offset = index.offset(i) if i >= 0 else 0
+        # the index may be ahead of the flushed data of another process
+        return offset if offset < size else 0
+
+
+log_spool = LogSpool(
+    directory=settings.log_spool_dir,
+    containers=settings.log_spool_containers,
+    segment_bytes=settings.log_spool_segment_bytes,
+    index_bytes=settings.log_spool_index_bytes,
+    retention_bytes=settings.log_spool_retention_bytes,
+    retention_seconds=settings.log_spool_retention_seconds,
+)
@@ -0,0 +1,180 @@
+import asyncio
+import asyncio.events
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from .config import settings
+from .metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = Histogram(
+    "sockets_event_loop_lag_seconds",
+    "How late the loop lag sampler woke up",
+)
+SLOW_CALLBACKS = Counter(
+    "sockets_slow_callbacks_total",
+    "Event loop callbacks that ran longer than the slow-callback threshold",
+)
+
+
+def _describe(handle: asyncio.events.Handle) -> tuple[str, list[str]]:
+    """a readable name for the callback and the coroutine chain it was running"""
+    task = getattr(handle._callback, "__self__", None)
+    if not isinstance(task, asyncio.Task):
+        return repr(handle)[:200], []
+
+    chain = []
+    coro = task.get_coro()
+    while coro is not None and len(chain) < 16:
+        chain.append(getattr(coro, "__qualname__", repr(coro)))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return f"Task {task.get_name()}", chain
+
+
+class LoopMonitor:
+    """
+    Samples event loop lag and reports callbacks that block the loop.
+
+    Slow-callback detection wraps asyncio's Handle._run only while enabled,
+    and a watchdog thread captures the loop thread's stack while an overlong
+    callback is still running, so the report shows the blocking call itself.
+    Disabling restores the original Handle._run, so it costs nothing when off.
+    """
+
+    def __init__(
+        self,
+        lag_interval: float,
+        slow_callback_threshold: float,
+        history: int = 50,
+    ):
+        self.lag_interval = lag_interval
+        self.slow_callback_threshold = slow_callback_threshold
+        self.slow_callbacks: deque = deque(maxlen=history)
+        self.last_lag: Optional[float] = None
+        self.max_lag = 0.0
+
+        self._original_run = None
+        self._sampler: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop_watchdog = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+
+        # written on the loop thread, read by the watchdog
+        self._running_handle = None
+        self._running_since = 0.0
+        self._captured: dict[int, list[str]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self._original_run is not None
+
+    def enable(self) -> None:
+        if self.enabled:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._original_run = original_run = asyncio.events.Handle._run
+        monitor = self
+
+        def _timed_run(handle):
+            started = time.perf_counter()
+            monitor._running_handle = handle
+            monitor._running_since = started
+            try:
+                return original_run(handle)
+            finally:
+                monitor._running_handle = None
+                duration = time.perf_counter() - started
+                if duration >= monitor.slow_callback_threshold:
+                    monitor._record_slow(handle, duration)
+
+        asyncio.events.Handle._run = _timed_run
+
+        self._stop_watchdog.clear()
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-monitor-watchdog", daemon=True
+        )
+        self._watchdog.start()
+        self._sampler = asyncio.get_running_loop().create_task(self._sample_lag())
+        logger.info(
+            f"Loop monitor enabled (lag every {self.lag_interval}s, slow callbacks over {self.slow_callback_threshold}s)"
+        )
+
+    def disable(self) -> None:
+        if not self.enabled:
+            return
+
+        asyncio.events.Handle._run = self._original_run
+        self._original_run = None
+        self._stop_watchdog.set()
+        if self._watchdog is not None:
+            # it wakes on the event, so this is quick; a re-enable right
+            # after must not clear the event under a watchdog still running
+            self._watchdog.join(timeout=1.0)
+            self._watchdog = None
+        if self._sampler is not None:
+            self._sampler.cancel()
+            self._sampler = None
+        self._running_handle = None
+        self._captured.clear()
+        logger.info("Loop monitor disabled")
+
+    async def _sample_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, loop.time() - expected)
+            self.last_lag = lag
+            if lag > self.max_lag:
+                self.max_lag = lag
+            LOOP_LAG.observe(lag)
+
+    def _watch(self) -> None:
+        while not self._stop_watchdog.wait(self.slow_callback_threshold / 2):
+            handle = self._running_handle
+            if handle is None or id(handle) in self._captured:
+                continue
+            if time.perf_counter() - self._running_since < self.slow_callback_threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None and self._running_handle is handle:
+                self._captured[id(handle)] = traceback.format_stack(frame)
+
+    def _record_slow(self, handle, duration: float) -> None:
+        SLOW_CALLBACKS.inc()
+        stack = self._captured.pop(id(handle), None)
+        name, chain = _describe(handle)
+        self.slow_callbacks.append(
+            {
+                "at": time.time(),
+                "duration_ms": round(duration * 1000, 3),
+                "callback": name,
+                "coroutines": chain,
+                # captured mid-callback by the watchdog when it ran long enough
+                "stack": stack or [],
+            }
+        )
+        logger.warning(f"Slow callback {name} took {duration * 1000:.1f}ms: {chain}")
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "lag_interval": self.lag_interval,
+            "slow_callback_threshold": self.slow_callback_threshold,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+            "slow_callbacks": list(self.slow_callbacks),
+        }
+
+
+loop_monitor = LoopMonitor(
+    lag_interval=settings.loop_lag_interval,
+    slow_callback_threshold=settings.slow_callback_threshold,
+)
@@ -1,75 +1,97 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Response
+from fastapi import Depends, FastAPI, WebSocket, WebSocketDisconnect, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+import functools
 import logging
-import json
 from pathlib import Path
 import asyncio
 
 from .mq import initialize_rabbitmq, shutdown_rabbitmq
 from .mq.consumers import *
+from .mq.publishers import *
 from .config import settings
+from .admission import AdmissionRejected, admission_controller
 from .auth import Auth
+from .cluster import cluster
+from .docker_watcher import container_watcher
+from .log_spool import log_spool
+from .drain import drain_controller
 from .events import Event, EventType
 from .connection_manager import ConnectionManager
-from .event_emitter import EventEmitter
-from .handlers.echo_handler import EchoHandler
-from .handlers.logs_handler import ContainerLogsHandler
+from .inbound import InboundPipeline
+from .loop_monitor import loop_monitor
+from .metrics import REGISTRY
+from .sharding import shard_router
+from .structured_logging import get_hot_logger, setup_logging
 from contextlib import asynccontextmanager
+from pydantic import BaseModel, Field
+from typing import Optional
 from .handlers import HandlerKind
-from .handlers.resume_handler import ResumeHandler
+from .handlers.registry import handler_registry
 
-EVENT_EMITTERS: dict[HandlerKind, EventEmitter] = {
-    HandlerKind.Echo: EventEmitter(),
-    HandlerKind.Logs: EventEmitter(),
-    HandlerKind.Resume: EventEmitter(),
-}
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+setup_logging(logging.INFO)
 logger = logging.getLogger(__name__)
+hot_logger = get_hot_logger(__name__)
 
 
 async def authenticate_and_connect(
     kind: HandlerKind, websocket: WebSocket, token: str
 ) -> tuple[dict, WebSocket]:
-    user = await Auth.authenticate_ws(websocket, token)
-    if not user:
-        logger.warning("Authentication failed for WebSocket connection")
+    try:
+        async with admission_controller.admit():
+            user = await Auth.authenticate_ws(websocket, token)
+            if not user:
+                logger.warning("Authentication failed for WebSocket connection")
+                return None, None
+
+            user_id = user["user_id"]
+            username = user["username"]
+
+            if not shard_router.is_local(user_id):
+                await shard_router.redirect(websocket, user_id)
+                return None, None
+
+            connection_manager = ConnectionManager()
+            websocket = await connection_manager.register_connection(
+                kind, user_id, websocket
+            )
+            await cluster.claim(kind, user_id)
+
+            connection_event = Event(
+                type=EventType.CONNECTION,
+                user_id=user_id,
+                username=username,
+                websocket=websocket,
+            )
+            await handler_registry.emitters[kind].emit(connection_event)
+    except AdmissionRejected as rejection:
+        await admission_controller.reject(websocket, rejection)
         return None, None
 
-    user_id = user["user_id"]
-    username = user["username"]
-
-    connection_manager = ConnectionManager()
-    websocket = await connection_manager.register_connection(kind, user_id, websocket)
-
-    connection_event = Event(
-        type=EventType.CONNECTION,
-        user_id=user_id,
-        username=username,
-        websocket=websocket,
-    )
-    await EVENT_EMITTERS[kind].emit(connection_event)
-
     return user, websocket
 
 
-async def cleanup_websocket(kind: HandlerKind, user: dict):
+async def cleanup_websocket(kind: HandlerKind, user: dict, websocket: WebSocket):
     connection_manager = ConnectionManager()
-    event_emitter = EVENT_EMITTERS[kind]
+    event_emitter = handler_registry.emitters[kind]
     try:
-        connection_manager.disconnect(kind, user["user_id"])
+        connection_manager.disconnect(kind, user["user_id"], websocket)
+        if not connection_manager.has_sessions(kind, user["user_id"]):
+            await cluster.release(kind, user["user_id"])
         disconnect_event = Event(
             type=EventType.DISCONNECT,
             user_id=user["user_id"],
             username=user["username"],
+            websocket=websocket,
         )
         await event_emitter.emit(disconnect_event)
-        logger.info(
-            f"Echo client disconnected: {user['username']} (ID: {user['user_id']})"
+        hot_logger.sampled(
+            logging.INFO,
+            "cleanup",
+            "%s client disconnected: %s (ID: %s)",
+            kind.value,
+            user["username"],
+            user["user_id"],
         )
     except Exception as e:
         logger.error(f"Error during WebSocket cleanup: {str(e)}", exc_info=True)
@@ -77,14 +99,34 @@ async def cleanup_websocket(kind: HandlerKind, user: dict):
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    if settings.loop_monitor_enabled:
+        loop_monitor.enable()
+    if settings.cluster_enabled:
+        await cluster.start()
+    # one worker writes the spool, the others read it
+    log_spool.start()
     # Initialize RabbitMQ connection
     await initialize_rabbitmq(asyncio.get_event_loop())
+    # handlers otherwise load on their kind's first connection
+    for kind in settings.preload_handlers:
+        await handler_registry.get(HandlerKind(kind))
+    app.state.ready = True
     yield
+    app.state.ready = False
+    # Already done when the server drained before shutting down (app.workers);
+    # under plain uvicorn the sockets are gone by now, so this only finishes
+    # in-flight MQ messages
+    await drain_controller.drain()
+    await container_watcher.stop()
+    await asyncio.get_running_loop().run_in_executor(None, log_spool.stop)
+    loop_monitor.disable()
     # Cleanup RabbitMQ connection if needed
     await shutdown_rabbitmq()
+    await cluster.stop()
 
 
 app = FastAPI(title="SWECC Sockets", lifespan=lifespan)
+app.state.ready = False
 
 # Add CORS middleware
 app.add_middleware(
@@ -104,7 +146,11 @@ if static_path.exists():
 # Basic endpoints
 @app.get("/")
 async def root():
-    return {"status": "online", "message": "WebSocket server is running"}
+    return {
+        "status": "online",
+        "message": "WebSocket server is running",
+        "worker": cluster.worker_id,
+    }
 
 
 @app.get("/ping")
@@ -112,159 +158,145 @@ async def ping():
     return Response(content="pong", media_type="text/plain")
 
 
-# Echo endpoint
-@app.websocket("/ws/echo/{token}")
-async def echo_endpoint(websocket: WebSocket, token: str):
-    # Create endpoint-specific instances
-    connection_manager = ConnectionManager()
-    event_emitter = EVENT_EMITTERS[HandlerKind.Echo]
-    echo_handler = EchoHandler(event_emitter)
+@app.get("/health/live")
+async def live():
+    """the process is up and its event loop answers"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def ready(response: Response):
+    """whether new sockets should be routed here: not while starting or draining"""
+    if drain_controller.draining:
+        state = "draining"
+    elif not app.state.ready:
+        state = "starting"
+    else:
+        state = "ready"
+    if state != "ready":
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {
+        "status": state,
+        "worker": cluster.worker_id,
+        "handlers": sorted(kind.value for kind in handler_registry.handlers),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(
+        content=REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
 
-    user = None
 
-    try:
-        user, websocket = await authenticate_and_connect(
-            HandlerKind.Echo, websocket, token
-        )
-        user_id = user["user_id"]
-        username = user["username"]
-        # Message loop
-        while True:
-            try:
-                data = await websocket.receive_text()
-                try:
-                    message_data = json.loads(data)
-
-                    message_event = Event(
-                        type=EventType.MESSAGE,
-                        user_id=user_id,
-                        username=username,
-                        data=message_data,
-                        websocket=websocket,
-                    )
-                    await event_emitter.emit(message_event)
-                except json.JSONDecodeError:
-                    if not connection_manager.is_connection_closing(websocket):
-                        await echo_handler.safe_send(
-                            websocket,
-                            {"type": "error", "message": "Invalid JSON message format"},
-                        )
-            except WebSocketDisconnect:
-                break
-            except Exception as e:
-                logger.error(
-                    f"Error handling WebSocket message: {str(e)}", exc_info=True
-                )
-                break
-    except WebSocketDisconnect:
-        pass
-    except Exception as e:
-        logger.error(f"Error handling WebSocket connection: {str(e)}", exc_info=True)
-    finally:
-        if user:
-            await cleanup_websocket(HandlerKind.Echo, user)
+class LoopMonitorUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    # seconds; zero or negative would spin the sampler and the watchdog
+    lag_interval: Optional[float] = Field(None, gt=0)
+    slow_callback_threshold: Optional[float] = Field(None, gt=0)
 
 
-# Logs endpoint
-@app.websocket("/ws/logs/{token}")
-async def logs_endpoint(websocket: WebSocket, token: str):
-    # Create endpoint-specific instances
-    connection_manager = ConnectionManager()
-    event_emitter = EVENT_EMITTERS[HandlerKind.Logs]
-    logs_handler = ContainerLogsHandler(event_emitter)
+@app.get("/admin/loop-monitor")
+async def get_loop_monitor(admin: dict = Depends(Auth.require_admin)):
+    return loop_monitor.status()
 
-    user = None
 
-    try:
-        # Authenticate and check for admin rights
-        user, websocket = await authenticate_and_connect(
-            HandlerKind.Logs, websocket, token
-        )
-        user_id = user["user_id"]
-        username = user["username"]
-        # Message loop
-        while True:
-            try:
-                data = await websocket.receive_text()
-                try:
-                    message_data = json.loads(data)
-                    message_data["groups"] = user.get("groups", [])
-
-                    message_event = Event(
-                        type=EventType.MESSAGE,
-                        user_id=user_id,
-                        username=username,
-                        data=message_data,
-                        websocket=websocket,
-                    )
-                    await event_emitter.emit(message_event)
-                except json.JSONDecodeError:
-                    if not connection_manager.is_connection_closing(websocket):
-                        await logs_handler.safe_send(
-                            websocket,
-                            {"type": "error", "message": "Invalid JSON message format"},
-                        )
-            except WebSocketDisconnect:
-                break
-            except Exception as e:
-                logger.error(
-                    f"Error handling WebSocket message: {str(e)}", exc_info=True
-                )
-                break
+@app.post("/admin/loop-monitor")
+async def update_loop_monitor(
+    update: LoopMonitorUpdate, admin: dict = Depends(Auth.require_admin)
+):
+    if update.lag_interval is not None:
+        loop_monitor.lag_interval = update.lag_interval
+    if update.slow_callback_threshold is not None:
+        loop_monitor.slow_callback_threshold = update.slow_callback_threshold
+    if update.enabled is True:
+        loop_monitor.enable()
+    elif update.enabled is False:
+        loop_monitor.disable()
+    return loop_monitor.status()
 
-    except WebSocketDisconnect:
-        pass
-    except Exception as e:
-        logger.error(f"Error handling WebSocket connection: {str(e)}", exc_info=True)
-    finally:
-        if user:
-            await cleanup_websocket(HandlerKind.Logs, user)
 
+@app.post("/admin/users/{user_id}/revoke")
+async def revoke_user(user_id: int, admin: dict = Depends(Auth.require_admin)):
+    """refuse the user's current tokens on every worker and close their sockets"""
+    return await cluster.revoke(user_id)
 
-@app.websocket("/ws/resume/{token}")
-async def resume_endpoint(websocket: WebSocket, token: str):
-    event_emitter = EVENT_EMITTERS[HandlerKind.Resume]
-    # Unused, but necessary so events are subscribed to
-    resume_handler = ResumeHandler(event_emitter)
+
+@app.delete("/admin/users/{user_id}/revoke")
+async def restore_user(user_id: int, admin: dict = Depends(Auth.require_admin)):
+    """accept the user's tokens again"""
+    return await cluster.restore(user_id)
+
+
+@app.post("/admin/drain")
+async def drain(admin: dict = Depends(Auth.require_admin)):
+    """drain this worker ahead of a restart; it stays up but serves no sockets"""
+    return await drain_controller.drain()
+
+
+@app.websocket("/ws/{kind}/{token}")
+async def websocket_endpoint(websocket: WebSocket, kind: str, token: str):
+    handler_kind = handler_registry.kind(kind)
+    if handler_kind is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="unknown handler")
+        return
+
+    event_emitter = handler_registry.emitters[handler_kind]
+
+    try:
+        # imported and started on the first connection of its kind
+        handler = await handler_registry.get(handler_kind)
+    except Exception as e:
+        logger.error(f"Could not load the {kind} handler: {str(e)}", exc_info=True)
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+        return
 
     user = None
 
     try:
         user, websocket = await authenticate_and_connect(
-            HandlerKind.Resume, websocket, token
+            handler_kind, websocket, token
         )
+        if user is None:
+            # rejected, redirected or failed authentication; already closed
+            return
         user_id = user["user_id"]
         username = user["username"]
-        # Message loop
-        while True:
-            try:
-                # Dummy event loop to keep the connection alive
-                data = await websocket.receive_text()
-                message_event = Event(
-                    type=EventType.MESSAGE,
-                    user_id=user_id,
-                    username=username,
-                    data={"data": data},
-                    websocket=websocket,
-                )
-                await event_emitter.emit(message_event)
-            except WebSocketDisconnect:
-                break
-            except Exception as e:
-                logger.error(
-                    f"Error handling WebSocket message: {str(e)}", exc_info=True
-                )
-                break
+
+        decode = functools.partial(handler.decode, user=user)
+
+        async def dispatch(data: str) -> None:
+            # decoded when a listener first reads event.data; BaseHandler
+            # answers frames that are not valid JSON
+            message_event = Event(
+                type=EventType.MESSAGE,
+                user_id=user_id,
+                username=username,
+                websocket=websocket,
+                raw=data,
+                decode=decode,
+            )
+            await event_emitter.emit(message_event)
+
+        # Docker calls in the logs handler are slow; reading continues while
+        # they run so stop_logs and close frames are not stuck behind them
+        await InboundPipeline(handler_kind, websocket, dispatch, user).run()
     except WebSocketDisconnect:
         pass
     except Exception as e:
         logger.error(f"Error handling WebSocket connection: {str(e)}", exc_info=True)
     finally:
         if user:
-            await cleanup_websocket(HandlerKind.Resume, user)
+            await cleanup_websocket(handler_kind, user, websocket)
 
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("app.main:app", host=settings.host, port=settings.port, reload=True)
+    uvicorn.run(
+        "app.main:app",
+        host=settings.host,
+        port=settings.port,
+        ws_max_size=settings.ws_max_size,
+        reload=True,
+    )
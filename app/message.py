@@ -11,6 +11,15 @@ class MessageType(str, Enum):
     LOGS_STARTED = "logs_started"
     LOGS_STOPPED = "logs_stopped"
     RESUME_REVIEWED = "resume_reviewed"
+    RECONNECT = "reconnect"
+    CONTAINERS = "containers"
+    CONTAINER_EVENT = "container_event"
+    CONTAINER_STATS = "container_stats"
+    STATS_STOPPED = "stats_stopped"
+    LOG_PAGE = "log_page"
+    LOGS_SKIPPED = "logs_skipped"
+    ACK = "ack"
+    NACK = "nack"
 
 
 class Message(BaseModel):
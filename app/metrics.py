@@ -0,0 +1,272 @@
+"""
+In-process metrics rendered in the Prometheus text format at /metrics.
+
+Metrics are plain attribute updates on slotted objects. Everything that
+touches them runs on the event loop, so no locks are needed. Hot paths should
+resolve `labels(...)` once and keep the child.
+"""
+
+import abc
+import bisect
+import os
+import resource
+from typing import Callable, Iterable, Optional, Union
+
+
+# Upper bounds in seconds, tuned for sub-millisecond socket work up to slow
+# Docker API calls.
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, "_LabelledMetric"] = {}
+
+    def register(self, metric: "_LabelledMetric") -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' already registered")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional["_LabelledMetric"]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        lines.append("")
+        return "\n".join(lines)
+
+
+REGISTRY = Registry()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _LabelledMetric(abc.ABC):
+    type = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        registry: Optional[Registry] = REGISTRY,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def _init_unlabelled(self) -> None:
+        # Unlabelled metrics report zero before their first update
+        if not self.labelnames:
+            self.labels()
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """a child holding the value for one set of label values"""
+
+    def labels(self, *values):
+        """return the child for these label values; cache it on hot paths"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(
+                    f"{self.name} expects labels {self.labelnames}, got {values}"
+                )
+            child = self._children[values] = self._new_child()
+        return child
+
+    def children(self) -> dict:
+        return self._children
+
+    def render(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in self._children.items()
+        ]
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Counter(_LabelledMetric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_unlabelled()
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+
+class Gauge(_LabelledMetric):
+    type = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function: Optional[Callable[[], Union[float, dict]]] = None
+        self._init_unlabelled()
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+    def set_function(self, function: Callable[[], Union[float, dict]]) -> None:
+        """
+        Compute the value at scrape time instead. `function` returns a number,
+        or a dict of label-value tuples to numbers for labelled gauges.
+        """
+        self._function = function
+
+    def render(self) -> list[str]:
+        if self._function is None:
+            return super().render()
+        values = self._function()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in values.items()
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("_upper_bounds", "bucket_counts", "sum", "count")
+
+    def __init__(self, upper_bounds: tuple):
+        self._upper_bounds = upper_bounds
+        # one slot per bound plus the implicit +Inf bucket
+        self.bucket_counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(self._upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_LabelledMetric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Optional[Iterable[float]] = None,
+        registry: Optional[Registry] = REGISTRY,
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.upper_bounds = tuple(sorted(buckets or DEFAULT_BUCKETS))
+        self._le_labels = tuple(
+            f'le="{_format_value(float(bound))}"' for bound in self.upper_bounds
+        ) + ('le="+Inf"',)
+        self._init_unlabelled()
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def render(self) -> list[str]:
+        lines = []
+        for values, child in self._children.items():
+            cumulative = 0
+            for le, count in zip(self._le_labels, child.bucket_counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+def _resident_memory_bytes() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # peak rather than current RSS, but better than nothing off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+PROCESS_RESIDENT_MEMORY = Gauge(
+    "process_resident_memory_bytes", "Resident memory size in bytes"
+)
+PROCESS_RESIDENT_MEMORY.set_function(_resident_memory_bytes)
@@ -3,10 +3,12 @@ from typing import Callable
 from pika.exchange_type import ExchangeType
 from .core.manager import RabbitMQManager
 from .core.connection_manager import ConnectionManager
+from .core.ingress import IngressBridge, IngressRejected, IngressRoute
 
 LOGGER = logging.getLogger(__name__)
 
 _manager = RabbitMQManager()
+ingress_bridge = IngressBridge(_manager)
 
 DEFAULT_EXCHANGE = "swecc-socket-exchange"
 
@@ -17,11 +19,17 @@ def consumer(
     exchange=DEFAULT_EXCHANGE,
     exchange_type=ExchangeType.topic,
     declare_exchange=True,
-    schema=None
+    schema=None,
+    sharded=False,
 ) -> Callable:
-    """decorator for registering consumers"""
+    """
+    decorator for registering consumers
+
+    with `sharded=True` and sharding configured, the queue and routing key
+    get this node's shard suffix, see app.sharding
+    """
     return _manager.register_callback(
-        exchange, declare_exchange, queue, routing_key, exchange_type, schema
+        exchange, declare_exchange, queue, routing_key, exchange_type, schema, sharded
     )
 
 
@@ -39,6 +47,35 @@ def producer(
     )
 
 
+def ingress(
+    kind,
+    command,
+    routing_key,
+    exchange=DEFAULT_EXCHANGE,
+    exchange_type=ExchangeType.topic,
+    schema=None,
+    rate=1.0,
+    burst=5,
+) -> Callable:
+    """
+    decorator for publishing a client command, see app.mq.core.ingress
+
+    the decorated coroutine gets the validated message and the event and
+    returns the body to publish; raising IngressRejected nacks instead.
+    `rate`/`burst` are the per-user quota for the command.
+    """
+
+    def decorator(build):
+        ingress_bridge.register(
+            IngressRoute(
+                kind, command, build, exchange, exchange_type, routing_key, schema, rate, burst
+            )
+        )
+        return build
+
+    return decorator
+
+
 async def initialize_rabbitmq(loop):
     global _manager
 
@@ -58,8 +95,15 @@ async def initialize_rabbitmq(loop):
         await _manager.start_health_monitor(loop)
 
 
+async def drain_rabbitmq(timeout: float) -> int:
+    """stop consuming and finish in-flight messages; returns how many did not finish"""
+    return await _manager.drain_consumers(timeout)
+
+
 async def shutdown_rabbitmq():
     global _manager
 
     if _manager:
+        # publish what clients were already promised an answer for
+        await ingress_bridge.close()
         await _manager.stop_all()
@@ -1,9 +1,14 @@
+import asyncio
 import logging
 import json
+from ..cluster import cluster, send_frame
 from ..connection_manager import ConnectionManager
 from ..handlers import HandlerKind
 from ..message import Message, MessageType
-from . import consumer
+from ..sharding import shard_router
+from ..tracing import current_trace
+from . import consumer, producer
+import pika
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
@@ -19,37 +24,98 @@ class ReviewedResumeMessage(BaseModel):
     exchange="swecc-ai-exchange",
     routing_key="reviewed",
     schema=ReviewedResumeMessage,
+    # with sharding on, reviewed_relay_consumer feeds this node's queue
+    sharded=True,
 )
 async def reviewed_resume_consumer(body, properties):
     """
     Consumer for the reviewed resume queue.
     """
     user_id, resume_id, file_name = body.key.split("-")
+    trace = current_trace()
 
     ws_connection_manager = ConnectionManager()
-    websocket = ws_connection_manager.get_websocket_connection(
+    websockets = ws_connection_manager.get_websocket_connections(
         HandlerKind.Resume, int(user_id)
     )
+    if trace is not None:
+        trace.mark("lookup")
 
-    if websocket is None:
+    if not websockets and not cluster.enabled:
         logger.warning(f"No active WebSocket connection for user {user_id}")
         return
 
+    data = {
+        "resume_id": resume_id,
+        "file_name": file_name,
+        "feedback": body.feedback,
+    }
+    if trace is not None and trace.echo:
+        # stages up to the write; the client closes the loop with its own clock
+        data["trace"] = trace.to_dict()
+
     message = Message(
         type=MessageType.RESUME_REVIEWED,
         user_id=int(user_id),
         username=None,
         message=f"Resume reviewed for user {user_id} with feedback: {body.feedback}",
-        data={
-            "resume_id": resume_id,
-            "file_name": file_name,
-            "feedback": body.feedback,
-        },
+        data=data,
+    )
+    text = json.dumps(message.model_dump())
+
+    # every session of the user, here and on any other worker holding one
+    results = await asyncio.gather(
+        *(send_frame(HandlerKind.Resume, websocket, text) for websocket in websockets)
     )
+    if trace is not None:
+        trace.mark("send")
+    forwarded = await cluster.forward(HandlerKind.Resume, int(user_id), text)
+    if trace is not None and cluster.enabled:
+        trace.mark("forward")
 
-    try:
-        await websocket.send_text(json.dumps(message.model_dump()))
-        logger.info(f"Sent reviewed resume message to user {user_id}")
-    except Exception as e:
-        logger.error(f"Failed to send message to WebSocket: {e}")
+    if not any(results) and not forwarded:
+        logger.warning(f"No active WebSocket connection for user {user_id}")
         return
+
+    logger.info(
+        f"Sent reviewed resume message to user {user_id} "
+        f"({sum(results)} local sessions, {forwarded} other workers)"
+        + (f" (trace {trace.trace_id})" if trace is not None else "")
+    )
+
+
+@producer(exchange="swecc-ai-exchange")
+async def publish_reviewed(message: ReviewedResumeMessage):
+    return message.model_dump_json()
+
+
+async def reviewed_relay_consumer(body, properties):
+    """
+    The AI service publishes plain `reviewed` without knowing the ring. With
+    sharding on, every node shares this queue and passes each message on to
+    the user's home node as `reviewed.<node>`, or handles it here if that is
+    this node.
+    """
+    user_id = int(body.key.split("-")[0])
+    if shard_router.is_local(user_id):
+        await reviewed_resume_consumer(body, properties)
+        return
+
+    routing_key = shard_router.routing_key("reviewed", user_id)
+    # the trace id and publish time carry over, so the trace spans the hop
+    relayed = pika.BasicProperties(
+        content_type="application/json",
+        headers=dict(getattr(properties, "headers", None) or {}),
+    )
+    published = await publish_reviewed(body, routing_key_override=routing_key, properties=relayed)
+    if not published:
+        logger.error(f"Could not relay reviewed resume for user {user_id} to {routing_key}")
+
+
+if shard_router.enabled:
+    consumer(
+        queue="sockets.reviewed-relay",
+        exchange="swecc-ai-exchange",
+        routing_key="reviewed",
+        schema=ReviewedResumeMessage,
+    )(reviewed_relay_consumer)
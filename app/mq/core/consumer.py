@@ -4,11 +4,27 @@ import functools
 from typing import Callable, Any, Coroutine, Optional
 import pydantic
 import json
+import time
 
 from pika.exchange_type import ExchangeType
 from .connection_manager import ConnectionManager
+from ...metrics import Counter, Histogram
+from ...structured_logging import get_hot_logger
+from ...tracing import TraceContext
 
 LOGGER = logging.getLogger(__name__)
+HOT_LOGGER = get_hot_logger(__name__)
+
+PROCESSING_TIME = Histogram(
+    "sockets_mq_processing_seconds",
+    "Time to decode and handle one consumed message",
+    labelnames=("queue",),
+)
+REDELIVERIES = Counter(
+    "sockets_mq_redeliveries_total",
+    "Deliveries RabbitMQ flagged as redelivered",
+    labelnames=("queue",),
+)
 
 
 class AsyncRabbitConsumer:
@@ -38,6 +54,11 @@ class AsyncRabbitConsumer:
         self._channel = None
         self._closing = False
         self._consumer_tag = None
+        # processing tasks not finished yet, awaited when draining
+        self._in_flight: set[asyncio.Task] = set()
+
+        self._processing_time = PROCESSING_TIME.labels(queue)
+        self._redeliveries = REDELIVERIES.labels(queue)
 
     async def connect(self, loop=None):
         try:
@@ -142,16 +163,39 @@ class AsyncRabbitConsumer:
             LOGGER.warning(f"Channel is not open for consuming messages: {self._queue}")
 
     def on_message(self, _unused_channel, basic_deliver, properties, body):
-        LOGGER.info(f"Received message # {basic_deliver.delivery_tag} on {self._queue}")
+        HOT_LOGGER.debug(
+            "Received message # %s on %s", basic_deliver.delivery_tag, self._queue
+        )
+        if basic_deliver.redelivered:
+            self._redeliveries.inc()
 
         if self.message_callback:
+            trace = TraceContext.from_properties(properties)
             # process in event loop
-            asyncio.create_task(self.process_message(body, properties))
+            task = asyncio.create_task(self.process_message(body, properties, trace))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
 
     def stop_consuming(self):
-        if self._channel:
+        if self._channel and self._consumer_tag:
             LOGGER.info(f"Stopping consumption for {self._queue}")
             self._channel.basic_cancel(self._consumer_tag, self.on_cancelok)
+            self._consumer_tag = None
+
+    async def drain(self, timeout: float) -> int:
+        """
+        Stop taking deliveries and wait up to `timeout` for the ones already
+        received. Returns how many were still unfinished.
+        """
+        try:
+            self.stop_consuming()
+        except Exception as e:
+            LOGGER.error(f"Error stopping consumption for {self._queue}: {str(e)}")
+        if not self._in_flight:
+            return 0
+        LOGGER.info(f"Waiting for {len(self._in_flight)} in-flight messages on {self._queue}")
+        _, pending = await asyncio.wait(set(self._in_flight), timeout=timeout)
+        return len(pending)
 
     def on_cancelok(self, _unused_frame):
         """consumption is cancelled"""
@@ -165,18 +209,32 @@ class AsyncRabbitConsumer:
         else:
             LOGGER.warning(f"Channel is already closed for {self._queue}")
 
-    async def process_message(self, body, properties):
-        if self.schema:
-            try:
-                body = json.loads(body)
-                body = self.schema(**body)
+    async def process_message(self, body, properties, trace=None):
+        started = time.perf_counter()
+        token = None
+        if trace is not None:
+            # time between receipt and this task getting the loop
+            trace.mark("schedule")
+            token = trace.activate()
+        try:
+            if self.schema:
+                try:
+                    body = json.loads(body)
+                    body = self.schema(**body)
+                    if trace is not None:
+                        trace.mark("decode")
+                    await self.message_callback(body, properties)
+                except Exception as e:
+                    LOGGER.error(f"Error: {e}")
+                    LOGGER.error(f"Failed to parse schema for {self._queue}")
+            else:
                 await self.message_callback(body, properties)
-            except Exception as e:
-                LOGGER.error(f"Error: {e}")
-                LOGGER.error(f"Failed to parse schema for {self._queue}")
-        else:
-            await self.message_callback(body, properties)
-        
+        finally:
+            self._processing_time.observe(time.perf_counter() - started)
+            if trace is not None:
+                trace.finish()
+                trace.deactivate(token)
+
     async def shutdown(self):
         LOGGER.info(f"Shutting down consumer for {self._queue}")
         try:
@@ -0,0 +1,270 @@
+"""
+Client-to-MQ ingress: handler commands that publish to an exchange.
+
+A route declared with `@ingress` (see app.mq) turns a client command into a
+publish. The client sends
+
+    {"type": "<command>", "request_id": "<id>", ...fields}
+
+and the bridge
+
+1. validates the fields against the route's schema,
+2. charges the user's publish quota for that command,
+3. lets the route build the body, and
+4. queues it with other publishes for the same exchange and routing key.
+
+A batch goes out once it holds `MQ_INGRESS_BATCH_SIZE` messages or its first
+message has waited `MQ_INGRESS_BATCH_DELAY` seconds, behind one readiness
+check on the producer. The client then gets `ack` or `nack` with the same
+`request_id`. Replies are sent from a task, so the socket's other messages
+are handled meanwhile and replies may arrive in any order.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+import pika
+import pydantic
+
+from ...config import settings
+from ...events import Event
+from ...handlers import HandlerKind
+from ...message import Message, MessageType
+from ...metrics import Counter, Histogram
+from ...rate_limit import get_bucket_store
+
+LOGGER = logging.getLogger(__name__)
+
+INGRESS_MESSAGES = Counter(
+    "sockets_mq_ingress_messages_total",
+    "Client messages bridged to MQ, by command and outcome",
+    labelnames=("command", "result"),
+)
+INGRESS_BATCH_SIZE = Histogram(
+    "sockets_mq_ingress_batch_size",
+    "Messages per ingress publish batch",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200),
+)
+
+USER_ID_HEADER = "x-user-id"
+
+
+class IngressRejected(Exception):
+    """raised by a route's build function to nack a message"""
+
+    def __init__(
+        self, reason: str, message: Optional[str] = None, retry_after_ms: Optional[int] = None
+    ):
+        super().__init__(message or reason)
+        self.reason = reason
+        self.message = message or reason
+        self.retry_after_ms = retry_after_ms
+
+
+class IngressRoute:
+    __slots__ = (
+        "kind",
+        "command",
+        "build",
+        "exchange",
+        "exchange_type",
+        "routing_key",
+        "schema",
+        "rate",
+        "burst",
+    )
+
+    def __init__(
+        self,
+        kind: HandlerKind,
+        command: str,
+        build: Callable[[Any, Event], Awaitable[Any]],
+        exchange: str,
+        exchange_type,
+        routing_key: str,
+        schema: Optional[type[pydantic.BaseModel]],
+        rate: float,
+        burst: int,
+    ):
+        self.kind = kind
+        self.command = command
+        self.build = build
+        self.exchange = exchange
+        self.exchange_type = exchange_type
+        self.routing_key = routing_key
+        self.schema = schema
+        quota = settings.mq_ingress_quotas.get(command, {})
+        self.rate = float(quota.get("rate", rate))
+        self.burst = int(quota.get("burst", burst))
+
+
+class _Batch:
+    __slots__ = ("exchange_type", "messages", "timer")
+
+    def __init__(self, exchange_type):
+        self.exchange_type = exchange_type
+        self.messages: list[tuple[bytes, Any, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+def _encode(body) -> bytes:
+    if isinstance(body, pydantic.BaseModel):
+        return body.model_dump_json().encode("utf-8")
+    if isinstance(body, bytes):
+        return body
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    return json.dumps(body).encode("utf-8")
+
+
+class IngressBridge:
+    def __init__(self, manager):
+        self._manager = manager
+        self.routes: dict[tuple[HandlerKind, str], IngressRoute] = {}
+        self._batches: dict[tuple[str, str], _Batch] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._outcomes = {}
+
+    def register(self, route: IngressRoute) -> None:
+        key = (route.kind, route.command)
+        if key in self.routes:
+            raise ValueError(
+                f"Ingress route for '{route.command}' on {route.kind.value} already exists"
+            )
+        self.routes[key] = route
+        # created now so initialize_rabbitmq connects it with the others
+        self._producer(route.exchange, route.exchange_type)
+
+    def route_for(self, kind: HandlerKind, command) -> Optional[IngressRoute]:
+        if not self.routes or not isinstance(command, str):
+            return None
+        return self.routes.get((kind, command))
+
+    def dispatch(
+        self,
+        route: IngressRoute,
+        event: Event,
+        reply: Callable[[Any, dict], Awaitable[None]],
+    ) -> None:
+        """handle the message in the background and `reply(websocket, data)` when done"""
+        task = asyncio.get_running_loop().create_task(self._handle(route, event, reply))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def submit(self, route: IngressRoute, event: Event) -> Optional[IngressRejected]:
+        """publish the message in `event.data`; None once published, otherwise why not"""
+        try:
+            outcome = await self._submit(route, event)
+        except Exception as e:
+            LOGGER.error(f"Ingress {route.command} failed: {str(e)}", exc_info=True)
+            outcome = IngressRejected("error", "Could not publish the message")
+        self._count(route.command, "ack" if outcome is None else outcome.reason)
+        return outcome
+
+    async def _handle(self, route, event, reply) -> None:
+        request_id = event.data.get("request_id")
+        outcome = await self.submit(route, event)
+        if outcome is None:
+            message = Message(
+                type=MessageType.ACK,
+                data={"request_id": request_id, "command": route.command},
+            )
+        else:
+            data = {"request_id": request_id, "command": route.command, "reason": outcome.reason}
+            if outcome.retry_after_ms is not None:
+                data["retry_after_ms"] = outcome.retry_after_ms
+            message = Message(type=MessageType.NACK, message=outcome.message, data=data)
+        await reply(event.websocket, message.dict())
+
+    async def _submit(self, route, event) -> Optional[IngressRejected]:
+        body = event.data
+        if route.schema is not None:
+            try:
+                body = route.schema(**event.data)
+            except pydantic.ValidationError as e:
+                fields = ", ".join(
+                    ".".join(str(part) for part in error["loc"]) for error in e.errors()
+                )
+                return IngressRejected("invalid", f"Invalid fields: {fields}")
+
+        wait = await get_bucket_store().take(
+            f"ingress:{route.command}:{event.user_id}", route.rate, route.burst
+        )
+        if wait > 0.0:
+            return IngressRejected(
+                "quota", "Publish quota exceeded", retry_after_ms=int(wait * 1000) + 1
+            )
+
+        try:
+            body = await route.build(body, event)
+        except IngressRejected as rejected:
+            return rejected
+
+        request_id = event.data.get("request_id")
+        properties = pika.BasicProperties(
+            content_type="application/json",
+            correlation_id=str(request_id) if request_id is not None else None,
+            headers={USER_ID_HEADER: event.user_id},
+        )
+        published = await self._enqueue(route, _encode(body), properties)
+        if not published:
+            return IngressRejected("unavailable", "Message broker unavailable")
+        return None
+
+    def _enqueue(self, route, body: bytes, properties) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        key = (route.exchange, route.routing_key)
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch(route.exchange_type)
+            batch.timer = loop.call_later(settings.mq_ingress_batch_delay, self._flush, key)
+        future = loop.create_future()
+        batch.messages.append((body, properties, future))
+        if len(batch.messages) >= settings.mq_ingress_batch_size:
+            self._flush(key)
+        return future
+
+    def _flush(self, key) -> None:
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        task = asyncio.get_running_loop().create_task(self._publish(key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _publish(self, key, batch: _Batch) -> None:
+        exchange, routing_key = key
+        messages = batch.messages
+        INGRESS_BATCH_SIZE.observe(len(messages))
+        try:
+            producer = self._producer(exchange, batch.exchange_type)
+            sent = await producer.publish_batch(
+                [(body, properties) for body, properties, _ in messages], routing_key
+            )
+        except Exception as e:
+            LOGGER.error(f"Ingress publish to {exchange} failed: {str(e)}")
+            sent = 0
+        for index, (_, _, future) in enumerate(messages):
+            if not future.done():
+                future.set_result(index < sent)
+
+    def _producer(self, exchange, exchange_type):
+        return self._manager.get_or_create_producer(
+            f"ingress.{exchange}", exchange, exchange_type
+        )
+
+    def _count(self, command: str, result: str) -> None:
+        child = self._outcomes.get((command, result))
+        if child is None:
+            child = self._outcomes[(command, result)] = INGRESS_MESSAGES.labels(command, result)
+        child.inc()
+
+    async def close(self) -> None:
+        """publish what is still batched and wait for pending replies"""
+        while self._batches or self._tasks:
+            for key in list(self._batches):
+                self._flush(key)
+            await asyncio.gather(*self._tasks, return_exceptions=True)
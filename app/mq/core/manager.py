@@ -8,6 +8,7 @@ from pika.exchange_type import ExchangeType
 from .consumer import AsyncRabbitConsumer
 from .producer import AsyncRabbitProducer
 from .connection_manager import ConnectionManager
+from ...sharding import shard_router
 
 LOGGER = logging.getLogger(__name__)
 
@@ -20,6 +21,8 @@ class RabbitMQManager:
         self.callbacks: Dict[str, Dict[str, Any]] = {}
 
         self.producer_factories: Dict[str, Callable] = {}
+        # producers share ConnectionManager's connection; the URL is only logged
+        self.default_amqp_url = None
 
     def register_callback(
         self,
@@ -28,7 +31,8 @@ class RabbitMQManager:
         queue,
         routing_key,
         exchange_type=ExchangeType.topic,
-        schema: Optional[pydantic.BaseModel]=None
+        schema: Optional[pydantic.BaseModel]=None,
+        sharded: bool = False,
     ):
         def decorator(callback):
             name = f"{callback.__module__}.{callback.__name__}"
@@ -40,7 +44,8 @@ class RabbitMQManager:
                 "routing_key": routing_key,
                 "exchange_type": exchange_type,
                 "declare_exchange": declare_exchange,
-                "schema": schema
+                "schema": schema,
+                "sharded": sharded,
             }
 
             return callback
@@ -99,13 +104,19 @@ class RabbitMQManager:
         for name, config in self.callbacks.items():
 
             callback = config["callback"]
+            queue = config["queue"]
+            routing_key = config["routing_key"]
+
+            if config["sharded"] and shard_router.enabled:
+                queue = shard_router.queue(queue)
+                routing_key = shard_router.routing_key(routing_key)
 
             self.add_consumer(
                 name=name,
                 callback=callback,
                 exchange=config["exchange"],
-                queue=config["queue"],
-                routing_key=config["routing_key"],
+                queue=queue,
+                routing_key=routing_key,
                 exchange_type=config["exchange_type"],
                 declare_exchange=config["declare_exchange"],
                 schema=config["schema"]
@@ -146,6 +157,14 @@ class RabbitMQManager:
             LOGGER.info(f"Starting consumer: {name}")
             await consumer.connect(loop=loop)
 
+    async def drain_consumers(self, timeout: float) -> int:
+        """stop every consumer and wait for in-flight messages, concurrently"""
+        LOGGER.info(f"Draining {len(self.consumers)} RabbitMQ consumers")
+        unfinished = await asyncio.gather(
+            *(consumer.drain(timeout) for consumer in self.consumers.values())
+        )
+        return sum(unfinished)
+
     async def stop_all(self):
         await self.stop_consumers()
         await self.stop_producers()
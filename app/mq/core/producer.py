@@ -1,9 +1,23 @@
 import asyncio
+import copy
 import logging
+import time
+import uuid
+
+import pika
+
 from .connection_manager import ConnectionManager
+from ...metrics import Histogram
+from ...tracing import PUBLISHED_AT_HEADER, TRACE_ID_HEADER
 
 LOGGER = logging.getLogger(__name__)
 
+PUBLISH_LATENCY = Histogram(
+    "sockets_mq_publish_seconds",
+    "Time to hand a message to the broker, including reconnect attempts",
+    labelnames=("exchange",),
+)
+
 MAX_RETRIES = 3
 
 
@@ -20,7 +34,7 @@ class AsyncRabbitProducer:
         self._connection = None
         self._channel = None
         self._connected = False
-        self._ready = asyncio.Event(loop=loop)
+        self._ready = asyncio.Event()
 
     async def connect(self, loop=None):
 
@@ -78,6 +92,38 @@ class AsyncRabbitProducer:
     async def publish(
         self, message, routing_key=None, properties=None, mandatory=False
     ):
+        started = time.perf_counter()
+        try:
+            return await self._publish(message, routing_key, properties, mandatory)
+        finally:
+            PUBLISH_LATENCY.labels(self._exchange).observe(
+                time.perf_counter() - started
+            )
+
+    async def publish_batch(self, messages, routing_key=None):
+        """
+        publish `(message, properties)` pairs in order behind one readiness
+        check; returns how many were handed to the broker
+        """
+        started = time.perf_counter()
+        try:
+            if not await self._ensure_ready():
+                return 0
+            for sent, (message, properties) in enumerate(messages):
+                if not self._basic_publish(message, routing_key, properties, False):
+                    return sent
+            return len(messages)
+        finally:
+            PUBLISH_LATENCY.labels(self._exchange).observe(
+                time.perf_counter() - started
+            )
+
+    async def _publish(self, message, routing_key, properties, mandatory):
+        if not await self._ensure_ready():
+            return False
+        return self._basic_publish(message, routing_key, properties, mandatory)
+
+    async def _ensure_ready(self):
         retry_count = 0
 
         while not self._connected and retry_count < MAX_RETRIES:
@@ -103,7 +149,9 @@ class AsyncRabbitProducer:
             return False
 
         await self._ready.wait()
+        return True
 
+    def _basic_publish(self, message, routing_key, properties, mandatory):
         actual_routing_key = routing_key or self._default_routing_key
         if not actual_routing_key:
             LOGGER.error("No routing key specified for publishing")
@@ -113,6 +161,8 @@ class AsyncRabbitProducer:
             # convert to bytes
             message = message.encode("utf-8")
 
+        properties = self._with_trace_headers(properties)
+
         try:
             self._channel.basic_publish(
                 exchange=self._exchange,
@@ -134,6 +184,21 @@ class AsyncRabbitProducer:
             self._connected = False
             return False
 
+    @staticmethod
+    def _with_trace_headers(properties):
+        """
+        A copy of `properties` stamped with a trace id and publish time unless
+        the caller already set them. Callers may reuse their properties, so the
+        original is left alone.
+        """
+        properties = pika.BasicProperties() if properties is None else copy.copy(properties)
+        headers = dict(properties.headers or {})
+        headers.setdefault(TRACE_ID_HEADER, uuid.uuid4().hex)
+        # AMQP field tables can't carry floats, so epoch milliseconds as an int
+        headers.setdefault(PUBLISHED_AT_HEADER, int(time.time() * 1000))
+        properties.headers = headers
+        return properties
+
     async def close(self):
         LOGGER.info(f"Closing producer for {self._exchange}")
         if self._channel and self._channel.is_open:
@@ -0,0 +1,32 @@
+import logging
+from ..events import Event
+from ..handlers import HandlerKind
+from . import IngressRejected, ingress
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class ResumeReviewRequest(BaseModel):
+    resume_id: int
+    file_name: str
+
+
+@ingress(
+    kind=HandlerKind.Resume,
+    command="request_review",
+    exchange="swecc-ai-exchange",
+    routing_key="review",
+    schema=ResumeReviewRequest,
+    rate=0.1,
+    burst=3,
+)
+async def request_resume_review(message: ResumeReviewRequest, event: Event):
+    """
+    Publishes a resume review request; the result comes back through
+    reviewed_resume_consumer as `resume_reviewed`.
+    """
+    # reviewed_resume_consumer splits the key on "-"
+    if "-" in message.file_name:
+        raise IngressRejected("invalid", "file_name may not contain '-'")
+    return {"key": f"{event.user_id}-{message.resume_id}-{message.file_name}"}
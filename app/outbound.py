@@ -0,0 +1,153 @@
+"""
+Per-connection outbound priority lanes.
+
+Everything sent to a socket goes through its OutboundQueue. An idle socket
+writes at once. While a write is in progress, new frames wait in lanes:
+
+- the control lane (errors, system messages, replies such as
+  `logs_started`/`logs_stopped`) is always written first;
+- bulk frames (log lines, stats, query pages, container events) wait per
+  channel. Channels take turns by smooth weighted round robin, so one noisy
+  channel can't starve the others on the same socket.
+
+A sender still awaits its own frame, so backpressure is unchanged. A frame
+whose sender was cancelled while it waited is dropped, so `stop_logs` does
+not flush a backlog of lines first. Queue wait is recorded per lane.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+from .config import settings
+from .connection_manager import ConnectionManager
+from .message import MessageType
+from .metrics import Histogram
+
+QUEUE_WAIT = Histogram(
+    "sockets_outbound_queue_wait_seconds",
+    "Time a frame waited for the socket behind other frames, by lane",
+    labelnames=("lane",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+
+CONTROL = "control"
+# message types sent on a bulk channel; everything else is control
+BULK_CHANNELS = {
+    MessageType.LOG_LINE: "logs",
+    MessageType.CONTAINER_STATS: "stats",
+    MessageType.LOG_PAGE: "query",
+    MessageType.CONTAINER_EVENT: "events",
+}
+
+_queue_wait = {}
+
+
+def _observe_wait(lane: str, seconds: float) -> None:
+    child = _queue_wait.get(lane)
+    if child is None:
+        child = _queue_wait[lane] = QUEUE_WAIT.labels(lane)
+    child.observe(seconds)
+
+
+class OutboundQueue:
+    __slots__ = ("websocket", "weights", "_writing", "_writer", "_pending", "_control", "_channels", "_credit")
+
+    def __init__(self, websocket, weights: dict[str, int]):
+        self.websocket = websocket
+        self.weights = weights
+        self._writing = False
+        self._writer: Optional[asyncio.Task] = None
+        self._pending = 0
+        # created on first contention; most sockets never need them
+        self._control: Optional[deque] = None
+        self._channels: Optional[dict[str, deque]] = None
+        self._credit: Optional[dict[str, int]] = None
+
+    async def send(self, text: str, channel: Optional[str] = None) -> None:
+        """write `text`, raising what `send_text` raises"""
+        lane = channel or CONTROL
+        if not self._writing:
+            self._writing = True
+            try:
+                await self.websocket.send_text(text)
+            finally:
+                self._writing = False
+                if self._pending:
+                    self._start_writer()
+            _observe_wait(lane, 0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(lane, (text, future, time.perf_counter()))
+        await future
+
+    def _enqueue(self, lane: str, item: tuple) -> None:
+        if lane == CONTROL:
+            if self._control is None:
+                self._control = deque()
+            self._control.append(item)
+        else:
+            if self._channels is None:
+                self._channels = {}
+                self._credit = {}
+            queue = self._channels.get(lane)
+            if queue is None:
+                queue = self._channels[lane] = deque()
+                self._credit[lane] = 0
+            queue.append(item)
+        self._pending += 1
+
+    def _next(self) -> tuple[str, tuple]:
+        if self._control:
+            return CONTROL, self._control.popleft()
+        # smooth weighted round robin over channels with frames waiting
+        best = None
+        total = 0
+        for channel, queue in self._channels.items():
+            if not queue:
+                continue
+            weight = self.weights.get(channel, 1)
+            total += weight
+            self._credit[channel] += weight
+            if best is None or self._credit[channel] > self._credit[best]:
+                best = channel
+        self._credit[best] -= total
+        return best, self._channels[best].popleft()
+
+    def _start_writer(self) -> None:
+        self._writing = True
+        self._writer = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        try:
+            while self._pending:
+                lane, (text, future, queued_at) = self._next()
+                self._pending -= 1
+                if future.done():
+                    # the sender was cancelled while waiting
+                    continue
+                _observe_wait(lane, time.perf_counter() - queued_at)
+                try:
+                    await self.websocket.send_text(text)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                if not future.done():
+                    future.set_result(None)
+        finally:
+            self._writing = False
+            self._writer = None
+
+
+async def send(websocket, text: str, channel: Optional[str] = None) -> None:
+    """send through the socket's lanes; unregistered sockets write directly"""
+    record = ConnectionManager().get_record(websocket)
+    if record is None:
+        await websocket.send_text(text)
+        return
+    if record.outbound is None:
+        record.outbound = OutboundQueue(websocket, settings.outbound_channel_weights)
+    await record.outbound.send(text, channel)
@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import time
+from enum import Enum
+from typing import Optional
+
+from .config import RateLimitConfig, settings
+from .handlers import HandlerKind
+from .metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED_FRAMES = Counter(
+    "sockets_rate_limited_frames_total",
+    "Inbound frames that exceeded a rate limit, by the policy applied",
+    labelnames=("kind", "policy"),
+)
+
+
+class RateLimitPolicy(str, Enum):
+    # wait for a token, which stops reading from the socket meanwhile
+    THROTTLE = "throttle"
+    # discard the frame without parsing it
+    DROP = "drop"
+    # close the connection with a policy violation
+    CLOSE = "close"
+
+
+class Verdict(str, Enum):
+    ACCEPT = "accept"
+    DROP = "drop"
+    CLOSE = "close"
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        tokens = self.tokens + (now - self.updated) * self.rate
+        self.tokens = tokens if tokens < self.capacity else float(self.capacity)
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """
+        Take one token. Returns 0 on success, otherwise the seconds until a
+        token is available (nothing is taken in that case).
+        """
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class LocalBucketStore:
+    """
+    Per-user buckets kept in this worker's memory. A bucket idle long enough
+    to have refilled is the same as a new one, so such buckets are swept out
+    at most every `sweep_interval` seconds.
+    """
+
+    def __init__(self, sweep_interval: float = 60.0):
+        self._buckets: dict[str, TokenBucket] = {}
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    async def take(self, key: str, rate: float, capacity: int) -> float:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+        return bucket.take(now)
+
+    def _sweep(self, now: float) -> None:
+        self._next_sweep = now + self.sweep_interval
+        refilled = [
+            key
+            for key, bucket in self._buckets.items()
+            if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.capacity
+        ]
+        for key in refilled:
+            del self._buckets[key]
+
+    def release(self, key: str) -> None:
+        # Only forget a full bucket, otherwise reconnecting would reset the limit
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.refill(time.monotonic())
+            if bucket.tokens >= bucket.capacity:
+                del self._buckets[key]
+
+
+# Token bucket evaluated atomically in Redis, using the server clock so that
+# workers on different hosts agree on refill time.
+_REDIS_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """per-user buckets shared by every worker through Redis"""
+
+    key_prefix = "sockets:ratelimit:"
+
+    def __init__(self, host: str, port: int):
+        # optional dependency, only needed with RATE_LIMIT_BACKEND=redis
+        import redis.asyncio as redis
+
+        self._client = redis.Redis(host=host, port=port)
+        self._take = self._client.register_script(_REDIS_TAKE_SCRIPT)
+        self._fallback = LocalBucketStore()
+        # latched so an outage logs once, not once per frame
+        self._unavailable = False
+
+    async def take(self, key: str, rate: float, capacity: int) -> float:
+        try:
+            wait = await self._take(keys=[self.key_prefix + key], args=[rate, capacity])
+        except Exception as e:
+            # Fail open to a local bucket rather than rejecting every frame
+            if not self._unavailable:
+                self._unavailable = True
+                logger.warning(f"Redis rate limit unavailable, using local buckets: {e}")
+            return await self._fallback.take(key, rate, capacity)
+        if self._unavailable:
+            self._unavailable = False
+            logger.info("Redis rate limit available again")
+        return float(wait)
+
+    def release(self, key: str) -> None:
+        # Redis keys expire on their own once the bucket would be full again
+        pass
+
+
+_store = None
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        if settings.rate_limit_backend == "redis":
+            _store = RedisBucketStore(settings.redis_host, settings.redis_port)
+        else:
+            _store = LocalBucketStore()
+    return _store
+
+
+def resolve_limit(kind: HandlerKind, groups: list[str]) -> Optional[RateLimitConfig]:
+    """the most generous limit among the user's groups, else the kind's default"""
+    limits = settings.rate_limits.get(kind.value)
+    if not limits:
+        return None
+    matching = [limits[group] for group in groups if group in limits]
+    if not matching:
+        return limits.get("default")
+    return max(matching, key=lambda limit: limit.rate)
+
+
+class ConnectionRateLimiter:
+    """
+    Applies a connection bucket and a per-user bucket to every inbound frame
+    before it is parsed.
+    """
+
+    def __init__(self, kind: HandlerKind, user: dict, store=None):
+        self.kind = kind
+        self.limit = resolve_limit(kind, user.get("groups", []))
+        self.policy = RateLimitPolicy(self.limit.policy) if self.limit else None
+        self._store = store or get_bucket_store()
+        self._user_key = f"{kind.value}:{user['user_id']}"
+        if self.limit:
+            self._bucket = TokenBucket(self.limit.rate, self.limit.burst)
+            self._limited = RATE_LIMITED_FRAMES.labels(kind.value, self.policy.value)
+
+    async def check(self) -> Verdict:
+        if self.limit is None:
+            return Verdict.ACCEPT
+
+        limited = False
+        while True:
+            wait = self._bucket.take(time.monotonic())
+            if wait == 0.0:
+                wait = await self._store.take(
+                    self._user_key, self.limit.user_rate, self.limit.user_burst
+                )
+                if wait > 0.0:
+                    # the connection token was not used after all
+                    self._bucket.tokens += 1
+            if wait == 0.0:
+                return Verdict.ACCEPT
+
+            if not limited:
+                # once per frame, however many times a throttled frame waits
+                limited = True
+                self._limited.inc()
+            if self.policy is RateLimitPolicy.DROP:
+                return Verdict.DROP
+            if self.policy is RateLimitPolicy.CLOSE:
+                return Verdict.CLOSE
+            await asyncio.sleep(wait)
+
+    def close(self) -> None:
+        self._store.release(self._user_key)
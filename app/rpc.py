@@ -0,0 +1,256 @@
+"""
+Request/response RPC over a socket.
+
+A request is
+
+    {"id": 7, "method": "list_containers", "params": {...}}
+
+and its reply carries the same id:
+
+    {"id": 7, "result": {...}}
+    {"id": 7, "error": {"code": -32601, "message": "...", "data": {...}}}
+
+Each request runs in its own task, so a client can pipeline many requests on
+one socket. Replies go out as each finishes, in any order. A connection may
+have at most `RPC_MAX_IN_FLIGHT` requests running; more are refused at once
+with `TOO_MANY_IN_FLIGHT`. A request still running after its method's timeout
+(`RPC_TIMEOUT` by default) is answered with `TIMEOUT`.
+`{"method": "rpc.cancel", "params": {"id": 7}}` stops request 7, which is
+then answered with `CANCELLED`. A cancel is answered at once and does not
+count against the cap. Requests still running when the socket closes are
+cancelled without a reply.
+
+Handlers mark their methods with `@rpc_method`. A method gets the params and
+the event and returns the result, or raises `RpcError`. Error codes follow
+JSON-RPC 2.0.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from .config import settings
+from .events import Event
+from .metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+RPC_CALLS = Counter(
+    "sockets_rpc_calls_total",
+    "RPC requests answered, by handler kind and outcome",
+    labelnames=("kind", "result"),
+)
+RPC_LATENCY = Histogram(
+    "sockets_rpc_seconds",
+    "Time from receiving an RPC request to replying",
+    labelnames=("kind",),
+)
+RPC_IN_FLIGHT = Gauge("sockets_rpc_in_flight", "RPC requests being handled")
+
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+TIMEOUT = -32001
+TOO_MANY_IN_FLIGHT = -32002
+CANCELLED = -32003
+# the method ran and declined, e.g. an ingress nack
+REJECTED = -32004
+
+CANCEL_METHOD = "rpc.cancel"
+
+_OUTCOMES = {
+    INVALID_REQUEST: "invalid",
+    METHOD_NOT_FOUND: "invalid",
+    INVALID_PARAMS: "invalid",
+    INTERNAL_ERROR: "error",
+    TIMEOUT: "timeout",
+    TOO_MANY_IN_FLIGHT: "refused",
+    CANCELLED: "cancelled",
+    REJECTED: "rejected",
+}
+
+# (method, timeout in seconds or None for RPC_TIMEOUT)
+Method = tuple[Callable[[dict, Event], Awaitable[Any]], Optional[float]]
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str, data: Optional[dict] = None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+    def to_dict(self) -> dict:
+        error = {"code": self.code, "message": self.message}
+        if self.data is not None:
+            error["data"] = self.data
+        return error
+
+
+def rpc_method(name: Optional[str] = None, timeout: Optional[float] = None):
+    """expose a handler coroutine `(self, params, event)` as an RPC method"""
+
+    def decorator(func):
+        func._rpc_method = (name or func.__name__, timeout)
+        return func
+
+    return decorator
+
+
+def collect_methods(handler) -> dict[str, Method]:
+    methods = {}
+    for attr in dir(type(handler)):
+        spec = getattr(getattr(type(handler), attr), "_rpc_method", None)
+        if spec is not None:
+            name, timeout = spec
+            methods[name] = (getattr(handler, attr), timeout)
+    return methods
+
+
+def is_request(data) -> bool:
+    return isinstance(data, dict) and "method" in data and "id" in data
+
+
+class RpcServer:
+    """runs one handler's RPC requests; connections are keyed by id(websocket)"""
+
+    def __init__(
+        self,
+        kind: str,
+        resolve: Callable[[str], Optional[Method]],
+        reply: Callable[[Any, dict], Awaitable[None]],
+    ):
+        self.kind = kind
+        self.resolve = resolve
+        self.reply = reply
+        self.max_in_flight = settings.rpc_max_in_flight
+        self.timeout = settings.rpc_timeout
+        # id(websocket) -> {request id: task}
+        self.calls: dict[int, dict[Any, asyncio.Task]] = {}
+        self._latency = RPC_LATENCY.labels(kind)
+        self._outcomes = {}
+
+    async def handle(self, event: Event) -> None:
+        """start the request in `event.data`; errors found up front are answered at once"""
+        data = event.data
+        request_id = data.get("id")
+        started = time.perf_counter()
+        try:
+            method, timeout = self._check(data)
+            if method is None:
+                # answered inline, so a client at the cap can still cancel
+                result = self._cancel(data.get("params") or {}, event)
+                await self._send(event.websocket, request_id, started, result=result)
+                return
+            calls = self.calls.setdefault(id(event.websocket), {})
+            if request_id in calls:
+                raise RpcError(INVALID_REQUEST, f"Request {request_id!r} is already in flight")
+            if len(calls) >= self.max_in_flight:
+                raise RpcError(
+                    TOO_MANY_IN_FLIGHT,
+                    "Too many requests in flight",
+                    {"max_in_flight": self.max_in_flight},
+                )
+        except RpcError as e:
+            await self._send(event.websocket, request_id, started, error=e)
+            return
+
+        task = asyncio.get_running_loop().create_task(
+            self._call(method, timeout, data.get("params") or {}, event, started)
+        )
+        calls[request_id] = task
+        RPC_IN_FLIGHT.inc()
+        # a task cancelled before its first step never runs _call's cleanup
+        task.add_done_callback(functools.partial(self._done, id(event.websocket), request_id))
+
+    def _check(self, data: dict) -> tuple[Optional[Callable], Optional[float]]:
+        """the request's method and timeout; (None, None) for rpc.cancel"""
+        request_id = data.get("id")
+        if isinstance(request_id, bool) or not isinstance(request_id, (str, int)):
+            raise RpcError(INVALID_REQUEST, "id must be a string or an integer")
+        name = data.get("method")
+        if not isinstance(name, str):
+            raise RpcError(INVALID_REQUEST, "method must be a string")
+        params = data.get("params")
+        if params is not None and not isinstance(params, dict):
+            raise RpcError(INVALID_PARAMS, "params must be an object")
+        if name == CANCEL_METHOD:
+            return None, None
+        method = self.resolve(name)
+        if method is None:
+            raise RpcError(METHOD_NOT_FOUND, f"Unknown method '{name}'")
+        return method
+
+    async def _call(self, method, timeout, params: dict, event: Event, started: float) -> None:
+        websocket = event.websocket
+        request_id = event.data["id"]
+        try:
+            result = await asyncio.wait_for(method(params, event), timeout or self.timeout)
+        except RpcError as e:
+            error = e
+        except asyncio.TimeoutError:
+            error = RpcError(TIMEOUT, f"No result within {timeout or self.timeout} seconds")
+        except asyncio.CancelledError:
+            # rpc.cancel leaves the call registered so it can still answer;
+            # on disconnect it is already gone
+            if request_id not in self.calls.get(id(websocket), {}):
+                raise
+            error = RpcError(CANCELLED, "Cancelled")
+        except Exception as e:
+            logger.error(f"Error in {self.kind} RPC {event.data['method']}: {str(e)}", exc_info=True)
+            error = RpcError(INTERNAL_ERROR, "Internal error")
+        else:
+            error = None
+        finally:
+            self._forget(id(websocket), request_id)
+
+        if error is None:
+            await self._send(websocket, request_id, started, result=result)
+        else:
+            await self._send(websocket, request_id, started, error=error)
+
+    def _forget(self, key: int, request_id) -> None:
+        calls = self.calls.get(key)
+        if calls is not None:
+            calls.pop(request_id, None)
+            if not calls:
+                del self.calls[key]
+
+    def _done(self, key: int, request_id, task: asyncio.Task) -> None:
+        RPC_IN_FLIGHT.dec()
+        if self.calls.get(key, {}).get(request_id) is task:
+            self._forget(key, request_id)
+
+    def _cancel(self, params: dict, event: Event) -> dict:
+        task = self.calls.get(id(event.websocket), {}).get(params.get("id"))
+        if task is None or task.done():
+            return {"cancelled": False}
+        # a task cancelled before its first step never enters _call, so it
+        # would neither reply nor clean up; the task's first step is already
+        # queued, so cancelling on the next callback lands after it
+        asyncio.get_running_loop().call_soon(task.cancel)
+        return {"cancelled": True}
+
+    async def _send(self, websocket, request_id, started: float, result=None, error: Optional[RpcError] = None) -> None:
+        if error is None:
+            reply = {"id": request_id, "result": result}
+            outcome = "ok"
+        else:
+            reply = {"id": request_id, "error": error.to_dict()}
+            outcome = _OUTCOMES.get(error.code, "error")
+        await self.reply(websocket, reply)
+        self._latency.observe(time.perf_counter() - started)
+        child = self._outcomes.get(outcome)
+        if child is None:
+            child = self._outcomes[outcome] = RPC_CALLS.labels(self.kind, outcome)
+        child.inc()
+
+    def close(self, websocket) -> None:
+        """cancel the socket's requests without replying"""
+        calls = self.calls.pop(id(websocket), None)
+        if calls:
+            for task in calls.values():
+                task.cancel()
@@ -0,0 +1,102 @@
+"""
+Shard-aware routing: every user has a home node chosen by consistent hashing.
+
+Nodes are listed in SHARD_NODES and this node names itself with
+SHARD_NODE_ID. Each node binds its own copy of every sharded consumer queue,
+`<queue>.<node>` with routing key `<routing_key>.<node>`. A publisher that
+computes the same ring sends a user's notifications to the home node's queue
+only. Handshakes that land on the wrong node are closed with a redirect to
+the home node, so notifications never have to be broadcast and filtered.
+"""
+
+import bisect
+import hashlib
+import logging
+from typing import Optional
+
+from fastapi import WebSocket
+
+from .config import settings
+from .metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+SHARD_REDIRECTS = Counter(
+    "sockets_shard_redirects_total",
+    "Handshakes redirected to the user's home node",
+    labelnames=("node",),
+)
+
+# private-use close code; the reason carries the home node's base URL
+WS_REDIRECT = 4301
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring with `virtual_nodes` points per node, so adding or
+    removing a node moves about 1/N of the users and load stays even.
+    """
+
+    def __init__(self, nodes: list[str], virtual_nodes: int = 128):
+        self.nodes = sorted(nodes)
+        self.virtual_nodes = virtual_nodes
+        points = sorted(
+            (_hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key) -> str:
+        if not self._hashes:
+            raise LookupError("hash ring has no nodes")
+        index = bisect.bisect(self._hashes, _hash(str(key))) % len(self._hashes)
+        return self._owners[index]
+
+
+class ShardRouter:
+    def __init__(self, nodes: dict[str, str], node_id: str, virtual_nodes: int):
+        # node id -> base websocket URL clients are redirected to
+        self.nodes = nodes
+        self.node_id = node_id
+        self.ring = HashRing(list(nodes), virtual_nodes)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.node_id) and self.node_id in self.nodes
+
+    def home_node(self, user_id: int) -> str:
+        return self.ring.node_for(user_id)
+
+    def is_local(self, user_id: int) -> bool:
+        return not self.enabled or self.home_node(user_id) == self.node_id
+
+    def queue(self, queue: str) -> str:
+        return f"{queue}.{self.node_id}"
+
+    def routing_key(self, routing_key: str, user_id: Optional[int] = None) -> str:
+        """this node's shard, or the home shard of `user_id` for publishers"""
+        node = self.node_id if user_id is None else self.home_node(user_id)
+        return f"{routing_key}.{node}"
+
+    async def redirect(self, websocket: WebSocket, user_id: int) -> None:
+        """close with WS_REDIRECT and the home node's URL as the reason"""
+        node = self.home_node(user_id)
+        SHARD_REDIRECTS.labels(node).inc()
+        try:
+            await websocket.accept()
+            await websocket.close(code=WS_REDIRECT, reason=f"redirect={self.nodes[node]}")
+        except Exception as e:
+            logger.debug(f"Could not send redirect, websocket may be closed: {str(e)}")
+
+
+shard_router = ShardRouter(
+    settings.shard_nodes,
+    settings.shard_node_id,
+    settings.shard_virtual_nodes,
+)
@@ -0,0 +1,165 @@
+"""
+Logging for the socket hot paths.
+
+`HotLogger` checks the level before doing any work, formats lazily with
+%-style arguments, attaches structured key=value fields, and can rate limit
+per key so a flood of identical events logs a sample plus a suppressed count.
+`setup_logging` moves formatting and I/O onto a listener thread through a
+queue, so a log call on the event loop only enqueues a record.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import time
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class StructuredFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+# values that can't change between the log call and the listener formatting them
+_IMMUTABLE_SCALARS = (str, int, float, bool, bytes, type(None))
+
+
+def _immutable(values) -> bool:
+    return all(type(value) in _IMMUTABLE_SCALARS for value in values)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler.prepare formats on the calling thread; leave that to the
+        # listener when the arguments are immutable scalars. Anything else,
+        # such as a message dict, may change before the listener gets to it,
+        # so it is rendered now.
+        args = record.args
+        # a lone dict argument becomes `args` itself, and a dict is mutable
+        if args and (isinstance(args, dict) or not _immutable(args)):
+            record.msg = record.getMessage()
+            record.args = None
+        fields = getattr(record, "fields", None)
+        if fields and not _immutable(fields.values()):
+            record.fields = {
+                key: value if type(value) in _IMMUTABLE_SCALARS else str(value)
+                for key, value in fields.items()
+            }
+        return record
+
+
+def setup_logging(level: int = logging.INFO) -> None:
+    """route the root logger through a queue drained by a background thread"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler()
+    output.setFormatter(StructuredFormatter(LOG_FORMAT))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(records))
+
+    _listener = logging.handlers.QueueListener(
+        records, output, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class HotLogger:
+    def __init__(
+        self,
+        name: str,
+        sample_interval: float = 1.0,
+        sample_burst: int = 5,
+        max_keys: int = 10000,
+    ):
+        self.logger = logging.getLogger(name)
+        self.sample_interval = sample_interval
+        self.sample_burst = sample_burst
+        self.max_keys = max_keys
+        # key -> [window start, logged in window, suppressed in window]
+        self._windows: dict[str, list] = {}
+
+    def _log(self, level: int, msg: str, args: tuple, fields: dict) -> None:
+        # stacklevel points the record at the caller of debug()/info()/...
+        self.logger.log(
+            level,
+            msg,
+            *args,
+            extra={"fields": fields} if fields else None,
+            stacklevel=3,
+        )
+
+    def debug(self, msg: str, *args, **fields) -> None:
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, msg, args, fields)
+
+    def info(self, msg: str, *args, **fields) -> None:
+        if self.logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, msg, args, fields)
+
+    def warning(self, msg: str, *args, **fields) -> None:
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, msg, args, fields)
+
+    def error(self, msg: str, *args, **fields) -> None:
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, msg, args, fields)
+
+    def sampled(self, level: int, key: str, msg: str, *args, **fields) -> None:
+        """
+        Log at most `sample_burst` records per `sample_interval` for `key`.
+        The first record after a suppressed stretch carries `suppressed=<n>`.
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.sample_interval:
+            suppressed = window[2] if window is not None else 0
+            if window is None and len(self._windows) >= self.max_keys:
+                self._windows.clear()
+            self._windows[key] = [now, 1, 0]
+            if suppressed:
+                fields["suppressed"] = suppressed
+            self._log(level, msg, args, fields)
+        elif window[1] < self.sample_burst:
+            window[1] += 1
+            self._log(level, msg, args, fields)
+        else:
+            window[2] += 1
+
+
+_hot_loggers: dict[str, HotLogger] = {}
+
+
+def get_hot_logger(name: str) -> HotLogger:
+    """shared per name, so sampling windows span every handler instance"""
+    hot_logger = _hot_loggers.get(name)
+    if hot_logger is None:
+        hot_logger = _hot_loggers[name] = HotLogger(name)
+    return hot_logger
@@ -0,0 +1,119 @@
+"""
+Trace context for MQ → WebSocket deliveries.
+
+A TraceContext is created when AsyncRabbitConsumer receives a delivery,
+seeded from the AMQP properties (trace id, publish timestamp), and exposed to
+the consumer callback through a context variable. Each `mark(stage)` records
+the time since the previous mark into `sockets_trace_stage_seconds`, so a
+slow delivery can be attributed to the broker, scheduling, decoding, the
+connection lookup or the socket write.
+"""
+
+import contextvars
+import time
+import uuid
+from typing import Optional
+
+from .config import settings
+from .metrics import Histogram
+
+TRACE_STAGES = Histogram(
+    "sockets_trace_stage_seconds",
+    "Time spent in each stage of an MQ to WebSocket delivery",
+    labelnames=("stage",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0),
+)
+
+TRACE_ID_HEADER = "x-trace-id"
+PUBLISHED_AT_HEADER = "x-published-at"
+ECHO_HEADER = "x-trace-echo"
+
+_current_trace: contextvars.ContextVar[Optional["TraceContext"]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+
+
+def current_trace() -> Optional["TraceContext"]:
+    return _current_trace.get()
+
+
+class TraceContext:
+    __slots__ = ("trace_id", "published_at", "received_at", "echo", "stages", "_last")
+
+    def __init__(
+        self,
+        trace_id: str,
+        published_at: Optional[float],
+        echo: bool = False,
+    ):
+        self.trace_id = trace_id
+        # wall clock, seconds since the epoch
+        self.published_at = published_at
+        self.received_at = time.time()
+        self.echo = echo
+        self.stages: dict[str, float] = {}
+        self._last = time.perf_counter()
+
+        if published_at is not None:
+            # across hosts this is only as good as clock sync, negative skew is dropped
+            self._record("broker", max(0.0, self.received_at - published_at))
+
+    @classmethod
+    def from_properties(cls, properties) -> "TraceContext":
+        """
+        Reads `x-trace-id` (else correlation_id/message_id) and `x-published-at`
+        (epoch milliseconds, else the AMQP timestamp in seconds) from the
+        delivery properties.
+        """
+        headers = (getattr(properties, "headers", None) or {}) if properties else {}
+        trace_id = (
+            headers.get(TRACE_ID_HEADER)
+            or getattr(properties, "correlation_id", None)
+            or getattr(properties, "message_id", None)
+            or uuid.uuid4().hex
+        )
+        published_at = headers.get(PUBLISHED_AT_HEADER)
+        if published_at is not None:
+            try:
+                published_at = float(published_at) / 1000
+            except (TypeError, ValueError):
+                published_at = None
+        if published_at is None and getattr(properties, "timestamp", None):
+            published_at = properties.timestamp
+        echo = settings.trace_echo or bool(headers.get(ECHO_HEADER))
+        return cls(
+            str(trace_id),
+            float(published_at) if published_at is not None else None,
+            echo,
+        )
+
+    def _record(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = seconds
+        TRACE_STAGES.labels(stage).observe(seconds)
+
+    def mark(self, stage: str) -> None:
+        """close `stage`, which started at the previous mark"""
+        now = time.perf_counter()
+        self._record(stage, now - self._last)
+        self._last = now
+
+    def finish(self) -> None:
+        self._record("total", time.time() - self.received_at)
+
+    def activate(self) -> contextvars.Token:
+        return _current_trace.set(self)
+
+    @staticmethod
+    def deactivate(token: contextvars.Token) -> None:
+        _current_trace.reset(token)
+
+    def to_dict(self) -> dict:
+        """the fields echoed to clients, stage durations in milliseconds"""
+        return {
+            "trace_id": self.trace_id,
+            "published_at": self.published_at,
+            "received_at": self.received_at,
+            "stages_ms": {
+                stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()
+            },
+        }
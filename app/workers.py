@@ -0,0 +1,119 @@
+"""
+Runs several server processes on one port.
+
+    WORKERS=4 python -m app.workers
+    python -m app.workers --workers 4 --port 8004
+
+Each worker binds its own listening socket with SO_REUSEPORT, so the kernel
+balances new connections across workers with no shared accept lock. Workers
+share nothing in memory. With more than one worker, CLUSTER_ENABLED defaults
+to true so MQ messages are forwarded to whichever worker holds the user (see
+app.cluster), and RATE_LIMIT_BACKEND=redis keeps per-user limits global.
+Workers that exit unexpectedly are restarted. On SIGTERM each worker
+drains (see app.drain) before it stops.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+
+from .config import settings
+from .drain import drain_controller
+
+logger = logging.getLogger(__name__)
+
+RESTART_DELAY = 1.0
+
+
+def bind_reuseport(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class DrainingServer(uvicorn.Server):
+    """drains the app (see app.drain) before uvicorn closes its sockets"""
+
+    async def shutdown(self, sockets=None) -> None:
+        await drain_controller.drain()
+        await super().shutdown(sockets=sockets)
+
+
+def serve(index: int, host: str, port: int) -> None:
+    os.environ["WORKER_INDEX"] = str(index)
+    sock = bind_reuseport(host, port)
+    config = uvicorn.Config(
+        "app.main:app",
+        ws_max_size=settings.ws_max_size,
+    )
+    DrainingServer(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=settings.workers)
+    parser.add_argument("--host", default=settings.host)
+    parser.add_argument("--port", type=int, default=settings.port)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.workers <= 1:
+        serve(0, args.host, args.port)
+        return
+
+    # inherited by the spawned workers before they import app.config
+    os.environ.setdefault("CLUSTER_ENABLED", "true")
+
+    context = multiprocessing.get_context("spawn")
+    processes: dict[int, multiprocessing.Process] = {}
+    stopping = False
+
+    def start(index: int) -> None:
+        process = context.Process(
+            target=serve, args=(index, args.host, args.port), name=f"worker-{index}"
+        )
+        process.start()
+        processes[index] = process
+        logger.info(f"Started worker {index} (pid {process.pid})")
+
+    def stop(signum, _frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(args.workers):
+        start(index)
+
+    while not stopping:
+        time.sleep(RESTART_DELAY)
+        for index, process in list(processes.items()):
+            if not process.is_alive() and not stopping:
+                logger.warning(
+                    f"Worker {index} exited with {process.exitcode}, restarting"
+                )
+                start(index)
+
+    for process in processes.values():
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Measures the memory the server holds per idle connection and per inbound
+message using tracemalloc.
+
+    python -m benchmarks.connection_memory --connections 50000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import tracemalloc
+
+from app.connection_manager import ConnectionManager
+from app.events import Event, EventType
+from app.handlers import HandlerKind
+
+
+class FakeWebSocket:
+    """stands in for a starlette WebSocket; its own size is not measured"""
+
+    __slots__ = ("__weakref__",)
+
+    async def accept(self):
+        pass
+
+
+def _traced_bytes() -> int:
+    current, _ = tracemalloc.get_traced_memory()
+    return current
+
+
+async def measure_connections(count: int) -> dict:
+    manager = ConnectionManager()
+    kinds = list(HandlerKind)
+    sockets = [FakeWebSocket() for _ in range(count)]
+
+    tracemalloc.start()
+    before = _traced_bytes()
+    for i, websocket in enumerate(sockets):
+        await manager.register_connection(kinds[i % len(kinds)], i, websocket)
+    after = _traced_bytes()
+    tracemalloc.stop()
+
+    for i in range(count):
+        manager.disconnect(kinds[i % len(kinds)], i)
+
+    return {
+        "connections": count,
+        "total_bytes": after - before,
+        "bytes_per_connection": (after - before) / count,
+    }
+
+
+def measure_messages(count: int) -> dict:
+    frame = json.dumps({"type": "start_logs", "container_name": "swecc-server"})
+    websocket = FakeWebSocket()
+
+    tracemalloc.start()
+    before = _traced_bytes()
+    # Hold every event so the measurement is not hidden by immediate reuse
+    eager = [
+        Event(EventType.MESSAGE, i, "user", data=json.loads(frame), websocket=websocket)
+        for i in range(count)
+    ]
+    eager_bytes = _traced_bytes() - before
+    del eager
+
+    # as dispatch builds them: the frame is decoded when a listener reads data
+    before = _traced_bytes()
+    lazy = [
+        Event(EventType.MESSAGE, i, "user", websocket=websocket, raw=frame, decode=json.loads)
+        for i in range(count)
+    ]
+    lazy_bytes = _traced_bytes() - before
+    tracemalloc.stop()
+    del lazy
+
+    return {
+        "messages": count,
+        "bytes_per_event_parsed": eager_bytes / count,
+        "bytes_per_event_unparsed": lazy_bytes / count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--connections", type=int, default=50_000)
+    parser.add_argument("--messages", type=int, default=50_000)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    results = {
+        "idle_connections": asyncio.run(measure_connections(args.connections)),
+        "inbound_messages": measure_messages(args.messages),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+WebSocket load generator for capacity and latency regression tracking.
+
+Opens many concurrent sockets against a running server at a controlled ramp
+rate, drives echo traffic at a fixed per-connection rate and prints a JSON
+report: connect rate and latency, echo round-trip percentiles, dropped
+frames and server RSS (from /metrics).
+
+    JWT_SECRET=... python -m benchmarks.load_test --url ws://localhost:8004 \\
+        --connections 2000 --ramp-rate 200 --duration 30 --message-rate 1
+
+Connections are spread over --endpoints round-robin and each gets its own
+synthetic user unless --users is smaller than --connections.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from typing import Optional
+
+try:
+    from websockets.asyncio.client import connect
+except ImportError:  # websockets < 13
+    from websockets import connect
+
+from generate_test_token import generate_token
+
+
+@dataclass
+class Stats:
+    connect_latencies: list = field(default_factory=list)
+    connect_failures: dict = field(default_factory=dict)
+    round_trips: list = field(default_factory=list)
+    sent: int = 0
+    received: int = 0
+    other_frames: int = 0
+    disconnects: int = 0
+
+
+def percentile(values: list, fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values: list) -> dict:
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        "count": len(values),
+        "p50_ms": ms(percentile(values, 0.50)),
+        "p99_ms": ms(percentile(values, 0.99)),
+        "p999_ms": ms(percentile(values, 0.999)),
+        "max_ms": ms(max(values) if values else None),
+    }
+
+
+def mint_tokens(users: int, secret: str, minutes: int) -> list[str]:
+    tokens = []
+    for user_id in range(1, users + 1):
+        token = generate_token(user_id, f"load{user_id}", secret, minutes)
+        tokens.append(token.decode() if isinstance(token, bytes) else token)
+    return tokens
+
+
+def server_rss(http_url: str) -> Optional[int]:
+    try:
+        with urllib.request.urlopen(f"{http_url}/metrics", timeout=5) as response:
+            for line in response.read().decode().splitlines():
+                if line.startswith("process_resident_memory_bytes "):
+                    return int(float(line.split()[1]))
+    except Exception as e:
+        print(f"Could not read server RSS: {e}", file=sys.stderr)
+    return None
+
+
+async def run_connection(
+    url: str,
+    endpoint: str,
+    token: str,
+    stats: Stats,
+    message_rate: float,
+    stop_at: float,
+    logs_container: Optional[str],
+) -> None:
+    started = time.perf_counter()
+    try:
+        websocket = await connect(f"{url}/ws/{endpoint}/{token}", max_size=None)
+    except Exception as e:
+        reason = type(e).__name__
+        stats.connect_failures[reason] = stats.connect_failures.get(reason, 0) + 1
+        return
+
+    stats.connect_latencies.append(time.perf_counter() - started)
+    pending: dict[str, float] = {}
+
+    async def reader():
+        async for frame in websocket:
+            message = json.loads(frame)
+            sent_at = pending.pop(message.get("message") or "", None)
+            if message.get("type") == "echo" and sent_at is not None:
+                stats.received += 1
+                stats.round_trips.append(time.perf_counter() - sent_at)
+            else:
+                stats.other_frames += 1
+
+    read_task = asyncio.create_task(reader())
+    try:
+        if endpoint == "logs" and logs_container:
+            await websocket.send(
+                json.dumps({"type": "start_logs", "container_name": logs_container})
+            )
+        interval = 1 / message_rate if message_rate > 0 else None
+        sequence = 0
+        while time.perf_counter() < stop_at and not read_task.done():
+            if endpoint == "echo" and interval:
+                content = f"{id(websocket)}:{sequence}"
+                sequence += 1
+                pending[content] = time.perf_counter()
+                await websocket.send(json.dumps({"content": content}))
+                stats.sent += 1
+                await asyncio.sleep(interval)
+            else:
+                await asyncio.sleep(min(1.0, max(0.0, stop_at - time.perf_counter())))
+        # give in-flight echoes a moment before counting them as dropped
+        await asyncio.sleep(1.0)
+    except Exception:
+        stats.disconnects += 1
+    finally:
+        read_task.cancel()
+        await websocket.close()
+
+
+async def run(args) -> dict:
+    secret = os.getenv("JWT_SECRET", args.secret)
+    tokens = mint_tokens(args.users or args.connections, secret, args.token_minutes)
+    endpoints = args.endpoints.split(",")
+    http_url = args.url.replace("ws://", "http://").replace("wss://", "https://")
+
+    stats = Stats()
+    rss_before = server_rss(http_url)
+    ramp_started = time.perf_counter()
+    stop_at = ramp_started + args.connections / args.ramp_rate + args.duration
+
+    tasks = []
+    for i in range(args.connections):
+        # hold the ramp rate
+        target = ramp_started + i / args.ramp_rate
+        delay = target - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(
+            asyncio.create_task(
+                run_connection(
+                    args.url,
+                    endpoints[i % len(endpoints)],
+                    tokens[i % len(tokens)],
+                    stats,
+                    args.message_rate,
+                    stop_at,
+                    args.logs_container,
+                )
+            )
+        )
+    ramp_seconds = time.perf_counter() - ramp_started
+    rss_peak = server_rss(http_url)
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    return {
+        "config": {
+            "url": args.url,
+            "connections": args.connections,
+            "endpoints": endpoints,
+            "ramp_rate": args.ramp_rate,
+            "duration": args.duration,
+            "message_rate": args.message_rate,
+        },
+        "connect": {
+            "succeeded": len(stats.connect_latencies),
+            "failed": stats.connect_failures,
+            "rate_per_second": round(len(stats.connect_latencies) / ramp_seconds, 1),
+            "latency": summarize(stats.connect_latencies),
+        },
+        "echo": {
+            "sent": stats.sent,
+            "received": stats.received,
+            "dropped": stats.sent - stats.received,
+            "round_trip": summarize(stats.round_trips),
+        },
+        "other_frames": stats.other_frames,
+        "unexpected_disconnects": stats.disconnects,
+        "server_rss_bytes": {"before": rss_before, "at_full_load": rss_peak},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="ws://localhost:8004")
+    parser.add_argument("--endpoints", default="echo", help="comma separated: echo,resume,logs")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=0, help="defaults to one user per connection")
+    parser.add_argument("--ramp-rate", type=float, default=100, help="new connections per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds at full load")
+    parser.add_argument("--message-rate", type=float, default=1, help="echo messages per second per connection")
+    parser.add_argument("--logs-container", help="container to stream on logs connections")
+    parser.add_argument("--secret", default="secret", help="used when JWT_SECRET is not set")
+    parser.add_argument("--token-minutes", type=int, default=60)
+    parser.add_argument("--output", help="write the JSON report here as well")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Messages/sec through EchoHandler.handle_message with a per-message INFO log
+emitted, comparing the previous synchronous f-string logging with the
+hot-path logger behind a queue.
+
+    python -m benchmarks.logging_overhead --messages 50000
+
+Both runs write every message's log line, to /dev/null. The shipped
+EchoHandler logs the message at DEBUG, which INFO skips, and is reported
+separately as `default_messages_per_second`.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+
+from app.event_emitter import EventEmitter
+from app.events import Event, EventType
+from app.handlers.echo_handler import EchoHandler
+from app.message import Message, MessageType
+from app.structured_logging import LOG_FORMAT, setup_logging, stop_logging
+
+
+class FakeWebSocket:
+    async def send_text(self, text):
+        pass
+
+
+class LegacyEchoHandler(EchoHandler):
+    """handle_message as it was: an INFO f-string for every message"""
+
+    async def handle_message(self, event: Event) -> None:
+        try:
+            content = event.data.get("content", "")
+            self.logger.info(
+                f"Echo service: Message from {event.username} (ID: {event.user_id}): {content}"
+            )
+
+            response = Message(
+                type=MessageType.ECHO,
+                user_id=event.user_id,
+                username=event.username,
+                message=content,
+            )
+
+            await self.safe_send(event.websocket, response.dict())
+        except Exception as e:
+            self.logger.error(f"Error in handle_message: {str(e)}", exc_info=True)
+
+
+class HotEchoHandler(EchoHandler):
+    """the same INFO line per message, through the hot-path logger"""
+
+    async def handle_message(self, event: Event) -> None:
+        try:
+            content = event.data.get("content", "")
+            self.hot_logger.info(
+                "Echo service: Message from %s (ID: %s): %s",
+                event.username,
+                event.user_id,
+                content,
+            )
+
+            response = Message(
+                type=MessageType.ECHO,
+                user_id=event.user_id,
+                username=event.username,
+                message=content,
+            )
+
+            await self.safe_send(event.websocket, response.dict())
+        except Exception as e:
+            self.logger.error(f"Error in handle_message: {str(e)}", exc_info=True)
+
+
+async def drive(handler_cls, messages: int) -> float:
+    handler = handler_cls(EventEmitter())
+    websocket = FakeWebSocket()
+    events = [
+        Event(
+            EventType.MESSAGE,
+            1,
+            "user",
+            data={"content": f"message {i}"},
+            websocket=websocket,
+        )
+        for i in range(messages)
+    ]
+    started = time.perf_counter()
+    for event in events:
+        await handler.handle_message(event)
+    return messages / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=50_000)
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, "w")
+    root = logging.getLogger()
+
+    # previous setup: basicConfig, formatting and writing on the loop
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.handlers = [handler]
+    root.setLevel(logging.INFO)
+    legacy = asyncio.run(drive(LegacyEchoHandler, args.messages))
+
+    # current setup: hot logger, formatting and writing on a queue listener
+    root.handlers = []
+    with contextlib.redirect_stderr(devnull):
+        setup_logging(logging.INFO)
+    current = asyncio.run(drive(HotEchoHandler, args.messages))
+    default = asyncio.run(drive(EchoHandler, args.messages))
+    stop_logging()
+
+    print(
+        json.dumps(
+            {
+                "messages": args.messages,
+                "legacy_messages_per_second": round(legacy),
+                "current_messages_per_second": round(current),
+                "default_messages_per_second": round(default),
+                "speedup": round(current / legacy, 2),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
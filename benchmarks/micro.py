@@ -0,0 +1,247 @@
+"""
+Offline microbenchmarks for the server's hot paths, compared against a stored
+baseline so regressions show up in review.
+
+    python -m benchmarks.micro                   # run and compare to baseline
+    python -m benchmarks.micro --save-baseline   # record a new baseline
+    python -m benchmarks.micro --filter emit     # only matching benchmarks
+
+Each benchmark reports the best time per operation over several rounds, the
+figure least affected by other load on the machine.
+Baselines are machine specific, so record them on the machine you compare on.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+from jose import jwt
+
+from app.auth import Auth, VerifiedTokenCache
+from app.config import settings
+from app.connection_manager import ConnectionManager
+from app.event_emitter import EventEmitter
+from app.events import Event, EventType
+from app.handlers import HandlerKind
+from app.handlers.logs_handler import ContainerLogsHandler
+from app.log_merge import LogMerge
+from app.message import Message, MessageType
+from app.mq.consumers import ReviewedResumeMessage
+from app.mq.core.consumer import AsyncRabbitConsumer
+from app.sharding import HashRing
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+BENCHMARKS = {}
+
+
+def benchmark(name: str, operations: int):
+    """register an async function that performs `operations` operations"""
+
+    def decorator(func):
+        BENCHMARKS[name] = (func, operations)
+        return func
+
+    return decorator
+
+
+class FakeWebSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        pass
+
+
+async def _noop_listener(event):
+    pass
+
+
+def _emit_benchmark(listeners: int):
+    async def run():
+        emitter = EventEmitter()
+        for _ in range(listeners):
+            emitter.on(EventType.MESSAGE, _noop_listener)
+        event = Event(EventType.MESSAGE, 1, "user", data={"content": "x"})
+        for _ in range(1000):
+            await emitter.emit(event)
+
+    return run
+
+
+for _listeners in (1, 10, 100):
+    benchmark(f"emitter.emit[{_listeners} listeners]", 1000)(
+        _emit_benchmark(_listeners)
+    )
+
+
+@benchmark("connection_manager.register+lookup+disconnect[10k]", 10_000)
+async def connection_manager_cycle():
+    manager = ConnectionManager()
+    sockets = [FakeWebSocket() for _ in range(10_000)]
+    for user_id, websocket in enumerate(sockets):
+        await manager.register_connection(HandlerKind.Echo, user_id, websocket)
+    for user_id in range(10_000):
+        manager.get_websocket_connection(HandlerKind.Echo, user_id)
+    for user_id in range(10_000):
+        manager.disconnect(HandlerKind.Echo, user_id)
+
+
+def _token() -> str:
+    return jwt.encode(
+        {"user_id": 1, "username": "user", "groups": [], "exp": int(time.time()) + 3600},
+        settings.jwt_secret_key,
+        algorithm=settings.jwt_algorithm,
+    )
+
+
+@benchmark("auth.validate_token[uncached]", 1000)
+async def validate_token_uncached():
+    Auth.token_cache = VerifiedTokenCache(0)
+    token = _token()
+    for _ in range(1000):
+        await Auth.validate_token(token)
+
+
+@benchmark("auth.validate_token[cached]", 1000)
+async def validate_token_cached():
+    Auth.token_cache = VerifiedTokenCache(settings.token_cache_size)
+    token = _token()
+    for _ in range(1000):
+        await Auth.validate_token(token)
+
+
+def _message_benchmark(message_type: MessageType):
+    async def run():
+        for _ in range(1000):
+            message = Message(
+                type=message_type,
+                message="2024-01-01T00:00:00.000000000Z some log line of typical length",
+                user_id=1,
+                username="user",
+                data={"resume_id": "1", "file_name": "resume.pdf"},
+            )
+            json.dumps(message.model_dump())
+
+    return run
+
+
+for _message_type in MessageType:
+    benchmark(f"message.serialize[{_message_type.value}]", 1000)(
+        _message_benchmark(_message_type)
+    )
+
+
+@benchmark("logs._async_log_generator[1000 chunks]", 1000)
+async def log_framer():
+    chunk = b"2024-01-01T00:00:00.000000000Z line one\n2024-01-01T00:00:00.000000001Z line"
+    chunk += b" two\n"
+    handler = object.__new__(ContainerLogsHandler)
+    async for _ in handler._async_log_generator(iter([chunk] * 1000)):
+        pass
+
+
+@benchmark("logs.LogMerge[4 streams x 250 lines]", 1000)
+async def log_merge():
+    async def lines(offset):
+        for i in range(250):
+            yield f"2024-01-01T00:00:00.{i * 4 + offset:09d}Z line {i}"
+
+    merge = LogMerge({f"c{n}": lines(n) for n in range(4)}, buffer=256, window=0.1)
+    async for _ in merge:
+        pass
+
+
+@benchmark("consumer.process_message[schema]", 1000)
+async def consumer_process_message():
+    async def callback(body, properties):
+        pass
+
+    consumer = AsyncRabbitConsumer(
+        exchange="bench",
+        exchange_type="topic",
+        declare_exchange=False,
+        queue="bench",
+        routing_key="bench",
+        callback=callback,
+        schema=ReviewedResumeMessage,
+    )
+    body = json.dumps({"feedback": "Looks good" * 20, "key": "1-2-resume.pdf"}).encode()
+    for _ in range(1000):
+        await consumer.process_message(body, None)
+
+
+@benchmark("sharding.node_for[8 nodes x 128 vnodes]", 10_000)
+async def hash_ring_lookup():
+    ring = HashRing([f"node-{i}" for i in range(8)], virtual_nodes=128)
+    for user_id in range(10_000):
+        ring.node_for(user_id)
+
+
+def run_benchmark(func, operations: int, rounds: int) -> float:
+    """best nanoseconds per operation"""
+    asyncio.run(func())  # warm-up, not timed
+    timings = []
+    for _ in range(rounds):
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            asyncio.run(func())
+            timings.append((time.perf_counter() - started) / operations * 1e9)
+        finally:
+            gc.enable()
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--filter", default="", help="substring of benchmark names")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before a result is a regression")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    results = {}
+    for name, (func, operations) in BENCHMARKS.items():
+        if args.filter in name:
+            results[name] = round(run_benchmark(func, operations, args.rounds), 1)
+
+    if args.save_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Saved {len(results)} results to {args.baseline}")
+        return
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    regressions = []
+    width = max(map(len, results), default=0)
+    print(f"{'benchmark':<{width}}  {'ns/op':>12}  {'baseline':>12}  change")
+    for name, ns in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<{width}}  {ns:>12.1f}  {'-':>12}  new")
+            continue
+        change = ns / previous - 1
+        flag = ""
+        if change > args.tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<{width}}  {ns:>12.1f}  {previous:>12.1f}  {change:+.1%}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than baseline by more than {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Cold start: import time and time to the first accepted socket.
+
+    python -m benchmarks.startup --runs 5 --kinds echo,logs
+
+For each run it
+
+- imports `app.main` in a fresh interpreter and reports the time, plus
+  which optional heavy modules (docker, pika) the import pulled in;
+- starts `python -m app.workers --workers 1` and times, from the spawn,
+  `/health/ready` answering 200 and then the first echo socket greeted;
+- then times the first socket of each other kind in --kinds, which
+  includes loading that kind's handler on first use.
+
+The server inherits this environment. RabbitMQ is connected before the
+worker reports ready. Point RABBIT_HOST at a closed port to leave the broker
+out of the figures.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from .load_test import connect, mint_tokens
+
+IMPORT_PROBE = """
+import sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(elapsed, int("docker" in sys.modules), int("pika" in sys.modules))
+"""
+
+
+def measure_import() -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], capture_output=True, text=True, check=True
+    ).stdout.split()
+    return {
+        "import_ms": round(float(output[0]) * 1000, 1),
+        "docker_imported": output[1] == "1",
+        "pika_imported": output[2] == "1",
+    }
+
+
+def wait_for_ready(http_url: str, deadline: float) -> None:
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{http_url}/health/ready", timeout=1):
+                return
+        except Exception:
+            time.sleep(0.005)
+    raise RuntimeError(f"server at {http_url} did not become ready")
+
+
+async def first_greeting(url: str, deadline: float) -> None:
+    """retry until a socket is accepted and sends its greeting"""
+    while time.monotonic() < deadline:
+        try:
+            async with connect(url, open_timeout=5) as websocket:
+                await websocket.recv()
+                return
+        except Exception:
+            await asyncio.sleep(0.005)
+    raise RuntimeError(f"no socket accepted at {url}")
+
+
+def measure_server(args, token: str) -> dict:
+    env = dict(os.environ, JWT_SECRET=os.getenv("JWT_SECRET", args.secret))
+    started = time.monotonic()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.workers", "--workers", "1", "--port", str(args.port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    row = {}
+    try:
+        deadline = started + args.timeout
+        http_url = f"http://localhost:{args.port}"
+        ws_url = f"ws://localhost:{args.port}/ws"
+
+        wait_for_ready(http_url, deadline)
+        row["ready_ms"] = round((time.monotonic() - started) * 1000, 1)
+        asyncio.run(first_greeting(f"{ws_url}/echo/{token}", deadline))
+        row["first_accept_ms"] = round((time.monotonic() - started) * 1000, 1)
+
+        for kind in args.kinds.split(","):
+            if kind == "echo":
+                continue
+            kind_started = time.monotonic()
+            try:
+                asyncio.run(first_greeting(f"{ws_url}/{kind}/{token}", kind_started + 10))
+                row[f"first_{kind}_ms"] = round((time.monotonic() - kind_started) * 1000, 1)
+            except RuntimeError:
+                # e.g. logs without a reachable Docker daemon
+                row[f"first_{kind}_ms"] = None
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8105)
+    parser.add_argument("--kinds", default="echo,resume", help="comma separated handler kinds")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--secret", default="secret", help="used when JWT_SECRET is not set")
+    parser.add_argument("--output", help="write the JSON report here as well")
+    args = parser.parse_args()
+
+    token = mint_tokens(1, os.getenv("JWT_SECRET", args.secret), 60)[0]
+    rows = []
+    for _ in range(args.runs):
+        row = measure_import()
+        row.update(measure_server(args, token))
+        rows.append(row)
+
+    report = {"runs": rows, "median": {}}
+    for column in rows[0]:
+        values = [row[column] for row in rows if isinstance(row[column], float)]
+        if values:
+            report["median"][column] = round(statistics.median(values), 1)
+    report["docker_imported"] = any(row["docker_imported"] for row in rows)
+    report["pika_imported"] = any(row["pika_imported"] for row in rows)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compares handshake throughput with and without the verified-token cache
+during a reconnect storm, where each token is presented many times.
+
+    python -m benchmarks.token_cache --users 1000 --reconnects 20
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from jose import jwt
+
+from app.auth import Auth, VerifiedTokenCache
+from app.config import settings
+from app.handlers import HandlerKind
+from app.main import authenticate_and_connect, cleanup_websocket
+
+
+class FakeWebSocket:
+    async def accept(self):
+        pass
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+
+def mint_tokens(users: int) -> list[str]:
+    expires = int(time.time()) + 3600
+    return [
+        jwt.encode(
+            {"user_id": i, "username": f"user{i}", "groups": [], "exp": expires},
+            settings.jwt_secret_key,
+            algorithm=settings.jwt_algorithm,
+        )
+        for i in range(users)
+    ]
+
+
+async def storm(tokens: list[str], reconnects: int) -> float:
+    started = time.perf_counter()
+    for _ in range(reconnects):
+        for token in tokens:
+            user, websocket = await authenticate_and_connect(
+                HandlerKind.Echo, FakeWebSocket(), token
+            )
+            await cleanup_websocket(HandlerKind.Echo, user, websocket)
+    return time.perf_counter() - started
+
+
+def run(tokens: list[str], reconnects: int, cache_size: int) -> dict:
+    Auth.token_cache = VerifiedTokenCache(cache_size)
+    elapsed = asyncio.run(storm(tokens, reconnects))
+    connects = len(tokens) * reconnects
+    return {
+        "cache_size": cache_size,
+        "connects": connects,
+        "seconds": round(elapsed, 4),
+        "connects_per_second": round(connects / elapsed, 1),
+        "cache_hits": Auth.token_cache.hits,
+        "cache_misses": Auth.token_cache.misses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--reconnects", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    tokens = mint_tokens(args.users)
+
+    uncached = run(tokens, args.reconnects, cache_size=0)
+    cached = run(tokens, args.reconnects, cache_size=settings.token_cache_size)
+    print(
+        json.dumps(
+            {
+                "without_cache": uncached,
+                "with_cache": cached,
+                "speedup": round(
+                    cached["connects_per_second"] / uncached["connects_per_second"], 2
+                ),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Connection and message throughput versus worker count.
+
+Starts `python -m app.workers --workers N` for each N, drives it with the
+load generator from benchmarks.load_test and prints one row per worker count:
+
+    python -m benchmarks.worker_scaling --workers 1,2,4 --connections 2000
+
+The server inherits this environment, so JWT_SECRET, REDIS_HOST and
+RATE_LIMIT_BACKEND apply to it as usual. Run on an otherwise idle machine
+with at least as many cores as the largest worker count.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+from . import load_test
+
+
+def wait_until_ready(http_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{http_url}/ping", timeout=1):
+                return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {http_url} did not become ready")
+
+
+def run_with_workers(workers: int, args) -> dict:
+    env = dict(os.environ, JWT_SECRET=os.getenv("JWT_SECRET", args.secret))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.workers", "--workers", str(workers), "--port", str(args.port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(f"http://localhost:{args.port}")
+        load_args = argparse.Namespace(
+            url=f"ws://localhost:{args.port}",
+            endpoints="echo",
+            connections=args.connections,
+            users=0,
+            ramp_rate=args.ramp_rate,
+            duration=args.duration,
+            message_rate=args.message_rate,
+            logs_container=None,
+            secret=args.secret,
+            token_minutes=60,
+        )
+        report = asyncio.run(load_test.run(load_args))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    return {
+        "workers": workers,
+        "connected": report["connect"]["succeeded"],
+        "connect_per_second": report["connect"]["rate_per_second"],
+        # includes echoes sent during the ramp, so keep the ramp short
+        "messages_per_second": round(report["echo"]["received"] / args.duration, 1),
+        "echo_p99_ms": report["echo"]["round_trip"]["p99_ms"],
+        "dropped": report["echo"]["dropped"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts")
+    parser.add_argument("--port", type=int, default=8104)
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--ramp-rate", type=float, default=500)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--message-rate", type=float, default=5)
+    parser.add_argument("--secret", default="secret", help="used when JWT_SECRET is not set")
+    parser.add_argument("--output", help="write the JSON rows here as well")
+    args = parser.parse_args()
+
+    rows = [run_with_workers(int(n), args) for n in args.workers.split(",")]
+
+    columns = list(rows[0])
+    print("  ".join(f"{column:>18}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{str(row[column]):>18}" for column in columns))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(json.dumps(rows, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
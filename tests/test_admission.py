@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from app.admission import AdmissionController, AdmissionRejected
+
+
+def controller(retry_after_ms: int, max_pending: int = 1, queue_timeout: float = 1.0) -> AdmissionController:
+    return AdmissionController(
+        max_concurrent=1,
+        max_pending=max_pending,
+        queue_timeout=queue_timeout,
+        max_connections=100,
+        retry_after_ms=retry_after_ms,
+    )
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.calls = []
+
+    async def accept(self):
+        self.calls.append("accept")
+
+    async def close(self, code, reason=""):
+        self.calls.append((code, reason))
+
+
+def test_retry_hint_is_jittered_up_to_twice_the_base():
+    hints = {controller(100)._reject("connection_cap").retry_after_ms for _ in range(200)}
+
+    assert min(hints) >= 100 and max(hints) <= 200
+
+
+def test_zero_retry_hint_means_retry_at_once():
+    assert controller(0)._reject("connection_cap").retry_after_ms == 0
+
+
+def test_full_queue_is_closed_with_1013_and_the_hint():
+    admission = controller(100, max_pending=1)
+    websocket = FakeWebSocket()
+
+    async def run():
+        async with admission.admit():
+            # takes the one pending place until the slot frees up
+            waiting = asyncio.create_task(admission.admit().__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(AdmissionRejected) as rejected:
+                async with admission.admit():
+                    pass
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        await admission.reject(websocket, rejected.value)
+        return rejected.value
+
+    rejection = asyncio.run(run())
+
+    assert rejection.reason == "queue_full"
+    assert 100 <= rejection.retry_after_ms <= 200
+    assert websocket.calls == ["accept", (1013, f"retry_after_ms={rejection.retry_after_ms}")]
+
+
+def test_handshake_waiting_past_the_timeout_is_rejected():
+    admission = controller(100, queue_timeout=0.01)
+
+    async def run():
+        async with admission.admit():
+            with pytest.raises(AdmissionRejected) as rejected:
+                async with admission.admit():
+                    pass
+        return rejected.value
+
+    rejection = asyncio.run(run())
+
+    assert rejection.reason == "queue_timeout"
+    assert 100 <= rejection.retry_after_ms <= 200
+    assert admission._pending == 0
+
+
+def test_draining_rejects_before_queueing():
+    admission = controller(100)
+    admission.stop_admitting()
+
+    async def run():
+        async with admission.admit():
+            pass
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        asyncio.run(run())
+
+    assert rejected.value.reason == "draining"
+    assert admission._pending == 0
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from jose import jwt
+
+from app.auth import Auth, TokenRevocations, VerifiedTokenCache
+from app.config import settings
+
+
+def token(user_id: int, issued_at: float) -> str:
+    claims = {"user_id": user_id, "username": "user", "exp": int(time.time()) + 3600, "iat": int(issued_at)}
+    return jwt.encode(claims, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
+
+
+def test_revoked_token_is_refused_on_cache_hits_and_misses(monkeypatch):
+    monkeypatch.setattr(Auth, "token_cache", VerifiedTokenCache(100))
+    monkeypatch.setattr(Auth, "revocations", TokenRevocations())
+    now = time.time()
+    old, other = token(1, now - 60), token(2, now - 60)
+
+    async def run():
+        # cached before the revocation, so the next check is a cache hit
+        assert await Auth.validate_token(old) is not None
+        Auth.revoke_user(1, now - 30)
+        hit = await Auth.validate_token(old)
+        Auth.token_cache.clear()
+        miss = await Auth.validate_token(old)
+        newer = await Auth.validate_token(token(1, now))
+        unrelated = await Auth.validate_token(other)
+        Auth.restore_user(1)
+        restored = await Auth.validate_token(old)
+        return hit, miss, newer, unrelated, restored
+
+    hit, miss, newer, unrelated, restored = asyncio.run(run())
+
+    assert hit is None and miss is None
+    assert newer["user_id"] == 1
+    assert unrelated["user_id"] == 2
+    assert restored["user_id"] == 1
+
+
+def test_token_without_iat_is_refused_after_revocation():
+    revocations = TokenRevocations()
+    revocations.revoke(1, time.time())
+
+    assert not revocations.allows(1, None)
+    assert revocations.allows(2, None)
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def close(self, code, reason=""):
+        self.closed = (code, reason)
+
+
+def test_revoke_closes_the_users_sessions(monkeypatch):
+    from app.cluster import cluster
+    from app.connection_manager import ConnectionManager
+    from app.handlers import HandlerKind
+
+    monkeypatch.setattr(Auth, "revocations", TokenRevocations())
+    manager = ConnectionManager()
+    revoked, kept = FakeWebSocket(), FakeWebSocket()
+
+    async def run():
+        await manager.register_connection(HandlerKind.Echo, 7001, revoked)
+        await manager.register_connection(HandlerKind.Echo, 7002, kept)
+        result = await cluster.revoke(7001)
+        manager.disconnect(HandlerKind.Echo, 7002, kept)
+        return result
+
+    result = asyncio.run(run())
+
+    assert result["closed"] == 1
+    assert revoked.closed == (1008, "revoked")
+    assert kept.closed is None
+    assert not manager.has_sessions(HandlerKind.Echo, 7001)
@@ -0,0 +1,42 @@
+import asyncio
+
+from app.connection_manager import ConnectionManager
+from app.handlers import HandlerKind
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def close(self, code, reason=""):
+        self.closed = (code, reason)
+
+
+def test_oldest_session_is_evicted_past_the_per_user_cap(monkeypatch):
+    manager = ConnectionManager()
+    monkeypatch.setattr(manager, "max_sessions_per_user", 2)
+    sockets = [FakeWebSocket() for _ in range(3)]
+    other = FakeWebSocket()
+
+    async def run():
+        await manager.register_connection(HandlerKind.Echo, 7101, other)
+        records = []
+        for websocket in sockets:
+            await manager.register_connection(HandlerKind.Echo, 7100, websocket)
+            records.append(manager.get_record(websocket))
+        return records
+
+    records = asyncio.run(run())
+    try:
+        assert sockets[0].closed == (1008, "session_limit")
+        assert records[0].closing
+        assert manager.get_record(sockets[0]) is None
+        assert manager.get_websocket_connections(HandlerKind.Echo, 7100) == sockets[1:]
+        # the cap is per user
+        assert other.closed is None
+    finally:
+        manager.disconnect(HandlerKind.Echo, 7100)
+        manager.disconnect(HandlerKind.Echo, 7101)
@@ -0,0 +1,49 @@
+import asyncio
+
+from app.docker_stats import StatsHub
+
+
+class EndingStatsApi:
+    """a `docker stats` stream that ends after its samples"""
+
+    def __init__(self):
+        self.streams = 0
+
+    def stats(self, container_id, stream, decode):
+        self.streams += 1
+        return iter(())
+
+
+class FakeClient:
+    def __init__(self):
+        self.api = EndingStatsApi()
+
+
+def test_ended_stream_drops_sampler_and_tells_subscribers(monkeypatch):
+    sent = []
+
+    async def send_frame(kind, websocket, text, channel=None):
+        sent.append((websocket, text))
+        return True
+
+    monkeypatch.setattr("app.docker_stats.send_frame", send_frame)
+
+    async def run():
+        hub = StatsHub(history_seconds=10, min_interval=1.0)
+        client = FakeClient()
+        websocket = object()
+        first = await hub.subscribe(client, "abc", "swecc-server", websocket, 1.0)
+        first._thread.join(timeout=5)
+        for _ in range(5):
+            await asyncio.sleep(0)
+        ended = "abc" not in hub.samplers
+
+        second = await hub.subscribe(client, "abc", "swecc-server", websocket, 1.0)
+        second.stop()
+        return ended, first is not second, client.api.streams
+
+    ended, restarted, streams = asyncio.run(run())
+
+    assert ended and restarted
+    assert streams == 2
+    assert any('"stats_stopped"' in text for _, text in sent)
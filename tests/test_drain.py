@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import pytest
+
+from app.admission import admission_controller
+from app.connection_manager import ConnectionRecord
+from app.drain import DrainController
+from app.handlers import HandlerKind
+
+
+class FakeWebSocket:
+    def __init__(self, log, hang=False):
+        self.log = log
+        self.hang = hang
+
+    async def close(self, code, reason=""):
+        if self.hang:
+            await asyncio.Event().wait()
+        self.log.append((self, "close", code, reason))
+
+
+class FakeConnectionManager:
+    records = []
+
+    def all_records(self):
+        return self.records
+
+
+@pytest.fixture
+def drain_env(monkeypatch):
+    log = []
+
+    async def drain_rabbitmq(timeout):
+        return 0
+
+    async def send_frame(kind, websocket, text, channel=None):
+        log.append((websocket, "send", json.loads(text)))
+        return True
+
+    monkeypatch.setattr("app.drain.drain_rabbitmq", drain_rabbitmq)
+    monkeypatch.setattr("app.drain.send_frame", send_frame)
+    monkeypatch.setattr("app.drain.ConnectionManager", FakeConnectionManager)
+    monkeypatch.setattr(admission_controller, "draining", False)
+    return log
+
+
+def records(*websockets):
+    return [ConnectionRecord(HandlerKind.Echo, n, websocket) for n, websocket in enumerate(websockets)]
+
+
+def test_each_socket_is_told_to_reconnect_then_closed_with_1012(drain_env, monkeypatch):
+    sockets = [FakeWebSocket(drain_env) for _ in range(3)]
+    monkeypatch.setattr(FakeConnectionManager, "records", records(*sockets))
+
+    summary = asyncio.run(DrainController(timeout=2.0, reconnect_spread_ms=500).drain())
+
+    assert admission_controller.draining
+    assert summary["sockets"] == summary["closed"] == 3
+    assert summary["seconds"] < 2.0
+    for websocket in sockets:
+        (_, _, frame), (_, _, code, reason) = [entry for entry in drain_env if entry[0] is websocket]
+        assert frame["type"] == "reconnect"
+        delay_ms = frame["data"]["reconnect_after_ms"]
+        assert 0 <= delay_ms < 500
+        assert (code, reason) == (1012, f"reconnect_after_ms={delay_ms}")
+    assert all(record.closing for record in FakeConnectionManager.records)
+
+
+def test_a_hung_close_does_not_hold_the_drain_past_its_deadline(drain_env, monkeypatch):
+    sockets = [FakeWebSocket(drain_env), FakeWebSocket(drain_env, hang=True)]
+    monkeypatch.setattr(FakeConnectionManager, "records", records(*sockets))
+
+    summary = asyncio.run(DrainController(timeout=0.2, reconnect_spread_ms=0).drain())
+
+    assert summary["seconds"] < 1.0
+    assert summary["sockets"] == 2
+    # every client still hears RECONNECT before the deadline cuts the closes off
+    assert [entry[1] for entry in drain_env if entry[0] is sockets[1]] == ["send"]
+    (_, _, frame), close = [entry for entry in drain_env if entry[0] is sockets[0]]
+    assert frame["type"] == "reconnect"
+    assert close[1:] == ("close", 1012, "reconnect_after_ms=0")
@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+from app.event_emitter import EventEmitter
+from app.events import Event, EventType
+from app.handlers.echo_handler import EchoHandler
+
+
+def test_message_data_is_decoded_on_first_read():
+    decoded = []
+
+    def decode(raw):
+        decoded.append(raw)
+        return json.loads(raw)
+
+    event = Event(EventType.MESSAGE, 1, "user", raw='{"content": "hi"}', decode=decode)
+
+    assert decoded == []
+    assert event.data == {"content": "hi"} and event.data["content"] == "hi"
+    assert len(decoded) == 1 and event.raw is None
+
+
+def test_handler_answers_frames_that_are_not_json(monkeypatch):
+    emitter = EventEmitter()
+    handler = EchoHandler(emitter)
+    sent = []
+
+    async def safe_send(websocket, data):
+        sent.append(data)
+
+    monkeypatch.setattr(handler, "safe_send", safe_send)
+    websocket = object()
+
+    async def run():
+        for frame in ('{"content": "hi"}', "not json"):
+            await emitter.emit(
+                Event(EventType.MESSAGE, 1, "user", websocket=websocket, raw=frame, decode=json.loads)
+            )
+
+    asyncio.run(run())
+
+    assert sent[0]["type"] == "echo" and sent[0]["message"] == "hi"
+    assert sent[1] == {"type": "error", "message": "Invalid JSON message format"}
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from app.handlers import HandlerKind
+from app.inbound import InboundPipeline
+
+
+class FakeWebSocket:
+    """hands out `frames`, then reports a disconnect once `hang_up` is set"""
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.read = 0
+        self.hang_up = asyncio.Event()
+        self.closed = None
+
+    async def receive_text(self):
+        if self.read < len(self.frames):
+            self.read += 1
+            return self.frames[self.read - 1]
+        await self.hang_up.wait()
+        raise WebSocketDisconnect(1000)
+
+    async def close(self, code, reason=""):
+        self.closed = (code, reason)
+
+
+def pipeline(websocket, dispatch, max_queue):
+    return InboundPipeline(HandlerKind.Echo, websocket, dispatch, {"user_id": 1}, max_queue=max_queue, concurrency=1)
+
+
+def test_full_queue_stops_the_reader_until_a_worker_catches_up():
+    async def run():
+        websocket = FakeWebSocket([f"frame {i}" for i in range(6)])
+        gate = asyncio.Event()
+        dispatched = []
+
+        async def dispatch(data):
+            await gate.wait()
+            dispatched.append(data)
+
+        task = asyncio.create_task(pipeline(websocket, dispatch, max_queue=2).run())
+        for _ in range(20):
+            await asyncio.sleep(0)
+        # one frame in the worker, two queued, one waiting on the full queue
+        read_while_blocked = websocket.read
+
+        gate.set()
+        for _ in range(20):
+            await asyncio.sleep(0)
+        websocket.hang_up.set()
+        with pytest.raises(WebSocketDisconnect):
+            await task
+        return read_while_blocked, dispatched
+
+    read_while_blocked, dispatched = asyncio.run(run())
+
+    assert read_while_blocked == 4
+    assert dispatched == [f"frame {i}" for i in range(6)]
+
+
+def test_disconnect_cancels_a_dispatch_in_progress():
+    async def run():
+        websocket = FakeWebSocket(["first", "second"])
+        started = asyncio.Event()
+        cancelled = []
+
+        async def dispatch(data):
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.append(data)
+                raise
+
+        inbound = pipeline(websocket, dispatch, max_queue=4)
+        task = asyncio.create_task(inbound.run())
+        await started.wait()
+        websocket.hang_up.set()
+        with pytest.raises(WebSocketDisconnect):
+            await task
+        return cancelled, inbound.queue.qsize()
+
+    cancelled, left = asyncio.run(run())
+
+    # the queued frame is dropped with the connection
+    assert cancelled == ["first"]
+    assert left == 1
+
+
+def test_oversized_frame_closes_with_1009():
+    async def run():
+        websocket = FakeWebSocket(["ok", "x" * 200, "never read"])
+        dispatched = []
+
+        async def dispatch(data):
+            dispatched.append(data)
+
+        inbound = pipeline(websocket, dispatch, max_queue=4)
+        inbound.max_frame_bytes = 100
+        await inbound.run()
+        return websocket, dispatched
+
+    websocket, dispatched = asyncio.run(run())
+
+    assert websocket.closed == (1009, "frame exceeds 100 bytes")
+    assert websocket.read == 2
+    # closing stops the workers, so the frame still queued is dropped too
+    assert dispatched == []
@@ -0,0 +1,78 @@
+import asyncio
+
+import pika
+
+from app.events import Event, EventType
+from app.handlers import HandlerKind
+from app.mq import _manager, ingress_bridge
+from app.mq.core.producer import AsyncRabbitProducer
+from app.mq.publishers import request_resume_review  # noqa: F401, registers the route
+
+
+class EncodingChannel:
+    """stands in for a pika channel; encodes properties the way the broker connection would"""
+
+    def __init__(self):
+        self.published = []
+
+    def basic_publish(self, exchange, routing_key, body, properties, mandatory):
+        frames = properties.encode()
+        self.published.append((exchange, routing_key, body, b"".join(frames)))
+
+
+def ready_producer(exchange: str) -> tuple[AsyncRabbitProducer, EncodingChannel]:
+    producer = AsyncRabbitProducer(None, exchange, "topic")
+    channel = EncodingChannel()
+    producer._connected = True
+    producer._channel = channel
+    producer._ready.set()
+    return producer, channel
+
+
+def test_publish_batch_encodes_every_message():
+    async def run():
+        producer, channel = ready_producer("swecc-test-exchange")
+        properties = [pika.BasicProperties(correlation_id=str(i)) for i in range(3)]
+        sent = await producer.publish_batch(
+            [(f"message {i}", properties[i]) for i in range(3)], "review"
+        )
+        return producer, channel, sent
+
+    producer, channel, sent = asyncio.run(run())
+
+    assert sent == 3
+    assert producer._connected
+    assert [body for _, _, body, _ in channel.published] == [
+        b"message 0",
+        b"message 1",
+        b"message 2",
+    ]
+
+
+def test_ingress_request_is_acked_after_publish():
+    async def run():
+        producer, channel = ready_producer("swecc-ai-exchange")
+        _manager.producers["ingress.swecc-ai-exchange"] = producer
+        replies = []
+
+        async def reply(websocket, data):
+            replies.append(data)
+
+        route = ingress_bridge.route_for(HandlerKind.Resume, "request_review")
+        event = Event(
+            type=EventType.MESSAGE,
+            user_id=41,
+            username="test",
+            data={"type": "request_review", "request_id": "r1", "resume_id": 3, "file_name": "cv.pdf"},
+        )
+        ingress_bridge.dispatch(route, event, reply)
+        await ingress_bridge.close()
+        return channel, replies
+
+    channel, replies = asyncio.run(run())
+
+    assert [reply["type"] for reply in replies] == ["ack"]
+    assert replies[0]["data"]["request_id"] == "r1"
+    exchange, routing_key, body, _ = channel.published[0]
+    assert (exchange, routing_key) == ("swecc-ai-exchange", "review")
+    assert body == b'{"key": "41-3-cv.pdf"}'
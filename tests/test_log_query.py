@@ -0,0 +1,40 @@
+import asyncio
+
+from app.handlers.logs_handler import ContainerLogsHandler
+from app.log_merge import LogMerge
+from app.log_query import LogQuery
+
+LINES = [f"2024-05-01T12:{i // 60:02d}:{i % 60:02d}.000000000Z line {i}" for i in range(250)]
+
+
+class FakeContainer:
+    def __init__(self):
+        self.options = None
+
+    def logs(self, **options):
+        self.options = options
+        lines = LINES[-options["tail"]:] if "tail" in options else LINES
+        return iter(["\n".join(lines).encode() + b"\n"])
+
+
+def test_query_without_since_reads_the_whole_log():
+    handler = ContainerLogsHandler.__new__(ContainerLogsHandler)
+    container = FakeContainer()
+    query = LogQuery(since=None, until=None, pattern="line", regex=False, page_size=1000)
+
+    async def run():
+        merge = LogMerge(
+            {"swecc-server": handler._log_lines("swecc-server", container, False, query.read_since)},
+            buffer=64,
+            window=None,
+        )
+        try:
+            return await query.page(merge)
+        finally:
+            merge.close()
+
+    page = asyncio.run(run())
+
+    assert "tail" not in container.options and "since" not in container.options
+    assert [line["text"] for line in page["lines"]] == [line.partition(" ")[2] for line in LINES]
+    assert page["done"]
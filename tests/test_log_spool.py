@@ -0,0 +1,42 @@
+import asyncio
+import os
+
+from app.handlers.logs_handler import ContainerLogsHandler
+from app.log_spool import LogSpool, _SegmentWriter, timestamp_ns
+
+SPOOLED = [f"2024-05-01T12:00:0{i}.000000000Z spooled {i}" for i in range(3)]
+# the writer stopped after SPOOLED; Docker still has the newer lines
+DOCKER = SPOOLED[-1:] + [f"2024-05-01T12:00:0{i}.000000000Z docker {i}" for i in range(3, 5)]
+
+
+class FakeContainer:
+    def __init__(self):
+        self.options = None
+
+    def logs(self, **options):
+        self.options = options
+        return iter(["\n".join(DOCKER).encode() + b"\n"])
+
+
+def write_spool(directory: str) -> LogSpool:
+    writer = _SegmentWriter(os.path.join(directory, "swecc-server"), 1 << 20, 64, 1 << 30, 1 << 30)
+    for line in SPOOLED:
+        writer.append(line.encode(), timestamp_ns(line.partition(" ")[0]))
+    writer.close()
+    return LogSpool(directory, ["swecc-server"], 1 << 20, 64, 1 << 30, 1 << 30)
+
+
+def test_query_falls_through_to_docker_after_the_spool(tmp_path, monkeypatch):
+    spool = write_spool(str(tmp_path))
+    monkeypatch.setattr("app.handlers.logs_handler.log_spool", spool)
+    handler = ContainerLogsHandler.__new__(ContainerLogsHandler)
+    container = FakeContainer()
+    since = timestamp_ns(SPOOLED[0].partition(" ")[0]) / 1e9
+
+    async def run():
+        return [line async for line in handler._log_lines("swecc-server", container, False, since)]
+
+    lines = asyncio.run(run())
+
+    assert lines == SPOOLED + DOCKER[1:]
+    assert container.options["follow"] is False
@@ -0,0 +1,36 @@
+import asyncio
+
+import pydantic
+import pytest
+
+from app.config import Settings
+from app.loop_monitor import LoopMonitor
+from app.main import LoopMonitorUpdate
+
+
+def test_disable_waits_for_the_watchdog():
+    async def run():
+        monitor = LoopMonitor(lag_interval=0.5, slow_callback_threshold=10.0)
+        stopped = []
+        for _ in range(3):
+            monitor.enable()
+            watchdog = monitor._watchdog
+            monitor.disable()
+            stopped.append(not watchdog.is_alive())
+        return stopped
+
+    assert asyncio.run(run()) == [True, True, True]
+
+
+@pytest.mark.parametrize("field", ["lag_interval", "slow_callback_threshold"])
+@pytest.mark.parametrize("value", [0, -1])
+def test_update_rejects_non_positive_intervals(field, value):
+    with pytest.raises(pydantic.ValidationError):
+        LoopMonitorUpdate(**{field: value})
+
+
+@pytest.mark.parametrize("field", ["loop_lag_interval", "slow_callback_threshold"])
+@pytest.mark.parametrize("value", [0, -1])
+def test_settings_reject_non_positive_intervals(field, value):
+    with pytest.raises(pydantic.ValidationError):
+        Settings(**{field: value})
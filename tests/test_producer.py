@@ -0,0 +1,41 @@
+import time
+
+import pika
+
+from app.mq.core.producer import AsyncRabbitProducer
+from app.tracing import PUBLISHED_AT_HEADER, TRACE_ID_HEADER, TraceContext
+
+
+def test_trace_headers_marshal_through_pika():
+    properties = AsyncRabbitProducer._with_trace_headers(pika.BasicProperties())
+
+    encoded = b"".join(properties.encode())
+    decoded = pika.BasicProperties()
+    decoded.decode(encoded)
+
+    assert decoded.headers[TRACE_ID_HEADER] == properties.headers[TRACE_ID_HEADER]
+    assert isinstance(decoded.headers[PUBLISHED_AT_HEADER], int)
+
+
+def test_trace_context_reads_published_at_milliseconds():
+    properties = AsyncRabbitProducer._with_trace_headers(pika.BasicProperties())
+    encoded = b"".join(properties.encode())
+    decoded = pika.BasicProperties()
+    decoded.decode(encoded)
+
+    trace = TraceContext.from_properties(decoded)
+
+    assert abs(trace.published_at - time.time()) < 5
+    assert 0 <= trace.stages["broker"] < 5
+
+
+def test_trace_headers_leave_reused_properties_alone():
+    properties = pika.BasicProperties(content_type="application/json", headers={"kind": "reviewed"})
+
+    first = AsyncRabbitProducer._with_trace_headers(properties)
+    second = AsyncRabbitProducer._with_trace_headers(properties)
+
+    assert properties.headers == {"kind": "reviewed"}
+    assert first.content_type == "application/json"
+    assert first.headers["kind"] == "reviewed"
+    assert first.headers[TRACE_ID_HEADER] != second.headers[TRACE_ID_HEADER]
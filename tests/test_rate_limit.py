@@ -0,0 +1,76 @@
+import asyncio
+import logging
+
+import pytest
+
+from app.handlers import HandlerKind
+from app.rate_limit import ConnectionRateLimiter, LocalBucketStore, RedisBucketStore, Verdict
+
+
+class BusyUserStore:
+    """a shared user bucket that is empty for the first `busy` takes"""
+
+    def __init__(self, busy: int):
+        self.busy = busy
+
+    async def take(self, key, rate, capacity):
+        if self.busy:
+            self.busy -= 1
+            return 0.001
+        return 0.0
+
+    def release(self, key):
+        pass
+
+
+def test_throttled_frame_is_counted_once():
+    limiter = ConnectionRateLimiter(HandlerKind.Logs, {"user_id": 1}, store=BusyUserStore(3))
+    before = limiter._limited.value
+
+    verdict = asyncio.run(limiter.check())
+
+    assert verdict is Verdict.ACCEPT
+    assert limiter._limited.value - before == 1
+
+
+def test_redis_outage_is_logged_once(caplog):
+    # optional dependency, only needed with RATE_LIMIT_BACKEND=redis
+    pytest.importorskip("redis")
+
+    async def unavailable(keys, args):
+        raise ConnectionError("connection refused")
+
+    store = RedisBucketStore("127.0.0.1", 1)
+    store._take = unavailable
+
+    async def run():
+        return [await store.take("echo:1", 10, 20) for _ in range(5)]
+
+    with caplog.at_level(logging.WARNING, logger="app.rate_limit"):
+        waits = asyncio.run(run())
+
+    assert waits == [0.0] * 5
+    assert len([r for r in caplog.records if r.levelno == logging.WARNING]) == 1
+
+
+def test_local_store_sweeps_buckets_that_refilled(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.rate_limit.time.monotonic", lambda: now[0])
+    store = LocalBucketStore(sweep_interval=10.0)
+
+    async def run():
+        # partly drained and never released, like the ingress quota buckets
+        await store.take("ingress:request_review:1", 1.0, 5)
+        now[0] = 1008.0
+        for _ in range(5):
+            await store.take("echo:2", 1.0, 5)
+        before = set(store._buckets)
+        # the first take past the sweep interval drops buckets that are full again
+        now[0] = 1010.5
+        await store.take("echo:3", 1.0, 5)
+        return before, set(store._buckets)
+
+    before, after = asyncio.run(run())
+
+    assert before == {"ingress:request_review:1", "echo:2"}
+    assert after == {"echo:2", "echo:3"}
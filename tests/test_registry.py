@@ -0,0 +1,75 @@
+import asyncio
+import sys
+import types
+
+import pytest
+
+from app.handlers import HandlerKind
+from app.handlers.registry import HandlerRegistry
+
+
+class FakeHandler:
+    built = 0
+    started = 0
+    failures = 0
+    gate: asyncio.Event
+
+    def __init__(self, emitter):
+        type(self).built += 1
+        self.emitter = emitter
+
+    async def start(self):
+        type(self).started += 1
+        await type(self).gate.wait()
+        if type(self).failures:
+            type(self).failures -= 1
+            raise RuntimeError("broker unavailable")
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    module = types.ModuleType("fake_handler_module")
+    handler = type("Handler", (FakeHandler,), {})
+    module.Handler = handler
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+    return HandlerRegistry({HandlerKind.Echo: f"{module.__name__}:Handler"}), handler
+
+
+def test_concurrent_connections_share_one_load(registry):
+    registry, handler = registry
+
+    async def run():
+        handler.gate = asyncio.Event()
+        waiting = [asyncio.create_task(registry.get(HandlerKind.Echo)) for _ in range(5)]
+        # a connection that goes away while waiting does not stop the load
+        await asyncio.sleep(0.05)
+        waiting[0].cancel()
+        handler.gate.set()
+        results = await asyncio.gather(*waiting[1:])
+        return results, await registry.get(HandlerKind.Echo)
+
+    results, later = asyncio.run(run())
+
+    assert handler.built == handler.started == 1
+    assert all(result is later for result in results)
+    assert registry.handlers[HandlerKind.Echo] is later
+
+
+def test_failed_start_is_retried_by_the_next_connection(registry):
+    registry, handler = registry
+    handler.failures = 1
+
+    async def run():
+        handler.gate = asyncio.Event()
+        handler.gate.set()
+        with pytest.raises(RuntimeError):
+            await registry.get(HandlerKind.Echo)
+        assert HandlerKind.Echo not in registry.handlers
+        return await registry.get(HandlerKind.Echo)
+
+    loaded = asyncio.run(run())
+
+    # the retry starts the same instance again instead of subscribing twice
+    assert handler.built == 1
+    assert handler.started == 2
+    assert registry.handlers[HandlerKind.Echo] is loaded
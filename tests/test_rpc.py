@@ -0,0 +1,64 @@
+import asyncio
+
+from app.events import Event, EventType
+from app.rpc import CANCELLED, RPC_IN_FLIGHT, TOO_MANY_IN_FLIGHT, RpcServer
+
+
+def test_cancel_is_answered_when_connection_is_at_the_cap():
+    async def run():
+        replies = []
+
+        async def reply(websocket, data):
+            replies.append(data)
+
+        async def wait(params, event):
+            await asyncio.Event().wait()
+
+        server = RpcServer("echo", lambda name: (wait, None) if name == "wait" else None, reply)
+        server.max_in_flight = 2
+        websocket = object()
+
+        def request(data):
+            return server.handle(Event(EventType.MESSAGE, 1, "user", data=data, websocket=websocket))
+
+        await request({"id": 1, "method": "wait"})
+        await request({"id": 2, "method": "wait"})
+        await request({"id": 3, "method": "wait"})
+        first = server.calls[id(websocket)][1]
+        await request({"id": 4, "method": "rpc.cancel", "params": {"id": 1}})
+        await first
+        server.close(websocket)
+        return replies
+
+    replies = asyncio.run(run())
+
+    by_id = {reply["id"]: reply for reply in replies}
+    assert by_id[3]["error"]["code"] == TOO_MANY_IN_FLIGHT
+    assert by_id[4]["result"] == {"cancelled": True}
+    assert by_id[1]["error"]["code"] == CANCELLED
+
+
+def test_close_before_the_call_starts_does_not_leak():
+    async def run():
+        async def reply(websocket, data):
+            raise AssertionError("a closed socket gets no reply")
+
+        async def wait(params, event):
+            await asyncio.Event().wait()
+
+        server = RpcServer("echo", lambda name: (wait, None), reply)
+        websocket = object()
+        in_flight = RPC_IN_FLIGHT.labels().value
+
+        await server.handle(Event(EventType.MESSAGE, 1, "user", data={"id": 1, "method": "wait"}, websocket=websocket))
+        assert RPC_IN_FLIGHT.labels().value == in_flight + 1
+        # the socket closes before the task has taken a step
+        task = server.calls[id(websocket)][1]
+        server.close(websocket)
+        await asyncio.gather(task, return_exceptions=True)
+        return server, in_flight
+
+    server, in_flight = asyncio.run(run())
+
+    assert server.calls == {}
+    assert RPC_IN_FLIGHT.labels().value == in_flight
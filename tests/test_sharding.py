@@ -0,0 +1,41 @@
+import asyncio
+
+import pika
+
+from app.mq import consumers
+from app.mq.consumers import ReviewedResumeMessage, reviewed_relay_consumer
+from app.sharding import ShardRouter
+
+
+def user_homed_on(router: ShardRouter, node: str) -> int:
+    return next(user_id for user_id in range(1000) if router.home_node(user_id) == node)
+
+
+def test_relay_routes_reviewed_to_the_home_shard(monkeypatch):
+    router = ShardRouter({"a": "wss://a", "b": "wss://b"}, "a", 128)
+    monkeypatch.setattr(consumers, "shard_router", router)
+    published, handled = [], []
+
+    async def publish_reviewed(message, routing_key_override=None, properties=None):
+        published.append((message, routing_key_override, properties))
+        return True
+
+    async def reviewed_resume_consumer(body, properties):
+        handled.append(body)
+
+    monkeypatch.setattr(consumers, "publish_reviewed", publish_reviewed)
+    monkeypatch.setattr(consumers, "reviewed_resume_consumer", reviewed_resume_consumer)
+
+    remote = ReviewedResumeMessage(feedback="ok", key=f"{user_homed_on(router, 'b')}-3-cv.pdf")
+    local = ReviewedResumeMessage(feedback="ok", key=f"{user_homed_on(router, 'a')}-4-cv.pdf")
+    properties = pika.BasicProperties(headers={"x-trace-id": "abc"})
+
+    async def run():
+        await reviewed_relay_consumer(remote, properties)
+        await reviewed_relay_consumer(local, properties)
+
+    asyncio.run(run())
+
+    assert [(message, key) for message, key, _ in published] == [(remote, "reviewed.b")]
+    assert published[0][2].headers == {"x-trace-id": "abc"}
+    assert handled == [local]
@@ -0,0 +1,28 @@
+import logging
+import queue
+
+from app.structured_logging import _DeferredQueueHandler
+
+
+def make_record(msg, args, fields=None):
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, None)
+    if fields is not None:
+        record.fields = fields
+    return record
+
+
+def test_scalar_args_are_left_for_the_listener():
+    handler = _DeferredQueueHandler(queue.SimpleQueue())
+    record = handler.prepare(make_record("user %s sent %d", ("ada", 3)))
+
+    assert record.args == ("ada", 3)
+
+
+def test_mutable_args_are_rendered_before_queueing():
+    handler = _DeferredQueueHandler(queue.SimpleQueue())
+    data = {"content": "before"}
+    record = handler.prepare(make_record("message %s", (data,), fields={"data": data}))
+    data["content"] = "after"
+
+    assert record.getMessage() == "message {'content': 'before'}"
+    assert record.fields == {"data": "{'content': 'before'}"}